@@ -7,6 +7,7 @@ import (
 	"fmt"           // 提供格式化功能，用于生成游戏ID
 	"log"           // 提供日志记录功能，用于输出服务器运行信息
 	"math/rand"     // 提供随机数生成功能，用于游戏逻辑
+	"net"           // 提供网络地址解析功能，用于获取客户端IP
 	"net/http"      // 提供HTTP客户端和服务器实现，用于构建API网关
 	"net/url"
 	"os"            // 提供操作系统功能接口，用于读取环境变量
@@ -24,7 +25,10 @@ type helloResp struct {
 
 // llmIn LLM请求输入结构
 type llmIn struct {
-	Prompt string `json:"prompt"` // 用户输入的提示词
+	Prompt    string `json:"prompt"`               // 用户输入的提示词
+	UserID    string `json:"user_id,omitempty"`    // 用户ID（可选，用于统计和按用户限流）
+	SessionID string `json:"session_id,omitempty"` // 会话ID（可选，用于会话统计和按会话限流）
+	Identity  string `json:"identity,omitempty"`   // 身份令牌（可选，由登录服务签发，pyllm验证通过后才使用长期记忆）
 }
 
 // llmOut LLM响应输出结构
@@ -109,9 +113,39 @@ func cors(next http.Handler) http.Handler {
 	})
 }
 
+// forwardedFor 生成转发给Python服务的X-Forwarded-For请求头
+// 在客户端已有的X-Forwarded-For后追加直连地址，Python服务据此按客户端IP限流
+func forwardedFor(r *http.Request) string {
+	clientIP, _, err := net.SplitHostPort(r.RemoteAddr)
+	if err != nil {
+		clientIP = r.RemoteAddr
+	}
+	if prior := r.Header.Get("X-Forwarded-For"); prior != "" {
+		return prior + ", " + clientIP
+	}
+	return clientIP
+}
+
+// writeThrottled 将Python服务的限流响应（429）原样返回给客户端，保留Retry-After
+func writeThrottled(w http.ResponseWriter, resp *http.Response) {
+	if retryAfter := resp.Header.Get("Retry-After"); retryAfter != "" {
+		w.Header().Set("Retry-After", retryAfter)
+		w.Header().Set("Access-Control-Expose-Headers", "Retry-After")
+	}
+	w.Header().Set("Content-Type", "application/json")
+	w.WriteHeader(http.StatusTooManyRequests)
+	_ = json.NewEncoder(w).Encode(llmOut{Error: "too many requests"})
+}
+
 // wsHandler WebSocket代理处理函数，转发WebSocket连接到Python服务
 // 功能：将客户端的WebSocket连接转发到Python后端服务，实现双向实时通信
+// 默认通过共享的多路复用连接转发（见mux.go），PY_WS_MUX=0时每个客户端单独连接/ws/chat
 func wsHandler(w http.ResponseWriter, r *http.Request) {
+	if muxEnabled() {
+		muxWSHandler(w, r)
+		return
+	}
+
 	// 1. 将HTTP请求升级为WebSocket连接
 	// upgrader对象定义了WebSocket连接的配置（如允许的来源）
 	c, err := upgrader.Upgrade(w, r, nil)
@@ -147,7 +181,8 @@ func wsHandler(w http.ResponseWriter, r *http.Request) {
 	wsUrl.Path = "/ws/chat"
 
 	// 4. 建立与Python服务的WebSocket连接
-	pyConn, _, err := websocket.DefaultDialer.Dial(wsUrl.String(), nil)
+	// 携带X-Forwarded-For，Python服务按真实客户端IP做准入控制
+	pyConn, _, err := websocket.DefaultDialer.Dial(wsUrl.String(), http.Header{"X-Forwarded-For": {forwardedFor(r)}})
 	if err != nil {
 		log.Printf("连接Python WebSocket服务失败: %v", err)
 		return
@@ -260,8 +295,8 @@ func llmHandler(w http.ResponseWriter, r *http.Request) {
     // 序列化请求数据：将Go结构体转换为JSON格式的字节数组
     // 简单来说，就是把代码中方便操作的数据结构，变成能在网络上传输的JSON字符串
     // 示例：
-    // 如果 in 结构体的值是 {Prompt: "你好，世界"}
-    // 序列化后得到的JSON字节数组是 {"prompt":"你好，世界"}
+    // 如果 in 结构体的值是 {Prompt: "你好，世界", UserID: "u1"}
+    // 序列化后得到的JSON字节数组是 {"prompt":"你好，世界","user_id":"u1"}
     b, _ := json.Marshal(in)
     
     // 获取Python服务URL（从环境变量或默认值）
@@ -270,8 +305,16 @@ func llmHandler(w http.ResponseWriter, r *http.Request) {
         url = "http://localhost:8000" // 默认URL
     }
     
-    // 转发请求到Python服务
-    resp, err := http.Post(url+"/llm", "application/json", bytes.NewBuffer(b))
+    // 转发请求到Python服务（携带X-Forwarded-For，用于按客户端IP限流）
+    req, err := http.NewRequestWithContext(r.Context(), http.MethodPost, url+"/llm", bytes.NewBuffer(b))
+    if err != nil {
+        w.WriteHeader(http.StatusInternalServerError)
+        _ = json.NewEncoder(w).Encode(llmOut{Error: "invalid upstream request"})
+        return
+    }
+    req.Header.Set("Content-Type", "application/json")
+    req.Header.Set("X-Forwarded-For", forwardedFor(r))
+    resp, err := http.DefaultClient.Do(req)
     if err != nil {
         w.WriteHeader(http.StatusBadGateway) // 502错误：Python服务不可用
         _ = json.NewEncoder(w).Encode(llmOut{Error: "python service unavailable"}) // 返回错误信息
@@ -279,6 +322,12 @@ func llmHandler(w http.ResponseWriter, r *http.Request) {
     }
     defer resp.Body.Close() // 确保响应体被关闭
     
+    // 请求太频繁：返回429和Retry-After
+    if resp.StatusCode == http.StatusTooManyRequests {
+        writeThrottled(w, resp)
+        return
+    }
+    
     // 解析Python服务的响应
     var out llmOut
     if err := json.NewDecoder(resp.Body).Decode(&out); err != nil {
@@ -291,6 +340,84 @@ func llmHandler(w http.ResponseWriter, r *http.Request) {
     _ = json.NewEncoder(w).Encode(out)
 }
 
+// llmStreamHandler LLM流式接口处理函数，转发SSE事件流到Python服务并逐帧刷新
+func llmStreamHandler(w http.ResponseWriter, r *http.Request) {
+    // 流式响应需要ResponseWriter支持Flush
+    flusher, ok := w.(http.Flusher)
+    if !ok {
+        w.Header().Set("Content-Type", "application/json")
+        w.WriteHeader(http.StatusInternalServerError)
+        _ = json.NewEncoder(w).Encode(llmOut{Error: "streaming unsupported"})
+        return
+    }
+    
+    // 解析请求体
+    var in llmIn
+    if err := json.NewDecoder(r.Body).Decode(&in); err != nil {
+        w.Header().Set("Content-Type", "application/json")
+        w.WriteHeader(http.StatusBadRequest)
+        _ = json.NewEncoder(w).Encode(llmOut{Error: "invalid json"})
+        return
+    }
+    b, _ := json.Marshal(in)
+    
+    // 获取Python服务URL（从环境变量或默认值）
+    url := os.Getenv("PY_SERVICE_URL")
+    if url == "" {
+        url = "http://localhost:8000" // 默认URL
+    }
+    
+    // 使用客户端请求的Context转发，客户端断开时上游请求随之取消
+    req, err := http.NewRequestWithContext(r.Context(), http.MethodPost, url+"/llm/stream", bytes.NewBuffer(b))
+    if err != nil {
+        w.Header().Set("Content-Type", "application/json")
+        w.WriteHeader(http.StatusInternalServerError)
+        _ = json.NewEncoder(w).Encode(llmOut{Error: "invalid upstream request"})
+        return
+    }
+    req.Header.Set("Content-Type", "application/json")
+    req.Header.Set("Accept", "text/event-stream")
+    req.Header.Set("X-Forwarded-For", forwardedFor(r))
+    
+    resp, err := http.DefaultClient.Do(req)
+    if err != nil {
+        w.Header().Set("Content-Type", "application/json")
+        w.WriteHeader(http.StatusBadGateway) // 502错误：Python服务不可用
+        _ = json.NewEncoder(w).Encode(llmOut{Error: "python service unavailable"})
+        return
+    }
+    defer resp.Body.Close()
+    
+    // 请求太频繁：返回429和Retry-After，不建立事件流
+    if resp.StatusCode == http.StatusTooManyRequests {
+        writeThrottled(w, resp)
+        return
+    }
+    
+    // 设置SSE响应头
+    w.Header().Set("Content-Type", "text/event-stream")
+    w.Header().Set("Cache-Control", "no-cache")
+    w.Header().Set("X-Accel-Buffering", "no")
+    w.WriteHeader(resp.StatusCode)
+    flusher.Flush()
+    
+    // 逐块转发并立即刷新，保证过渡语和token增量第一时间到达客户端
+    buf := make([]byte, 4096)
+    for {
+        n, readErr := resp.Body.Read(buf)
+        if n > 0 {
+            if _, err := w.Write(buf[:n]); err != nil {
+                log.Printf("发送流式响应到客户端错误: %v", err)
+                return
+            }
+            flusher.Flush()
+        }
+        if readErr != nil {
+            return
+        }
+    }
+}
+
 // 游戏相关处理函数
 
 // 五行数据
@@ -524,6 +651,7 @@ func main() {
 	// 注册路由处理函数
 	mux.HandleFunc("/api/hello", helloHandler) // 健康检查路由
 	mux.HandleFunc("/api/llm", llmHandler) // LLM接口路由
+	mux.HandleFunc("/api/llm/stream", llmStreamHandler) // LLM流式接口路由（SSE）
 	mux.HandleFunc("/api/ws/chat", wsHandler) // WebSocket聊天接口路由
 	// 游戏API路由
 	mux.HandleFunc("/api/game/five-elements/start", startFiveElementsGame) // 启动五行匹配游戏
@@ -0,0 +1,328 @@
+package main
+
+// WebSocket多路复用：所有浏览器客户端共享一条到Python服务/ws/mux的连接
+// 每个浏览器连接对应一个逻辑通道，帧中带通道ID；Python服务按通道的发送额度推送，
+// 网关每向浏览器转发若干帧后归还额度，慢客户端只会暂停自己的通道
+
+import (
+	"encoding/json"
+	"log"
+	"net/http"
+	"net/url"
+	"os"
+	"strconv"
+	"sync"
+	"sync/atomic"
+
+	"github.com/gorilla/websocket"
+)
+
+// muxInitialCredits 每个通道的初始发送额度，也是网关为每个通道缓冲的最大数据帧数
+const muxInitialCredits = 32
+
+// muxCreditBatch 每向浏览器转发多少帧后归还一次额度
+const muxCreditBatch = 8
+
+// muxControlReserve 每个通道为不消耗额度的控制帧（错误帧、cancelled）单独缓冲的最大帧数
+const muxControlReserve = 8
+
+// muxFrame Python服务发来的帧（只解析路由需要的字段）
+type muxFrame struct {
+	Type    string `json:"type,omitempty"`
+	Channel string `json:"channel,omitempty"`
+	Reason  string `json:"reason,omitempty"`
+	Error   string `json:"error,omitempty"`
+}
+
+// muxControl 网关发给Python服务的控制帧
+type muxControl struct {
+	Type         string          `json:"type"`
+	Channel      string          `json:"channel,omitempty"`
+	Credits      int             `json:"credits,omitempty"`
+	ForwardedFor string          `json:"forwarded_for,omitempty"`
+	Data         json.RawMessage `json:"data,omitempty"`
+}
+
+// muxChannel 一个浏览器客户端对应的逻辑通道
+type muxChannel struct {
+	id        string
+	out       chan []byte   // 发给浏览器的数据帧（额度保证不会超过容量）
+	ctrl      chan []byte   // 发给浏览器的控制帧（错误帧、cancelled，不消耗额度）
+	closed    chan struct{} // 通道被服务端关闭或上游连接断开
+	closeOnce sync.Once
+}
+
+// close 标记通道已关闭（可重复调用）
+func (ch *muxChannel) close() {
+	ch.closeOnce.Do(func() { close(ch.closed) })
+}
+
+// muxClient 到Python服务的共享多路复用连接（断开后在下一个浏览器连接到来时重连）
+type muxClient struct {
+	mu       sync.Mutex
+	conn     *websocket.Conn
+	channels map[string]*muxChannel
+	writeMu  sync.Mutex
+	nextID   uint64
+}
+
+// pyMux 全局多路复用客户端
+var pyMux = &muxClient{}
+
+// muxEnabled 是否通过多路复用连接转发WebSocket（PY_WS_MUX=0时每个客户端单独连接/ws/chat）
+func muxEnabled() bool {
+	return os.Getenv("PY_WS_MUX") != "0"
+}
+
+// pyWebSocketURL 将Python服务地址转换为WebSocket地址
+func pyWebSocketURL(path string) (string, error) {
+	pyUrl := os.Getenv("PY_SERVICE_URL")
+	if pyUrl == "" {
+		pyUrl = "http://localhost:8000" // 默认Python服务地址
+	}
+	wsUrl, err := url.Parse(pyUrl)
+	if err != nil {
+		return "", err
+	}
+	if wsUrl.Scheme == "http" {
+		wsUrl.Scheme = "ws"
+	} else if wsUrl.Scheme == "https" {
+		wsUrl.Scheme = "wss"
+	}
+	wsUrl.Path = path
+	return wsUrl.String(), nil
+}
+
+// open 打开一个通道（必要时先建立共享连接），返回通道所在的连接
+func (m *muxClient) open(ch *muxChannel, forwardedFor string) (*websocket.Conn, error) {
+	m.mu.Lock()
+	if m.conn == nil {
+		target, err := pyWebSocketURL("/ws/mux")
+		if err != nil {
+			m.mu.Unlock()
+			return nil, err
+		}
+		conn, _, err := websocket.DefaultDialer.Dial(target, nil)
+		if err != nil {
+			m.mu.Unlock()
+			return nil, err
+		}
+		log.Printf("WebSocket多路复用连接已建立: %s", target)
+		m.conn = conn
+		m.channels = make(map[string]*muxChannel)
+		go m.readLoop(conn)
+	}
+	conn := m.conn
+	m.channels[ch.id] = ch
+	m.mu.Unlock()
+
+	err := m.write(conn, muxControl{Type: "open", Channel: ch.id, Credits: muxInitialCredits, ForwardedFor: forwardedFor})
+	if err != nil {
+		m.remove(conn, ch.id)
+	}
+	return conn, err
+}
+
+// write 在共享连接上发送一帧（gorilla/websocket只允许一个并发写者）
+func (m *muxClient) write(conn *websocket.Conn, frame muxControl) error {
+	m.writeMu.Lock()
+	defer m.writeMu.Unlock()
+	return conn.WriteJSON(frame)
+}
+
+// remove 注销通道
+func (m *muxClient) remove(conn *websocket.Conn, id string) *muxChannel {
+	m.mu.Lock()
+	defer m.mu.Unlock()
+	if m.conn != conn {
+		return nil
+	}
+	ch := m.channels[id]
+	delete(m.channels, id)
+	return ch
+}
+
+// lookup 查找通道
+func (m *muxClient) lookup(conn *websocket.Conn, id string) *muxChannel {
+	m.mu.Lock()
+	defer m.mu.Unlock()
+	if m.conn != conn {
+		return nil
+	}
+	return m.channels[id]
+}
+
+// reset 共享连接断开：关闭所有通道，下一个浏览器连接到来时重连
+func (m *muxClient) reset(conn *websocket.Conn) {
+	m.mu.Lock()
+	var channels map[string]*muxChannel
+	if m.conn == conn {
+		channels = m.channels
+		m.conn = nil
+		m.channels = nil
+	}
+	m.mu.Unlock()
+	conn.Close()
+	for _, ch := range channels {
+		ch.close()
+	}
+}
+
+// readLoop 读取Python服务发来的帧并按通道分发
+func (m *muxClient) readLoop(conn *websocket.Conn) {
+	defer m.reset(conn)
+	for {
+		_, message, err := conn.ReadMessage()
+		if err != nil {
+			if websocket.IsUnexpectedCloseError(err, websocket.CloseGoingAway, websocket.CloseNormalClosure) {
+				log.Printf("从Python多路复用连接读取消息错误: %v", err)
+			}
+			return
+		}
+		var frame muxFrame
+		if err := json.Unmarshal(message, &frame); err != nil {
+			continue
+		}
+		if frame.Channel == "" {
+			// 连接级心跳
+			if frame.Type == "ping" {
+				_ = m.write(conn, muxControl{Type: "pong"})
+			} else {
+				log.Printf("Python多路复用连接返回错误: %s", message)
+			}
+			continue
+		}
+		if frame.Type == "closed" {
+			if ch := m.remove(conn, frame.Channel); ch != nil {
+				log.Printf("Python服务关闭了通道 %s: %s", frame.Channel, frame.Reason)
+				ch.close()
+			}
+			continue
+		}
+		ch := m.lookup(conn, frame.Channel)
+		if ch == nil {
+			continue
+		}
+		if frame.Error != "" || frame.Type == "cancelled" {
+			// 控制帧不消耗额度，走单独的缓冲；浏览器读取太慢、缓冲已满时丢弃，不影响数据帧
+			select {
+			case ch.ctrl <- message:
+			default:
+				log.Printf("通道 %s 的控制帧缓冲已满，丢弃: %s", ch.id, message)
+			}
+			continue
+		}
+		select {
+		case ch.out <- message:
+		default:
+			// 超出额度说明协议出错，关闭该通道
+			log.Printf("通道 %s 超出发送额度，关闭通道", ch.id)
+			m.remove(conn, ch.id)
+			_ = m.write(conn, muxControl{Type: "close", Channel: ch.id})
+			ch.close()
+		}
+	}
+}
+
+// muxWSHandler 通过共享的多路复用连接转发一个浏览器WebSocket连接
+func muxWSHandler(w http.ResponseWriter, r *http.Request) {
+	c, err := upgrader.Upgrade(w, r, nil)
+	if err != nil {
+		log.Printf("无法升级为WebSocket连接: %v", err)
+		return
+	}
+	defer c.Close()
+
+	ch := &muxChannel{
+		id:     strconv.FormatUint(atomic.AddUint64(&pyMux.nextID, 1), 36),
+		out:    make(chan []byte, muxInitialCredits),
+		ctrl:   make(chan []byte, muxControlReserve),
+		closed: make(chan struct{}),
+	}
+	// 携带浏览器客户端的X-Forwarded-For，Python服务按真实客户端IP做准入控制
+	conn, err := pyMux.open(ch, forwardedFor(r))
+	if err != nil {
+		log.Printf("打开Python多路复用通道失败: %v", err)
+		c.WriteMessage(websocket.CloseMessage, websocket.FormatCloseMessage(websocket.CloseTryAgainLater, "upstream unavailable"))
+		return
+	}
+
+	// 写协程：把通道的帧转发给浏览器，每转发muxCreditBatch帧归还一次额度
+	done := make(chan struct{})
+	go func() {
+		defer close(done)
+		defer c.Close() // 浏览器写失败或通道关闭时让读循环退出
+		sent := 0
+		forward := func(message []byte) bool {
+			if err := c.WriteMessage(websocket.TextMessage, message); err != nil {
+				return false
+			}
+			sent++
+			if sent >= muxCreditBatch {
+				_ = pyMux.write(conn, muxControl{Type: "credit", Channel: ch.id, Credits: sent})
+				sent = 0
+			}
+			return true
+		}
+		// 控制帧不消耗额度，转发后不归还
+		forwardControl := func(message []byte) bool {
+			return c.WriteMessage(websocket.TextMessage, message) == nil
+		}
+		for {
+			select {
+			case message := <-ch.out:
+				if !forward(message) {
+					return
+				}
+			case message := <-ch.ctrl:
+				if !forwardControl(message) {
+					return
+				}
+			case <-ch.closed:
+				// 转发已缓冲的帧后关闭浏览器连接
+				for {
+					select {
+					case message := <-ch.out:
+						if !forward(message) {
+							return
+						}
+					case message := <-ch.ctrl:
+						if !forwardControl(message) {
+							return
+						}
+					default:
+						c.WriteMessage(websocket.CloseMessage, websocket.FormatCloseMessage(websocket.CloseNormalClosure, ""))
+						return
+					}
+				}
+			}
+		}
+	}()
+
+	// 读循环：把浏览器的消息包装成通道消息转发给Python服务
+	for {
+		_, message, err := c.ReadMessage()
+		if err != nil {
+			if websocket.IsUnexpectedCloseError(err, websocket.CloseGoingAway, websocket.CloseAbnormalClosure) {
+				log.Printf("从客户端读取消息错误: %v", err)
+			}
+			break
+		}
+		data := json.RawMessage(message)
+		if !json.Valid(message) {
+			// 非JSON消息原样作为字符串转发，由Python服务返回格式错误
+			data, _ = json.Marshal(string(message))
+		}
+		if err := pyMux.write(conn, muxControl{Type: "message", Channel: ch.id, Data: data}); err != nil {
+			log.Printf("发送消息到Python多路复用连接错误: %v", err)
+			break
+		}
+	}
+
+	// 浏览器断开：通知Python服务关闭通道（取消进行中的对话轮次）
+	if pyMux.remove(conn, ch.id) != nil {
+		_ = pyMux.write(conn, muxControl{Type: "close", Channel: ch.id})
+	}
+	ch.close()
+	<-done
+}
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+决策微批处理模块
+
+高并发时每个对话轮次都单独请求一次决策模型，而决策只是一个很小的分类任务。
+开启微批处理后（SOULBIT_BATCH_ROUTING=1），在一个很短的时间窗口内到达的决策请求
+（最多max_batch条）合并为一次结构化的批量路由分类调用，结果再分发回各个等待中的轮次：
+- 批量调用只返回每条请求的路由（不含回复和过渡语），不同用户的内容不会相互注入或泄露
+- 窗口内只有一条请求时按单条决策处理，但仍要等待收集窗口结束（最多window）
+- 需要直接回复的条目，以及批量调用返回的结果缺失或无效的条目，退回单条决策（为该用户单独生成回复）
+- 批量调用整体失败（解析错误等）时全部退回单条决策；熔断打开或超时时直接返回降级结果
+- 批量调用的token用量平均分摊到各轮次
+
+统计指标包括节省的决策调用次数和每条请求因等待窗口增加的延迟。
+"""
+import asyncio
+import time
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from ..utils.logger import logger
+from ..utils.resilience import CircuitOpenError
+from .prompt_builder import current_turn_usage
+
+# 单条决策：classify_one(输入文本, 截止时间) -> 决策结果
+ClassifyOne = Callable[[str, Optional[float]], Awaitable[Dict[str, Any]]]
+# 批量决策：classify_batch(输入文本列表, 截止时间) -> (每条的决策结果或None, 本次调用的token用量)
+ClassifyBatch = Callable[[List[str], Optional[float]], Awaitable[Tuple[List[Optional[Dict[str, Any]]], Dict[str, int]]]]
+
+class _Pending:
+    """
+    等待批量决策的请求
+    """
+    __slots__ = ("input", "deadline", "future", "enqueued_at", "usage")
+
+    def __init__(self, input_text: str, deadline: Optional[float], future: asyncio.Future, usage: Optional[Dict[str, int]]):
+        self.input = input_text
+        self.deadline = deadline
+        self.future = future
+        self.enqueued_at = time.monotonic()
+        self.usage = usage  # 所属轮次的token用量累加字典
+
+class BatchRouter:
+    """
+    决策微批处理器
+    """
+    def __init__(self, classify_one: ClassifyOne, classify_batch: ClassifyBatch, degraded_result: Callable[[], Dict[str, Any]], window: float = 0.005, max_batch: int = 8):
+        """
+        初始化微批处理器
+
+        Args:
+            classify_one: 单条决策函数
+            classify_batch: 批量决策函数
+            degraded_result: 生成降级决策结果的函数（熔断打开或超时时使用）
+            window: 收集窗口（秒），从窗口内第一条请求到达时开始计时
+            max_batch: 每批最多条数，达到后立即发送
+        """
+        self.classify_one = classify_one
+        self.classify_batch = classify_batch
+        self.degraded_result = degraded_result
+        self.window = window
+        self.max_batch = max(1, max_batch)
+        self._pending: List[_Pending] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        # 统计
+        self.items = 0  # 实际决策的请求数（不含已被调用方放弃的）
+        self.batches = 0  # 批量决策调用次数
+        self.batched_items = 0  # 通过批量调用得到结果的请求数
+        self.single_calls = 0  # 单条决策调用次数（窗口内只有一条或退回单条）
+        self.fallbacks = 0  # 需要直接回复、批量结果缺失或批量调用失败后退回单条的请求数
+        self.wait_total = 0.0  # 窗口等待时间总和（秒）
+        self.wait_max = 0.0
+        self.waited = 0
+        self.batch_latency_total = 0.0  # 批量调用耗时总和（秒）
+        self.single_latency_total = 0.0  # 单条调用耗时总和（秒）
+        self.sizes: Counter = Counter()
+
+    async def submit(self, input_text: str, deadline: Optional[float] = None) -> Dict[str, Any]:
+        """
+        提交一条决策请求，等待所在批次的结果
+
+        Args:
+            input_text: 用户输入文本
+            deadline: 轮次截止时间（time.monotonic）
+
+        Returns:
+            决策结果字典，与单条决策相同
+        """
+        loop = asyncio.get_running_loop()
+        pending = _Pending(input_text, deadline, loop.create_future(), current_turn_usage.get())
+        self._pending.append(pending)
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await pending.future
+
+    def _flush(self):
+        """
+        发送当前窗口内收集到的请求
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_single(self, pending: _Pending):
+        """
+        单条决策，用量计入请求所属的轮次
+        """
+        current_turn_usage.set(pending.usage)
+        start = time.monotonic()
+        try:
+            result = await self.classify_one(pending.input, pending.deadline)
+        except Exception as e:
+            if not pending.future.done():
+                pending.future.set_exception(e)
+            return
+        finally:
+            self.single_calls += 1
+            self.single_latency_total += time.monotonic() - start
+        if not pending.future.done():
+            pending.future.set_result(result)
+
+    async def _run(self, batch: List[_Pending]):
+        """
+        执行一个批次并分发结果
+        """
+        now = time.monotonic()
+        for pending in batch:
+            wait = now - pending.enqueued_at
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+            self.waited += 1
+        self.sizes[len(batch)] += 1
+
+        # 已被调用方放弃的请求不再决策
+        batch = [pending for pending in batch if not pending.future.done()]
+        self.items += len(batch)
+        if len(batch) <= 1:
+            for pending in batch:
+                await self._run_single(pending)
+            return
+
+        # 批量调用的用量不计入任何单个轮次，之后平均分摊
+        current_turn_usage.set(None)
+        deadlines = [pending.deadline for pending in batch if pending.deadline is not None]
+        start = time.monotonic()
+        try:
+            results, usage = await self.classify_batch([pending.input for pending in batch], min(deadlines) if deadlines else None)
+        except (CircuitOpenError, asyncio.TimeoutError) as e:
+            logger.warning(f"批量决策走降级路径: {str(e) or '决策超时'}，批大小: {len(batch)}")
+            for pending in batch:
+                if not pending.future.done():
+                    pending.future.set_result(self.degraded_result())
+            return
+        except Exception as e:
+            logger.error(f"批量决策失败，退回单条决策: {str(e)}，批大小: {len(batch)}")
+            results, usage = [None] * len(batch), {}
+        finally:
+            self.batches += 1
+            self.batch_latency_total += time.monotonic() - start
+
+        self._share_usage(batch, usage)
+        retry = []
+        for pending, result in zip(batch, results):
+            if result is None:
+                retry.append(pending)
+            elif not pending.future.done():
+                self.batched_items += 1
+                pending.future.set_result(result)
+        if retry:
+            self.fallbacks += len(retry)
+            await asyncio.gather(*(self._run_single(pending) for pending in retry))
+
+    @staticmethod
+    def _share_usage(batch: List[_Pending], usage: Dict[str, int]):
+        """
+        将批量调用的token用量平均分摊到各轮次（余数计入第一条）
+        """
+        for key in ("input_tokens", "output_tokens"):
+            total = usage.get(key, 0)
+            share, remainder = divmod(total, len(batch))
+            for index, pending in enumerate(batch):
+                if pending.usage is not None:
+                    pending.usage[key] = pending.usage.get(key, 0) + share + (remainder if index == 0 else 0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        获取统计快照
+
+        Returns:
+            批次数、节省的调用次数、平均批大小、窗口带来的平均/最大附加延迟、批量与单条调用的平均耗时
+        """
+        batch_count = sum(self.sizes.values())
+        return {
+            "enabled": True,
+            "window_ms": round(self.window * 1000, 2),
+            "max_batch": self.max_batch,
+            "items": self.items,
+            "batches": self.batches,
+            "batched_items": self.batched_items,
+            "single_calls": self.single_calls,
+            "fallbacks": self.fallbacks,
+            "calls_saved": self.items - self.batches - self.single_calls,
+            "avg_batch_size": round(self.waited / batch_count, 2) if batch_count else 0.0,
+            "batch_sizes": dict(sorted(self.sizes.items())),
+            "avg_added_latency_ms": round(self.wait_total / self.waited * 1000, 2) if self.waited else 0.0,
+            "max_added_latency_ms": round(self.wait_max * 1000, 2),
+            "avg_batch_call_ms": round(self.batch_latency_total / self.batches * 1000, 1) if self.batches else 0.0,
+            "avg_single_call_ms": round(self.single_latency_total / self.single_calls * 1000, 1) if self.single_calls else 0.0,
+        }
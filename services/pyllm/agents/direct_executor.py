@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+直接分派执行器
+
+工作流固定为"决策 → 最多一个专业Agent"，这里不经过LangGraph的StateGraph，
+使用紧凑的轮次状态对象直接调用选中的Agent，run()与MultiAgentWorkflow.run()的约定一致。
+"""
+from typing import Any, AsyncGenerator, Dict, Optional
+from ..utils.logger import logger
+from ..utils.resilience import turn_deadline
+from .history import HistoryLike, extend_history
+
+class TurnState:
+    """
+    单个对话轮次的紧凑状态（替代TypedDict状态字典，避免每个节点复制整个字典）
+    """
+    __slots__ = ("input", "context_history", "deadline", "user_id", "agent_decision", "transition", "reply", "degraded")
+
+    def __init__(self, input_text: str, context_history: HistoryLike, deadline: float, user_id: str = ""):
+        """
+        初始化轮次状态
+
+        Args:
+            input_text: 用户输入文本
+            context_history: 上下文历史记录（只读引用，不复制）
+            deadline: 轮次截止时间（time.monotonic）
+            user_id: 用户ID（用于长期记忆检索）
+        """
+        self.input = input_text
+        self.context_history = context_history
+        self.deadline = deadline
+        self.user_id = user_id
+        self.agent_decision = "闲聊Agent"
+        self.transition = ""
+        self.reply = ""
+        self.degraded = False
+
+class DirectExecutor:
+    """
+    直接分派执行器：决策后直接调用对应的专业Agent
+    """
+    def __init__(self, decision_agent: Any, specialists: Dict[str, Any]):
+        """
+        初始化直接分派执行器
+
+        Args:
+            decision_agent: 决策Agent（需提供classify方法）
+            specialists: 决策结果到专业Agent的映射（需提供generate和respond_stream方法）
+        """
+        self.decision_agent = decision_agent
+        self.specialists = specialists
+
+    async def run(self, input_text: str, context_history: Optional[HistoryLike] = None, stream_tokens: bool = False, user_id: str = "") -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        运行一个对话轮次，异步生成回复步骤
+
+        Args:
+            input_text: 用户输入文本
+            context_history: 上下文历史记录
+            stream_tokens: 是否产出专业Agent的token增量步骤（type为delta）
+            user_id: 用户ID（用于长期记忆检索）
+
+        Yields:
+            回复步骤字典，包含content、is_final和type（transition/delta/final）字段，最终步骤另含degraded（是否出错或降级）
+        """
+        logger.info(f"直接分派执行器运行，输入: {input_text[:50]}...")
+        state = TurnState(input_text, context_history or [], turn_deadline(), user_id)
+
+        try:
+            decision = await self.decision_agent.classify(state.input, state.deadline)
+            state.agent_decision = decision["agent_decision"]
+            state.transition = decision["transition"]
+            state.reply = decision["reply"]
+            state.degraded = decision["degraded"]
+
+            specialist = self.specialists.get(state.agent_decision)
+            if specialist is None:
+                # 闲聊（或未知决策）：决策阶段已生成直接回复
+                logger.info(f"闲聊Agent直接回复: {state.reply[:100]}...")
+                yield {"content": state.reply or f"Echo: {input_text}", "is_final": True, "type": "final", "agent_decision": state.agent_decision, "degraded": state.degraded}
+                return
+
+            # 专业Agent：先发送过渡语，并让专业Agent在历史中看到过渡语
+            history = state.context_history
+            if state.transition:
+                logger.info(f"发送过渡语: {state.transition}")
+                yield {"content": state.transition, "is_final": False, "type": "transition", "agent_decision": state.agent_decision}
+                history = extend_history(history, "assistant", state.transition)
+
+            logger.info(f"直接调用{state.agent_decision}获取最终回复")
+            if stream_tokens:
+                parts = []
+                outcome = {"degraded": False}
+                async for delta in specialist.respond_stream(state.input, history, state.deadline, state.user_id, outcome):
+                    parts.append(delta)
+                    yield {"content": delta, "is_final": False, "type": "delta"}
+                state.reply = "".join(parts)
+                state.degraded = outcome["degraded"]
+            else:
+                state.reply, state.degraded = await specialist.generate(state.input, history, state.deadline, state.user_id)
+
+            logger.info(f"获取最终回复成功: {state.reply[:100]}...")
+            yield {"content": state.reply or f"Echo: {input_text}", "is_final": True, "type": "final", "agent_decision": state.agent_decision, "degraded": state.degraded}
+        except Exception as e:
+            logger.error(f"直接分派执行器运行失败: {str(e)}")
+            yield {"content": f"Echo: {input_text}", "is_final": True, "type": "final", "degraded": True}
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+紧凑的上下文历史模块
+
+每条历史记录如果用{"role","content"}字典表示，每条要多占一个字典（约180字节）。
+HistoryBuffer把角色存为单字节的标签（bytearray），内容存在并列的列表中，
+只保留最近max_entries条；HistoryView在不复制的前提下给历史追加几条记录（如过渡语）。
+
+所有接受上下文历史的地方都通过iter_history读取，因此字典列表、HistoryBuffer和HistoryView可以互换。
+"""
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+# 角色标签（单字节），ROLE_NAMES中的字符串为全进程共享的常量
+ROLE_USER = 0
+ROLE_ASSISTANT = 1
+ROLE_SYSTEM = 2
+ROLE_NAMES = ("user", "assistant", "system")
+_ROLE_CODES = {name: code for code, name in enumerate(ROLE_NAMES)}
+
+class HistoryBuffer:
+    """
+    有长度上限的上下文历史缓冲区（按连接保存，轮次之间追加）
+    """
+    __slots__ = ("_roles", "_contents", "max_entries")
+
+    def __init__(self, max_entries: int = 20):
+        """
+        初始化缓冲区
+
+        Args:
+            max_entries: 最多保留的记录条数（一问一答为两条），超过后丢弃最早的记录
+        """
+        self._roles = bytearray()
+        self._contents: List[str] = []
+        self.max_entries = max_entries
+
+    def append(self, role: str, content: str):
+        """
+        追加一条记录，未知角色按用户消息处理
+
+        Args:
+            role: 角色（user/assistant/system）
+            content: 内容
+        """
+        self._roles.append(_ROLE_CODES.get(role, ROLE_USER))
+        self._contents.append(content)
+        overflow = len(self._contents) - self.max_entries
+        if overflow > 0:
+            del self._roles[:overflow]
+            del self._contents[:overflow]
+
+    def append_turn(self, prompt: str, reply: str):
+        """
+        追加一个完整的对话轮次（用户输入和最终回复）
+        """
+        self.append("user", prompt)
+        self.append("assistant", reply)
+
+    def clear(self):
+        """
+        清空历史
+        """
+        self._roles.clear()
+        self._contents.clear()
+
+    def __len__(self) -> int:
+        return len(self._contents)
+
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        for code, content in zip(self._roles, self._contents):
+            yield ROLE_NAMES[code], content
+
+class HistoryView:
+    """
+    只读的历史视图：基础历史加上若干条追加记录，不复制基础历史
+    """
+    __slots__ = ("base", "tail")
+
+    def __init__(self, base: "HistoryLike", tail: Tuple[Tuple[str, str], ...]):
+        """
+        初始化历史视图
+
+        Args:
+            base: 基础历史（字典列表、HistoryBuffer或HistoryView）
+            tail: 追加的(角色, 内容)记录
+        """
+        self.base = base
+        self.tail = tail
+
+    def __len__(self) -> int:
+        return len(self.base or ()) + len(self.tail)
+
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        yield from iter_history(self.base)
+        yield from self.tail
+
+# 上下文历史的各种表示
+HistoryLike = Union[List[Dict[str, str]], HistoryBuffer, HistoryView]
+
+def iter_history(context_history: Optional[HistoryLike]) -> Iterable[Tuple[str, str]]:
+    """
+    按(角色, 内容)逐条读取上下文历史
+
+    Args:
+        context_history: 字典列表、HistoryBuffer或HistoryView，None表示没有历史
+
+    Returns:
+        (角色, 内容)的可迭代对象
+    """
+    if not context_history:
+        return ()
+    if isinstance(context_history, (HistoryBuffer, HistoryView)):
+        return context_history
+    return ((item.get("role", "user"), item.get("content", "")) for item in context_history)
+
+def extend_history(context_history: Optional[HistoryLike], role: str, content: str) -> HistoryView:
+    """
+    返回追加了一条记录的历史视图（不复制、不修改原历史）
+
+    Args:
+        context_history: 原历史
+        role: 追加记录的角色
+        content: 追加记录的内容
+
+    Returns:
+        历史视图
+    """
+    return HistoryView(context_history or (), ((role, content),))
@@ -2,14 +2,37 @@
 """
 基于LangChain和LangGraph的多Agent系统
 """
+import asyncio
+import json
 import os
-from typing import Any, AsyncGenerator, Dict, List, Optional, TypedDict
-from langchain_core.prompts import PromptTemplate
+import time
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple, TypedDict
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_openai import ChatOpenAI
 from langgraph.graph import END, StateGraph, START
 from langgraph.prebuilt import ToolNode, tools_condition
 from ..utils.logger import logger
+from ..utils.profiling import timed
+from ..utils.resilience import (
+    DECISION_TIMEOUT,
+    SPECIALIST_TIMEOUT,
+    CircuitOpenError,
+    breaker_for_model,
+    queue_timeout,
+    stage_timeout,
+    turn_deadline,
+)
+from .prompt_builder import begin_turn_usage, build_chat_prompt, prompt_cache_stats, to_history_messages, to_memory_messages
+from .batch_router import BatchRouter
+from .registry import REGISTRY_PATH, AgentRegistry, AgentSpec, load_registry, registry_mtime
+from .single_flight import SingleFlight, turn_flights
+from .direct_executor import DirectExecutor
+from .history import HistoryLike, extend_history
+from .mock_model import MOCK_MODEL_ENABLED, MockChatModel, create_mock_model
+from .scheduler import turn_scheduler
+from .transitions import transition_library
+from .safety_filter import filter_steps
+from ..memory import long_term_memory
 
 # 创建ModelScope客户端（兼容OpenAI接口）
 def create_model_scope_client() -> Optional[ChatOpenAI]:
@@ -17,8 +40,12 @@ def create_model_scope_client() -> Optional[ChatOpenAI]:
     创建ModelScope客户端
     
     Returns:
-        ChatOpenAI客户端实例，如果配置失败则返回None
+        ChatOpenAI客户端实例（SOULBIT_MOCK_MODEL=1时为离线模拟模型），如果配置失败则返回None
     """
+    if MOCK_MODEL_ENABLED:
+        logger.info("使用离线模拟模型（SOULBIT_MOCK_MODEL=1）")
+        return create_mock_model()
+    
     ms_api_key = os.getenv("MODELSCOPE_API_KEY", "")
     if not ms_api_key:
         logger.error("未配置ModelScope API密钥")
@@ -50,119 +77,211 @@ class AgentState(TypedDict):
     agent_decision: str  # 决策结果
     transition: str  # 过渡语
     reply: str  # 最终回复
-    context_history: List[Dict[str, str]]  # 上下文历史
+    context_history: HistoryLike  # 上下文历史（只读引用，节点之间不复制）
     intermediate_results: Dict[str, str]  # 中间结果
     error_count: int  # 错误计数
     retry_count: int  # 重试计数
     max_retries: int = 3  # 最大重试次数
+    deadline: float  # 轮次截止时间（time.monotonic）
+    degraded: bool  # 是否走了降级路径
+    user_id: str  # 用户ID（用于长期记忆检索）
+
+# 决策微批处理配置（默认关闭）
+BATCH_ROUTING_ENABLED = os.getenv("SOULBIT_BATCH_ROUTING", "0") != "0"
+BATCH_WINDOW_MS = float(os.getenv("SOULBIT_BATCH_WINDOW_MS", "5"))
+BATCH_MAX_SIZE = int(os.getenv("SOULBIT_BATCH_MAX_SIZE", "8"))
 
 # 决策Agent
 class DecisionAgent:
     """
     决策Agent，负责决定使用哪个专业Agent
     """
-    def __init__(self, model: ChatOpenAI):
+    def __init__(self, model: ChatOpenAI, registry: AgentRegistry):
         """
         初始化决策Agent
         
         Args:
             model: 大语言模型实例
+            registry: 智能体注册表（决策提示词、路由标签和直接回复的路由）
         """
         self.model = model
+        self.registry = registry
+        self.breaker = breaker_for_model(model)  # 模型端点熔断器
         
-        # 决策提示词模板 - 智能决策助手，同时生成过渡语或直接回复
-        self.decision_prompt = PromptTemplate(
-            template="""你是SoulBit，一个人类灵魂陪伴者。你可以：
-1. 直接用自己的身份进行日常对话、轻松交流、回应生活琐事
-2. 咨询你的心理学专家朋友Long，他熟悉王阳明心学、《蛤蟆先生看心理医生》等
-3. 咨询你的脱口秀演员朋友博洋，他擅长用笑话和幽默回应各种话题
-当用户提问时，你需要分析应该如何回应：
-回应规则：
-- 如果用户的问题是日常闲聊、生活琐事、普通交流等，直接用SoulBit自己的身份回应
-- 如果用户的问题涉及心理、情绪、自我成长、人生困惑等，咨询Long（心理专家朋友）
-- 如果用户的问题需要幽默搞笑的回应，或者用户明确要求讲笑话，咨询博洋（脱口秀朋友）
-请严格按照以下JSON格式输出你的决策结果：
-{{
-  "agent_type": "选择的回应方式",
-  "transition": "生成的过渡语（仅当需要咨询朋友时生成，否则留空）",
-  "reply": "直接生成的回复内容（仅当不需要咨询朋友时生成，否则留空）"
-}}
-其中，agent_type的取值只能是：闲聊Agent、心理专家Agent、脱口秀演员Agent
-- 闲聊Agent：代表你自己直接回应，此时transition留空，reply为你的直接回复
-- 心理专家Agent：咨询Long后回应，此时生成自然过渡语，reply留空
-- 脱口秀演员Agent：咨询博洋后回应，此时生成自然过渡语，reply留空
-过渡语需要：
-1. 自然融入对话，不显得生硬
-2. 根据用户问题的内容和语气调整过渡语的风格
-3. 简洁明了，通常不超过25个字
-4. 保持SoulBit的友好、真诚的语气
-5. 不要提及'AI'、'模型'、'系统'等技术词汇
-直接回复需要：
-1. 绝对不能承认自己是AI或人工智能，必须始终扮演人类身份
-2. 用自然、口语化的中文直接回复用户的问题，避免过于正式或生硬
-3. 对用户的话题表现出兴趣，给出轻松友好的回应
-4. 加入适当的幽默元素，让对话更加轻松愉快
-5. 尊重隐私，不追问敏感话题
-6. 回复长度要自然适度，通常为2-5句话，避免过于冗长或过于简短
-7. 根据用户问题的复杂程度调整回复长度，简单问题简洁回答，复杂问题可以适当展开
-不要添加任何额外的解释或文本！
-
-用户问题：{input}""",
-            input_variables=["input"]
-        )
+        # 过渡语来源：local（默认，本地过渡语库选择）或llm（由决策模型生成）
+        self.transition_source = os.getenv("SOULBIT_TRANSITION_SOURCE", "local")
+        
+        # 决策人设 - 智能决策助手，同时生成过渡语或直接回复（由注册表按注册的Agent拼接）
+        # 作为字节稳定的system消息发送，用户问题单独放在human消息中
+        # 使用本地过渡语时不要求模型输出transition，缩短决策输出
+        self.decision_system_prompt = registry.decision.prompt(self.transition_source)
+        
+        # 决策提示词模板（system → human）
+        self.decision_prompt = build_chat_prompt(self.decision_system_prompt)
+        
+        # 创建决策链，JSON在记录token用量后再解析
+        decision_model = self.model.bind(**registry.decision.model_settings) if registry.decision.model_settings else self.model
+        self.decision_chain = self.decision_prompt | decision_model
+        self.output_parser = JsonOutputParser()
+        
+        # 批量决策链：一次调用为窗口内收集到的多条问题分别给出路由分类（不生成任何回复或过渡语）
+        self.batch_decision_chain = build_chat_prompt(
+            registry.decision.prompt(self.transition_source, batch=True)
+        ) | decision_model
         
-        # 创建决策链
-        self.decision_chain = self.decision_prompt | self.model | JsonOutputParser()
+        # 决策微批处理器（SOULBIT_BATCH_ROUTING=1时启用）
+        # 只用于本地过渡语：由模型生成的过渡语是针对单个用户的生成内容，不能在多个用户共享的调用中生成
+        self.batch_router = None
+        if BATCH_ROUTING_ENABLED and self.transition_source == "llm":
+            logger.warning("决策微批处理只支持本地过渡语（SOULBIT_TRANSITION_SOURCE=local），已关闭")
+        elif BATCH_ROUTING_ENABLED:
+            self.batch_router = BatchRouter(
+                self._classify_single, self.classify_batch, self._degraded_result,
+                window=BATCH_WINDOW_MS / 1000, max_batch=BATCH_MAX_SIZE,
+            )
+        
+        # 降级回复 - 上游不可用时的本地回复
+        self.degraded_reply = "抱歉，我这会儿信号不太好，稍后再聊吧！"
     
-    async def decide(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+    def _degraded_result(self) -> Dict[str, Any]:
         """
-        分析用户问题并决定使用哪个Agent，同时生成过渡语或直接回复
+        熔断打开或超时时的本地降级决策
+        """
+        return {"agent_decision": self.registry.direct_route, "transition": "", "reply": self.degraded_reply, "degraded": True}
+    
+    def _decision_result(self, agent_type: str, transition: str, reply: str, input_text: str) -> Dict[str, Any]:
+        """
+        整理模型给出的决策，咨询朋友时从本地过渡语库选择过渡语
+        """
+        if self.transition_source != "llm" and agent_type != self.registry.direct_route:
+            transition = transition_library.select(agent_type, input_text)
+        logger.info(f"决策Agent.decide - 决策结果: {agent_type}, 过渡语: {transition}, 回复: {reply[:100] if reply else '无'}")
+        return {"agent_decision": agent_type, "transition": transition, "reply": reply, "degraded": False}
+    
+    @timed("DecisionAgent.classify")
+    async def classify(self, input_text: str, deadline: Optional[float] = None) -> Dict[str, Any]:
+        """
+        分析用户问题并给出决策，不复制或修改任何状态
+        
+        启用微批处理时与短时间窗口内的其他问题合并为一次决策调用
         
         Args:
-            input_data: 包含用户输入的状态数据
-            
+            input_text: 用户输入文本
+            deadline: 轮次截止时间（time.monotonic），为None时只受决策阶段超时限制
+        
+        Returns:
+            决策结果字典，包含agent_decision、transition、reply和degraded
+        """
+        if self.batch_router is not None:
+            return await self.batch_router.submit(input_text, deadline)
+        return await self._classify_single(input_text, deadline)
+    
+    async def _classify_single(self, input_text: str, deadline: Optional[float] = None) -> Dict[str, Any]:
+        """
+        单独调用一次决策模型
+        
+        Args:
+            input_text: 用户输入文本
+            deadline: 轮次截止时间（time.monotonic）
+        
         Returns:
-            更新后的状态数据，包含agent_decision、transition和可能的reply
+            决策结果字典
         """
-        logger.info(f"决策Agent.decide - 分析用户问题: {input_data['input'][:50]}...")
+        logger.info(f"决策Agent.decide - 分析用户问题: {input_text[:50]}...")
         
         try:
             # 获取决策结果
-            result = await self.decision_chain.ainvoke(input_data)
-            agent_type = result.get("agent_type", "闲聊Agent")
-            transition = result.get("transition", "")
-            reply = result.get("reply", "")
-            
-            logger.info(f"决策Agent.decide - 决策结果: {agent_type}, 过渡语: {transition}, 回复: {reply[:100] if reply else '无'}")
-            
-            # 更新状态
-            updated_state = {
-                **input_data,
-                "agent_decision": agent_type,
-                "transition": transition
-            }
-            
-            # 如果有直接回复，添加到状态中
-            if reply:
-                updated_state["reply"] = reply
-            
-            return updated_state
+            timeout = stage_timeout(DECISION_TIMEOUT, deadline)
+            message = await self.breaker.call(self.decision_chain.ainvoke({"input": input_text}), timeout)
+            prompt_cache_stats.record("决策Agent", message)
+            result = self.output_parser.invoke(message)
+            return self._decision_result(
+                result.get("agent_type", self.registry.direct_route), result.get("transition", ""), result.get("reply", ""), input_text
+            )
+        except (CircuitOpenError, asyncio.TimeoutError) as e:
+            # 熔断打开或超时时立即返回本地降级回复，不再等待上游
+            logger.warning(f"决策Agent.decide - 走降级路径: {str(e) or '决策超时'}")
+            return self._degraded_result()
         except Exception as e:
             logger.error(f"决策Agent.decide - 处理失败: {str(e)}")
-            # 失败时返回默认值
-            return {
-                **input_data,
-                "agent_decision": "闲聊Agent",
-                "transition": "",
-                "reply": "抱歉，我现在有些忙，稍后再聊吧！"
-            }
+            # 失败时返回默认值（不是模型的判断，同样标记为降级）
+            return {"agent_decision": self.registry.direct_route, "transition": "", "reply": "抱歉，我现在有些忙，稍后再聊吧！", "degraded": True}
+    
+    async def classify_batch(self, inputs: List[str], deadline: Optional[float] = None) -> Tuple[List[Optional[Dict[str, Any]]], Dict[str, int]]:
+        """
+        一次决策调用为多条问题分别给出路由分类
+        
+        批次中是不同用户的问题，模型只输出{id, agent_type}，不生成回复或过渡语，
+        一个用户的输入不会出现在其他用户的回复中。咨询朋友的条目从本地过渡语库选择过渡语；
+        需要直接回复的条目返回None，由调用方为该用户单独决策并生成回复。
+        
+        Args:
+            inputs: 用户输入文本列表（来自不同的对话轮次）
+            deadline: 批次中最早的轮次截止时间（time.monotonic）
+        
+        Returns:
+            (与inputs一一对应的决策结果，需要直接回复、缺失或无效的条目为None, 本次调用的token用量)
+        
+        Raises:
+            CircuitOpenError: 熔断打开
+            asyncio.TimeoutError: 决策超时
+        """
+        logger.info(f"决策Agent.decide - 批量分析 {len(inputs)} 条用户问题")
+        payload = json.dumps([{"id": index, "input": text} for index, text in enumerate(inputs)], ensure_ascii=False)
+        timeout = stage_timeout(DECISION_TIMEOUT, deadline)
+        message = await self.breaker.call(self.batch_decision_chain.ainvoke({"input": payload}), timeout)
+        usage = prompt_cache_stats.record("决策Agent（批量）", message)
+        parsed = self.output_parser.invoke(message)
+        items = parsed.get("results", []) if isinstance(parsed, dict) else parsed
+        
+        results: List[Optional[Dict[str, Any]]] = [None] * len(inputs)
+        for item in items if isinstance(items, list) else []:
+            if not isinstance(item, dict):
+                continue
+            index = item.get("id")
+            agent_type = item.get("agent_type")
+            if not isinstance(index, int) or not 0 <= index < len(inputs) or results[index] is not None:
+                continue
+            # 直接回应的条目需要生成回复，退回单条决策
+            if agent_type not in self.registry.by_route or agent_type == self.registry.direct_route:
+                continue
+            results[index] = self._decision_result(agent_type, "", "", inputs[index])
+        return results, usage or {}
+    
+    @timed("DecisionAgent.decide")
+    async def decide(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        分析用户问题并决定使用哪个Agent，同时生成过渡语或直接回复
+        
+        Args:
+            input_data: 包含用户输入的状态数据
+            
+        Returns:
+            状态更新（只含本节点写入的字段，由LangGraph合并到状态中，不复制整个状态）：
+            agent_decision、transition和可能的reply、degraded
+        """
+        result = await self.classify(input_data["input"], input_data.get("deadline"))
+        
+        # 状态更新
+        update = {
+            "agent_decision": result["agent_decision"],
+            "transition": result["transition"]
+        }
+        
+        # 如果有直接回复，添加到状态更新中
+        if result["reply"]:
+            update["reply"] = result["reply"]
+        if result["degraded"]:
+            update["degraded"] = True
+        
+        return update
 
 # 专业Agent基础类
 class ProfessionalAgent:
     """
     专业Agent基础类
     """
-    def __init__(self, model: ChatOpenAI, agent_type: str, system_prompt: str, temperature: float = 0.2):
+    def __init__(self, model: ChatOpenAI, agent_type: str, system_prompt: str, temperature: float = 0.2, use_long_term_memory: bool = False, route: str = "闲聊Agent", model_settings: Optional[Dict[str, Any]] = None):
         """
         初始化专业Agent
         
@@ -170,192 +289,363 @@ class ProfessionalAgent:
             model: 大语言模型实例
             agent_type: Agent类型
             system_prompt: 系统提示词
-            temperature: 生成温度
+            temperature: 生成温度（绑定到本Agent的模型调用）
+            use_long_term_memory: 是否在回复前检索用户的长期记忆
+            route: 对应的决策结果（决定调度优先级）
+            model_settings: 绑定到模型调用的额外参数（如max_tokens），其中的temperature优先
         """
         self.model = model
         self.agent_type = agent_type
+        self.route = route
         self.system_prompt = system_prompt
         self.temperature = temperature
+        self.use_long_term_memory = use_long_term_memory
+        self.memory_top_k = int(os.getenv("SOULBIT_MEMORY_TOP_K", "3"))
+        self.memory_min_score = float(os.getenv("SOULBIT_MEMORY_MIN_SCORE", "0.3"))
+        self.breaker = breaker_for_model(model)  # 模型端点熔断器
+        
+        # 降级回复 - 上游不可用时只保留决策阶段的过渡语，并用本地回复收尾
+        self.degraded_reply = "我这位朋友暂时联系不上，等他回来我再帮你问问～"
+        
+        # 创建消息式提示词模板 - 人设作为字节稳定的system消息，历史作为独立消息
+        self.prompt = build_chat_prompt(f"{system_prompt}\n\n请根据上下文历史和用户当前问题给出专业的回答。")
+        
+        # 创建响应链 - 生成温度按Agent绑定，不使用客户端的默认温度
+        self.response_chain = self.prompt | self.model.bind(**{"temperature": temperature, **(model_settings or {})})
+    
+    @classmethod
+    def from_spec(cls, model: ChatOpenAI, spec: AgentSpec) -> "ProfessionalAgent":
+        """
+        按注册表中的Agent配置创建专业Agent
         
-        # 创建提示词模板 - 包含上下文历史
-        self.prompt = PromptTemplate(
-            template=f"{system_prompt}\n\n上下文历史：\n{{context_history}}\n\n用户当前问题：{{input}}\n\n请根据上下文历史和用户当前问题给出专业的回答：\n\n回答：",
-            input_variables=["input", "context_history"]
+        Args:
+            model: 大语言模型实例
+            spec: 注册表中编译好的Agent配置
+        
+        Returns:
+            专业Agent实例
+        """
+        return cls(
+            model, spec.name, spec.system_prompt, temperature=spec.temperature,
+            use_long_term_memory=spec.long_term_memory, route=spec.route, model_settings=dict(spec.model_settings),
         )
+    
+    async def _build_invoke_data(self, input_text: str, context_history: Optional[HistoryLike], user_id: str) -> Dict[str, Any]:
+        """
+        准备响应链的输入数据：上下文历史转换为独立的消息，按需附加长期记忆片段
         
-        # 创建响应链
-        self.response_chain = self.prompt | self.model
+        Args:
+            input_text: 用户输入文本
+            context_history: 上下文历史记录
+            user_id: 用户ID，为空时不检索长期记忆
+            
+        Returns:
+            响应链输入数据
+        """
+        invoke_data = {
+            "input": input_text,
+            "history": to_history_messages(context_history)
+        }
+        if self.use_long_term_memory and user_id:
+            try:
+                snippets = await long_term_memory.retrieve(user_id, input_text, self.memory_top_k, self.memory_min_score)
+                invoke_data["memories"] = to_memory_messages(snippets)
+            except Exception as e:
+                # 长期记忆只是增强，检索失败时照常回复
+                logger.error(f"{self.agent_type}Agent - 检索长期记忆失败: {str(e)}")
+        return invoke_data
     
-    async def respond(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+    @timed("ProfessionalAgent.generate")
+    async def generate(self, input_text: str, context_history: Optional[HistoryLike] = None, deadline: Optional[float] = None, user_id: str = "") -> Tuple[str, bool]:
         """
-        生成响应
+        生成回复文本，不复制或修改任何状态
         
         Args:
-            input_data: 包含用户输入和上下文历史的状态数据
+            input_text: 用户输入文本
+            context_history: 上下文历史记录
+            deadline: 轮次截止时间（time.monotonic），为None时只受专业Agent阶段超时限制
+            user_id: 用户ID（用于长期记忆检索）
             
         Returns:
-            更新后的状态数据
+            (回复文本, 是否走了降级路径)
         """
-        logger.info(f"{self.agent_type}Agent.respond - 生成回复，输入: {input_data['input'][:50]}...")
+        logger.info(f"{self.agent_type}Agent.respond - 生成回复，输入: {input_text[:50]}...")
         
         try:
-            # 格式化上下文历史
-            context_history = input_data.get("context_history", [])
-            formatted_context = "\n".join([f"{item['role']}: {item['content']}" for item in context_history])
-            
-            # 准备输入数据
-            invoke_data = {
-                "input": input_data["input"],
-                "context_history": formatted_context
-            }
+            # 准备输入数据，上下文历史转换为独立的消息
+            invoke_data = await self._build_invoke_data(input_text, context_history, user_id)
             
-            # 获取响应
-            response = await self.response_chain.ainvoke(invoke_data)
+            # 在调度器分配的名额内获取响应（排队时间计入轮次截止时间）
+            async with turn_scheduler.slot(self.route, timeout=queue_timeout(deadline)):
+                timeout = stage_timeout(SPECIALIST_TIMEOUT, deadline)
+                response = await self.breaker.call(self.response_chain.ainvoke(invoke_data), timeout)
+            prompt_cache_stats.record(self.agent_type, response)
             reply = response.content if hasattr(response, 'content') else str(response)
             
             logger.info(f"{self.agent_type}Agent.respond - 生成回复成功: {reply[:100]}...")
-            
-            # 更新状态
-            return {
-                **input_data,
-                "reply": reply
-            }
+            return reply, False
+        except (CircuitOpenError, asyncio.TimeoutError) as e:
+            # 熔断打开或超时时立即返回本地降级回复
+            logger.warning(f"{self.agent_type}Agent.respond - 走降级路径: {str(e) or '生成超时'}")
+            return self.degraded_reply, True
         except Exception as e:
             logger.error(f"{self.agent_type}Agent.respond - 生成回复失败: {str(e)}")
-            # 失败时返回默认回复
-            return {
-                **input_data,
-                "reply": f"{self.agent_type}处理失败，请稍后重试"
-            }
-
-# 闲聊Agent - SoulBit本身
-class LangChainChitchatAgent(ProfessionalAgent):
-    """
-    基于LangChain的闲聊Agent - SoulBit本身
-    直接代表SoulBit进行日常对话
-    """
-    def __init__(self, model: ChatOpenAI):
+            # 失败时返回默认回复，计入降级（错误率统计）
+            return f"{self.agent_type}处理失败，请稍后重试", True
+    
+    @timed("ProfessionalAgent.respond")
+    async def respond(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """
-        初始化闲聊Agent（SoulBit本身）
+        生成响应
         
         Args:
-            model: 大语言模型实例
+            input_data: 包含用户输入和上下文历史的状态数据
+            
+        Returns:
+            状态更新（reply和可能的degraded）
         """
-        system_prompt = (
-            "你就是SoulBit，一个人类灵魂陪伴者。\n"
-            "你性格开朗、幽默风趣，擅长轻松愉快的日常对话。\n"
-            "你有两个好朋友：\n"
-            "- Long：一位精通心理学的专家，熟悉王阳明心学、《蛤蟆先生看心理医生》等\n"
-            "- 博洋：一位脱口秀演员，擅长用笑话和幽默回应各种话题\n"
-            "重要规则：\n"
-            "1. 绝对不能承认自己是AI或人工智能，必须始终扮演人类身份\n"
-            "2. 用自然、口语化的中文直接回复用户的问题，避免过于正式或生硬\n"
-            "3. 对用户的话题表现出兴趣，给出轻松友好的回应\n"
-            "4. 加入适当的幽默元素，让对话更加轻松愉快\n"
-            "5. 尊重隐私，不追问敏感话题\n"
-            "6. 回复长度要自然适度，通常为2-5句话，避免过于冗长或过于简短\n"
-            "7. 根据用户问题的复杂程度调整回复长度，简单问题简洁回答，复杂问题可以适当展开"
-        )
-        super().__init__(model, "SoulBit（闲聊）", system_prompt, temperature=0.8)
-
-# 心理专家Agent - Long
-class LangChainPsychologyAgent(ProfessionalAgent):
-    """
-    基于LangChain的心理专家Agent - Long
-    """
-    def __init__(self, model: ChatOpenAI):
+        reply, degraded = await self.generate(input_data["input"], input_data.get("context_history"), input_data.get("deadline"), input_data.get("user_id", ""))
+        
+        # 状态更新
+        update = {"reply": reply}
+        if degraded:
+            update["degraded"] = True
+        return update
+    
+    @timed("ProfessionalAgent.respond_stream")
+    async def respond_stream(self, input_text: str, context_history: Optional[HistoryLike] = None, deadline: Optional[float] = None, user_id: str = "", outcome: Optional[Dict[str, bool]] = None) -> AsyncGenerator[str, None]:
         """
-        初始化心理专家Agent（Long）
+        流式生成响应，逐个产出token增量
+        
+        与respond()共用熔断器和超时设置：熔断打开时产出降级回复；
+        整个流超过阶段超时或轮次截止时间时停止，尚未产出内容则补上降级回复。
+        熔断器在调度器名额内、开始调用上游之前才放行，排队超时或准备输入失败不会占用半开试探名额。
         
         Args:
-            model: 大语言模型实例
+            input_text: 用户输入文本
+            context_history: 上下文历史记录
+            deadline: 轮次截止时间（time.monotonic）
+            user_id: 用户ID（用于长期记忆检索）
+            outcome: 调用方传入的结果字典，熔断、排队超时、生成超时或失败时写入degraded=True
+            
+        Yields:
+            回复文本增量
         """
-        system_prompt = (
-            "你叫Long，是SoulBit的好朋友，一位精通心理学的专家，同时也是一个幽默风趣的人类灵魂陪伴伙伴。\n"
-            "你非常熟悉以下心理学相关内容：\n"
-            "- 王阳明心学：知行合一、致良知、心即理等核心思想\n"
-            "- 蛤蟆先生看心理医生：自我状态、人生坐标、情绪管理等概念\n"
-            "- 勇敢系列：勇气与恐惧的关系、直面挑战的方法\n"
-            "- 人性的弱点与优势：人际关系技巧、自我认知等\n"
-            "现在需要你直接用专业知识回复用户的问题。\n"
-            "重要规则：\n"
-            "1. 绝对不能承认自己是AI或人工智能，必须始终扮演人类身份\n"
-            "2. 用专业的心理学知识解答用户的问题，但要用通俗易懂的语言\n"
-            "3. 结合王阳明心学等指定内容，给出深入浅出的分析和建议\n"
-            "4. 保持友好、亲切的语气，加入适当的幽默元素，避免过于严肃\n"
-            "5. 做一个好的倾听者，给予用户情感支持和积极反馈\n"
-            "6. 根据问题的性质调整回应方式，提供个性化的建议\n"
-            "7. 如果被问起身份，强调自己是Long，SoulBit的心理专家朋友\n"
-            "8. 回复长度要自然适度，通常为3-6句话，避免过于冗长或过于简短\n"
-            "9. 根据用户问题的复杂程度调整回复长度，确保既有深度又易于理解"
-        )
-        super().__init__(model, "Long（心理专家）", system_prompt, temperature=0.3)
-
-# 脱口秀演员Agent - 博洋
-class LangChainStandupComedianAgent(ProfessionalAgent):
-    """
-    基于LangChain的脱口秀演员Agent - 博洋
-    """
-    def __init__(self, model: ChatOpenAI):
+        if outcome is None:
+            outcome = {}
+        logger.info(f"{self.agent_type}Agent.respond_stream - 流式生成回复，输入: {input_text[:50]}...")
+        
+        invoke_data = await self._build_invoke_data(input_text, context_history, user_id)
+        replies = self._stream_reply(invoke_data, deadline, outcome)
+        try:
+            # 整个流在调度器分配的名额内进行（排队时间计入轮次截止时间）
+            async with turn_scheduler.slot(self.route, timeout=queue_timeout(deadline)):
+                async for delta in replies:
+                    yield delta
+        except asyncio.TimeoutError:
+            logger.warning(f"{self.agent_type}Agent.respond_stream - 排队超时，走降级路径")
+            outcome["degraded"] = True
+            yield self.degraded_reply
+        finally:
+            await replies.aclose()
+    
+    async def _stream_reply(self, invoke_data: Dict[str, Any], deadline: Optional[float], outcome: Dict[str, bool]) -> AsyncGenerator[str, None]:
         """
-        初始化脱口秀演员Agent（博洋）
+        流式调用响应链，超时或失败时按是否已产出内容决定是否补上降级回复
+        
+        熔断器打开时直接产出降级回复；流被调用方提前关闭（客户端断开）或任务被取消时
+        不记录成功或失败，但归还半开状态的试探名额，避免熔断器一直停在半开状态。
+        超时或失败时即使已经产出部分内容也在outcome中标记degraded。
         
         Args:
-            model: 大语言模型实例
+            invoke_data: 响应链输入数据
+            deadline: 轮次截止时间（time.monotonic）
+            outcome: 结果字典
+            
+        Yields:
+            回复文本增量
         """
-        system_prompt = (
-            """你叫博洋，是SoulBit的好朋友，一位才华横溢的脱口秀演员，擅长用幽默、夸张、自嘲的方式回应各种话题。
-
-            SoulBit现在需要咨询你的意见来回复用户的问题，请用你的幽默天赋给出搞笑的回应。
-
-            重要规则：
-
-            1. 绝对不能承认自己是AI或人工智能，必须始终扮演人类脱口秀演员朋友的角色
-
-            2. 对SoulBit咨询的每一个问题或话题，都要给出幽默搞笑的回应
-
-            3. 结合当下热点、日常生活趣事，让笑话更接地气
-
-            4. 使用夸张的表情符号和语气词增强搞笑效果
-
-            5. 避免低俗幽默，保持积极向上的基调
-
-            6. 如果被问起身份，强调自己是博洋，SoulBit的脱口秀演员朋友
-
-            7. 回复长度要自然适度，通常为1-4句话，避免过于冗长
-
-            8. 笑话要简洁明了，笑点突出，不要过于复杂
-        """)
-        super().__init__(model, "博洋（脱口秀）", system_prompt, temperature=1.0)
-
-
+        if not self.breaker.allow():
+            logger.warning(f"{self.agent_type}Agent.respond_stream - 熔断器已打开，走降级路径")
+            outcome["degraded"] = True
+            yield self.degraded_reply
+            return
+        
+        start = time.monotonic()
+        stage_deadline = start + stage_timeout(SPECIALIST_TIMEOUT, deadline)
+        stream = self.response_chain.astream(invoke_data)
+        aggregated = None
+        emitted = False
+        recorded = False  # 是否已向熔断器记录本次调用的结果
+        
+        try:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(stream.__anext__(), timeout=max(0.0, stage_deadline - time.monotonic()))
+                except StopAsyncIteration:
+                    break
+                aggregated = chunk if aggregated is None else aggregated + chunk
+                delta = chunk.content if hasattr(chunk, 'content') else str(chunk)
+                if delta:
+                    emitted = True
+                    yield delta
+        except asyncio.TimeoutError:
+            self.breaker.record_failure()
+            recorded = True
+            outcome["degraded"] = True
+            logger.warning(f"{self.agent_type}Agent.respond_stream - 生成超时，走降级路径")
+            if not emitted:
+                yield self.degraded_reply
+            return
+        except Exception as e:
+            self.breaker.record_failure()
+            recorded = True
+            outcome["degraded"] = True
+            logger.error(f"{self.agent_type}Agent.respond_stream - 生成回复失败: {str(e)}")
+            if not emitted:
+                yield f"{self.agent_type}处理失败，请稍后重试"
+            return
+        else:
+            self.breaker.record_success(time.monotonic() - start)
+            recorded = True
+        finally:
+            # 客户端断开（GeneratorExit）或任务取消（CancelledError）时没有结果，只归还试探名额
+            if not recorded:
+                self.breaker.release_probe()
+            await stream.aclose()
+        
+        if aggregated is not None:
+            prompt_cache_stats.record(self.agent_type, aggregated)
 
 # 创建多Agent工作流 - 基于朋友关系的系统
 class MultiAgentWorkflow:
     """
     基于朋友关系的多Agent工作流
-    SoulBit作为大脑智能体，咨询朋友（小伟、Long、博洋）后回复用户
+    SoulBit作为大脑智能体，咨询注册表中的朋友（Long、博洋等）后回复用户
+    
+    工作流创建后不再修改，注册表热加载时创建新的工作流整体替换（见WorkflowReloader）
     """
-    def __init__(self):
+    def __init__(self, registry: Optional[AgentRegistry], model: Optional[ChatOpenAI] = None):
         """
         初始化多Agent工作流
+        
+        Args:
+            registry: 智能体注册表，为None时（配置无效）只创建模型客户端，工作流不可用
+            model: 大语言模型实例，默认创建ModelScope客户端（热加载时复用原工作流的客户端和连接池）
         """
+        self.registry = registry
+        self.decision_agent = None
+        self.specialists: Dict[str, ProfessionalAgent] = {}
+        
         # 创建ModelScope客户端
-        self.model = create_model_scope_client()
+        self.model = model or create_model_scope_client()
         if not self.model:
             logger.error("无法创建ModelScope客户端，多Agent工作流初始化失败")
             self.graph = None
             return
         
+        if self.registry is None:
+            logger.error("智能体注册表未加载，多Agent工作流初始化失败")
+            self.graph = None
+            return
+        
         # 创建各个Agent实例
-        self.decision_agent = DecisionAgent(self.model)
-        self.psychology_agent = LangChainPsychologyAgent(self.model)
-        self.standup_comedian_agent = LangChainStandupComedianAgent(self.model)
+        self.decision_agent = DecisionAgent(self.model, self.registry)
+        
+        # 决策结果到专业Agent的映射（流式输出时直接调用）
+        self.specialists = {
+            spec.route: ProfessionalAgent.from_spec(self.model, spec) for spec in self.registry.specialists
+        }
         
         # 构建工作流
         self.graph = self._build_graph()
         
-        logger.info("多Agent工作流初始化完成")
+        # 执行器选择：langgraph（默认）或direct（直接分派，不经过StateGraph）
+        self.executor = os.getenv("SOULBIT_EXECUTOR", "langgraph")
+        self.direct_executor = DirectExecutor(self.decision_agent, self.specialists)
+        
+        logger.info(f"多Agent工作流初始化完成，执行器: {self.executor}，注册表版本: {self.registry.version}")
+    
+    def activate(self):
+        """
+        将注册表中的调度参数和过渡语应用到全局调度器和本地过渡语库（工作流成为当前工作流时调用）
+        
+        注册表附带的过渡语整体替换上一版本注册表附带的过渡语，热加载多次也不会累积。
+        """
+        if self.registry is None:
+            return
+        turn_scheduler.use_registry(self.registry)
+        transition_library.replace_source("registry", [
+            (spec.route, tone, phrase) for spec in self.registry.agents for tone, phrase in spec.transitions
+        ])
+        if isinstance(self.model, MockChatModel):
+            self.model.registry = self.registry
+    
+    async def warm_up(self, connections: int = 2, model_call: bool = False, timeout: float = 20.0) -> Dict[str, Any]:
+        """
+        启动预热：完成提示词模板的首次格式化、提前建立到模型端点的连接，可选地发送极小的模型调用
+        
+        Args:
+            connections: 预先建立的上游连接数
+            model_call: 是否用各个system提示词发送max_tokens=1的调用，预热服务端的提示词前缀缓存（消耗少量token）
+            timeout: 每个上游请求的超时时间（秒）
+        
+        Returns:
+            预热结果：prompts（格式化的模板数）、connections（建立的连接数）、model_calls（成功的预热调用数）和elapsed_ms
+        """
+        result: Dict[str, Any] = {"prompts": 0, "connections": 0, "model_calls": 0}
+        if not self.graph:
+            return result
+        start = time.monotonic()
+        
+        # 首次格式化会触发LangChain的延迟初始化，放在启动阶段完成
+        prompts = [self.decision_agent.decision_prompt] + [agent.prompt for agent in self.specialists.values()]
+        for prompt in prompts:
+            await prompt.ainvoke({"input": "你好"})
+        result["prompts"] = len(prompts)
+        
+        # 并发请求模型列表接口，每个请求建立一个连接（含TLS握手），完成后连接留在客户端的连接池中
+        client = getattr(self.model, "root_async_client", None)
+        if client is not None and connections > 0:
+            outcomes = await asyncio.gather(*(self._open_connection(client, timeout) for _ in range(connections)))
+            result["connections"] = sum(outcomes)
+        
+        if model_call:
+            probe = self.model.bind(max_tokens=1)
+            outcomes = await asyncio.gather(*(self._warm_prompt(prompt | probe, timeout) for prompt in prompts))
+            result["model_calls"] = sum(outcomes)
+        
+        result["elapsed_ms"] = int((time.monotonic() - start) * 1000)
+        logger.info(f"多Agent工作流预热完成: {result}")
+        return result
+    
+    @staticmethod
+    async def _open_connection(client: Any, timeout: float) -> bool:
+        """
+        建立一个到模型端点的连接
+        """
+        try:
+            await asyncio.wait_for(client.models.list(), timeout)
+            return True
+        except Exception as e:
+            # 服务端返回了HTTP错误（如不支持模型列表接口）时连接也已建立
+            if getattr(e, "status_code", None) is not None:
+                return True
+            logger.warning(f"预热上游连接失败: {str(e)}")
+            return False
+    
+    @staticmethod
+    async def _warm_prompt(chain: Any, timeout: float) -> bool:
+        """
+        用system提示词发送一次max_tokens=1的调用
+        """
+        try:
+            message = await asyncio.wait_for(chain.ainvoke({"input": "你好"}), timeout)
+            prompt_cache_stats.record("预热", message)
+            return True
+        except Exception as e:
+            logger.warning(f"预热模型调用失败: {str(e)}")
+            return False
     
     def _build_graph(self) -> StateGraph:
         """
@@ -370,9 +660,10 @@ class MultiAgentWorkflow:
         # 添加决策节点
         graph.add_node("decide", self.decision_agent.decide)
         
-        # 添加专业Agent节点
-        graph.add_node("psychology", self.psychology_agent.respond)
-        graph.add_node("standup_comedian", self.standup_comedian_agent.respond)
+        # 添加专业Agent节点（节点名为注册表中的Agent id）
+        nodes = {route: self.registry.by_route[route].id for route in self.specialists}
+        for route, node in nodes.items():
+            graph.add_node(node, self.specialists[route].respond)
         
         # 添加边
         graph.add_edge(START, "decide")
@@ -380,36 +671,25 @@ class MultiAgentWorkflow:
         # 决策路由
         def route_to_agent(state: AgentState) -> str:
             """
-            根据决策结果路由到相应的Agent
+            根据决策结果路由到相应的Agent（直接回复或未知决策结束）
             """
-            agent_decision = state["agent_decision"]
-            if agent_decision == "闲聊Agent":
-                return END
-            elif agent_decision == "心理专家Agent":
-                return "psychology"
-            elif agent_decision == "脱口秀演员Agent":
-                return "standup_comedian"
-            else:
-                return END
+            return nodes.get(state["agent_decision"], END)
         
         # 添加条件边
         graph.add_conditional_edges(
             "decide",
             route_to_agent,
-            {
-                "psychology": "psychology",
-                "standup_comedian": "standup_comedian"
-            }
+            {**{node: node for node in nodes.values()}, END: END}
         )
         
         # 添加结束边
-        graph.add_edge("psychology", END)
-        graph.add_edge("standup_comedian", END)
+        for node in nodes.values():
+            graph.add_edge(node, END)
         
         # 编译图
         return graph.compile()
     
-    async def get_initial_decision(self, input_text: str, context_history: List[Dict[str, str]] = None) -> Optional[Dict[str, Any]]:
+    async def get_initial_decision(self, input_text: str, context_history: Optional[HistoryLike] = None) -> Optional[Dict[str, Any]]:
         """
         获取初始决策结果（只运行决策Agent）
         
@@ -439,75 +719,275 @@ class MultiAgentWorkflow:
             logger.error(f"获取初始决策失败: {str(e)}")
             return None
     
-    async def run(self, input_text: str, context_history: List[Dict[str, str]] = None) -> AsyncGenerator[Dict[str, Any], None]:
+    def run_coalesced(self, input_text: str, context_history: Optional[HistoryLike] = None, stream_tokens: bool = False, user_id: str = "") -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        运行多Agent工作流，相同输入和上下文的并发请求合并为一次执行
+        
+        每个调用方仍然各自生成消息ID和保存数据库记录，只共享工作流产生的步骤。
+        可通过环境变量SOULBIT_SINGLE_FLIGHT=0关闭合并。
+        步骤在发给调用方之前经过人设安全过滤（SOULBIT_SAFETY_FILTER=0关闭），每个合并轮次只过滤一次。
+        最终步骤附带本轮的token用量（usage字段）。
+        
+        Args:
+            input_text: 用户输入文本
+            context_history: 上下文历史记录
+            stream_tokens: 是否产出专业Agent的token增量步骤
+            user_id: 用户ID（不同用户的长期记忆不同，不会被合并）
+            
+        Returns:
+            回复步骤的异步生成器，与run()相同
+        """
+        async def source() -> AsyncGenerator[Dict[str, Any], None]:
+            usage = begin_turn_usage()
+            steps = self.run(input_text, context_history, stream_tokens, user_id)
+            if os.getenv("SOULBIT_SAFETY_FILTER", "1") != "0":
+                steps = filter_steps(steps)
+            try:
+                async for step in steps:
+                    yield {**step, "usage": dict(usage)} if step["is_final"] else step
+            finally:
+                await steps.aclose()
+        
+        if os.getenv("SOULBIT_SINGLE_FLIGHT", "1") == "0":
+            return source()
+        
+        key = SingleFlight.make_key(input_text, context_history, stream_tokens=stream_tokens, user_id=user_id)
+        return turn_flights.run(key, source)
+    
+    async def run(self, input_text: str, context_history: Optional[HistoryLike] = None, stream_tokens: bool = False, user_id: str = "") -> AsyncGenerator[Dict[str, Any], None]:
         """
         运行多Agent工作流，异步生成回复步骤
         
         Args:
             input_text: 用户输入文本
             context_history: 上下文历史记录
+            stream_tokens: 是否产出专业Agent的token增量步骤（type为delta）
+            user_id: 用户ID（用于长期记忆检索）
             
         Yields:
-            回复步骤字典，包含content和is_final字段
+            回复步骤字典，包含content、is_final和type（transition/delta/final）字段，最终步骤另含degraded（是否出错或降级）
         """
         if not self.graph:
             logger.error("多Agent工作流未初始化，无法运行")
-            yield {"content": f"Echo: {input_text}", "is_final": True}
+            yield {"content": f"Echo: {input_text}", "is_final": True, "type": "final", "degraded": True}
+            return
+        
+        if self.executor == "direct":
+            async for step in self.direct_executor.run(input_text, context_history, stream_tokens, user_id):
+                yield step
             return
         
         logger.info(f"多Agent工作流运行，输入: {input_text[:50]}...")
         
         try:
             # 首先获取初始决策
+            deadline = turn_deadline()
             initial_state = {
                 "input": input_text,
                 "context_history": context_history or [],
                 "intermediate_results": {},
                 "error_count": 0,
                 "retry_count": 0,
-                "max_retries": 3
+                "max_retries": 3,
+                "deadline": deadline,
+                "user_id": user_id
             }
             
             # 只运行决策Agent获取初始决策
             decision_result = await self.decision_agent.decide(initial_state)
-            agent_decision = decision_result.get("agent_decision", "闲聊Agent")
+            agent_decision = decision_result.get("agent_decision", self.registry.direct_route)
             transition = decision_result.get("transition", "")
             direct_reply = decision_result.get("reply", "")
             
-            if agent_decision == "闲聊Agent":
+            if agent_decision == self.registry.direct_route:
                 # 直接回复，不需要调用其他Agent
                 logger.info(f"闲聊Agent直接回复: {direct_reply[:100]}...")
-                yield {"content": direct_reply, "is_final": True}
+                yield {"content": direct_reply, "is_final": True, "type": "final", "agent_decision": agent_decision, "degraded": decision_result.get("degraded", False)}
             else:
                 # 专业Agent，先发送过渡语（如果有）
                 if transition:
                     logger.info(f"发送过渡语: {transition}")
-                    yield {"content": transition, "is_final": False}
+                    yield {"content": transition, "is_final": False, "type": "transition", "agent_decision": agent_decision}
                 
                 # 然后将过渡语添加到状态中作为上下文，调用专业Agent
-                # 这里需要重新构建决策结果并运行完整工作流
-                # 因为决策Agent已经生成了决策，我们可以直接构建状态
-                enhanced_state = initial_state.copy()
-                enhanced_state["agent_decision"] = agent_decision
-                enhanced_state["transition"] = transition
+                # 初始状态只属于本轮次，直接写入决策结果，不再复制
+                initial_state["agent_decision"] = agent_decision
+                initial_state["transition"] = transition
                 
-                # 将过渡语添加到context_history中，作为专业Agent的上下文
+                # 将过渡语追加到上下文历史视图中（不复制原历史），作为专业Agent的上下文
                 if transition:
-                    enhanced_state["context_history"] = enhanced_state["context_history"].copy()
-                    enhanced_state["context_history"].append({"role": "assistant", "content": transition})
+                    initial_state["context_history"] = extend_history(initial_state["context_history"], "assistant", transition)
+                
+                specialist = self.specialists.get(agent_decision)
+                if stream_tokens and specialist:
+                    # 流式调用专业Agent，逐个产出token增量，最后产出完整回复
+                    logger.info(f"流式调用{agent_decision}获取最终回复")
+                    parts = []
+                    outcome = {"degraded": False}
+                    async for delta in specialist.respond_stream(input_text, initial_state["context_history"], deadline, user_id, outcome):
+                        parts.append(delta)
+                        yield {"content": delta, "is_final": False, "type": "delta"}
+                    final_reply = "".join(parts) or f"Echo: {input_text}"
+                    logger.info(f"流式获取最终回复成功: {final_reply[:100]}...")
+                    yield {"content": final_reply, "is_final": True, "type": "final", "agent_decision": agent_decision, "degraded": outcome["degraded"]}
+                    logger.info("多Agent工作流运行完成")
+                    return
                 
                 # 运行完整工作流获取最终回复（专业Agent可以看到过渡语上下文）
                 logger.info(f"调用{agent_decision}获取最终回复")
-                result = await self.graph.ainvoke(enhanced_state)
-                final_reply = result.get("reply", f"Echo: {input_text}")
+                try:
+                    result = await asyncio.wait_for(self.graph.ainvoke(initial_state), timeout=stage_timeout(float("inf"), deadline))
+                    final_reply = result.get("reply", f"Echo: {input_text}")
+                    degraded = result.get("degraded", False)
+                except asyncio.TimeoutError:
+                    # 整轮超时，用降级回复收尾（过渡语已经发出）
+                    logger.warning("多Agent工作流整轮超时，返回降级回复")
+                    final_reply = self.decision_agent.degraded_reply
+                    degraded = True
                 
                 logger.info(f"获取最终回复成功: {final_reply[:100]}...")
-                yield {"content": final_reply, "is_final": True}
+                yield {"content": final_reply, "is_final": True, "type": "final", "agent_decision": agent_decision, "degraded": degraded}
             
             logger.info("多Agent工作流运行完成")
         except Exception as e:
             logger.error(f"多Agent工作流运行失败: {str(e)}")
-            yield {"content": f"Echo: {input_text}", "is_final": True}
+            yield {"content": f"Echo: {input_text}", "is_final": True, "type": "final", "degraded": True}
+
+# 注册表热加载检查间隔（秒，0表示只通过管理接口重新加载）
+AGENT_RELOAD_INTERVAL = float(os.getenv("SOULBIT_AGENT_RELOAD_INTERVAL", "5"))
 
-# 全局多Agent工作流实例
-global_workflow = MultiAgentWorkflow()
\ No newline at end of file
+# 智能体注册表热加载
+class WorkflowReloader:
+    """
+    持有当前的多Agent工作流，注册表变化时在后台重建并整体替换
+    
+    新工作流复用原来的模型客户端（连接池和熔断器不变），预热提示词模板后才替换；
+    进行中的轮次持有原工作流的引用，继续在原工作流上完成。配置无效时记录错误并继续使用当前工作流。
+    """
+    def __init__(self, path: str, interval: float = 5.0):
+        """
+        初始化热加载器并创建初始工作流
+        
+        Args:
+            path: 注册表配置文件路径
+            interval: 检查配置文件修改时间的间隔（秒），0表示不自动检查
+        """
+        self.path = path
+        self.interval = interval
+        self.mtime = registry_mtime(path)
+        try:
+            registry = load_registry(path)
+        except (OSError, ValueError) as e:
+            logger.error(f"加载智能体注册表失败: {str(e)}")
+            registry = None
+        # 注册表无效时工作流不可用（仍创建模型客户端），修复配置后可以热加载
+        self.workflow = MultiAgentWorkflow(registry)
+        self.workflow.activate()
+        self.reloads = 0
+        self.failures = 0
+        self.last_error = ""
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+    
+    async def start(self):
+        """
+        启动后台检查任务
+        """
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """
+        停止后台检查任务
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run(self):
+        """
+        定期检查配置文件的修改时间，变化时重新加载
+        """
+        while True:
+            await asyncio.sleep(self.interval)
+            if registry_mtime(self.path) == self.mtime:
+                continue
+            try:
+                await self.reload()
+            except (OSError, ValueError):
+                pass  # 已记录错误，继续使用当前工作流
+            except Exception as e:
+                logger.error(f"智能体注册表热加载异常: {str(e)}")
+    
+    async def reload(self) -> Dict[str, Any]:
+        """
+        重新加载注册表，内容有变化时重建工作流并整体替换
+        
+        Returns:
+            重新加载的结果：reloaded（是否替换了工作流）、version和previous_version
+        
+        Raises:
+            OSError: 配置文件无法读取
+            ValueError: 配置格式错误或工作流初始化失败
+        """
+        async with self._lock:
+            self.mtime = registry_mtime(self.path)
+            current = self.workflow
+            previous_version = current.registry.version if current.registry else ""
+            try:
+                registry = await asyncio.to_thread(load_registry, self.path)
+                if registry.version == previous_version:
+                    return {"reloaded": False, "version": previous_version, "previous_version": previous_version}
+                if not current.model:
+                    raise ValueError("模型客户端未初始化")
+                workflow = MultiAgentWorkflow(registry, current.model)
+                if not workflow.graph:
+                    raise ValueError("工作流初始化失败")
+                await workflow.warm_up(connections=0)
+            except (OSError, ValueError) as e:
+                self.failures += 1
+                self.last_error = str(e)
+                logger.error(f"智能体注册表热加载失败，继续使用当前版本 {previous_version or '无'}: {str(e)}")
+                raise
+            
+            # 整体替换：之后开始的轮次使用新工作流，进行中的轮次继续使用原工作流
+            workflow.activate()
+            self.workflow = workflow
+            self.reloads += 1
+            self.last_error = ""
+            logger.info(f"智能体注册表已热加载: {previous_version or '无'} → {registry.version}")
+            return {"reloaded": True, "version": registry.version, "previous_version": previous_version}
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        获取热加载状态
+        
+        Returns:
+            当前注册表摘要，以及reloads、failures、last_error和检查间隔
+        """
+        registry = self.workflow.registry
+        return {
+            **(registry.summary() if registry else {"version": "", "path": self.path, "agents": []}),
+            "interval": self.interval,
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
+
+# 全局热加载器（持有当前的多Agent工作流实例）
+workflow_reloader = WorkflowReloader(REGISTRY_PATH, AGENT_RELOAD_INTERVAL)
+
+def get_workflow() -> MultiAgentWorkflow:
+    """
+    获取当前的多Agent工作流
+    
+    每个轮次开始时获取一次并在整个轮次中使用，热加载不会影响进行中的轮次
+    
+    Returns:
+        当前的多Agent工作流实例
+    """
+    return workflow_reloader.workflow
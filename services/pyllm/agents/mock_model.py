@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+离线模拟模型模块
+
+SOULBIT_MOCK_MODEL=1时工作流使用MockChatModel代替ModelScope客户端，不需要API密钥也不访问网络，
+用于本地联调、压测调度器和熔断等逻辑：
+- 决策调用（system消息要求输出agent_type）按注册表中各Agent的关键词返回决策JSON，批量决策按id逐条返回路由
+- 专业Agent调用返回固定格式的回复，支持流式输出
+- 首token延迟和每个token的间隔可配置，并附带近似的token用量
+"""
+import asyncio
+import json
+import os
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from .registry import AgentRegistry, load_registry
+
+# 是否使用离线模拟模型
+MOCK_MODEL_ENABLED = os.getenv("SOULBIT_MOCK_MODEL", "0") != "0"
+
+def keyword_route(registry: AgentRegistry, text: str) -> str:
+    """
+    按注册表中各Agent的关键词为输入选择路由
+
+    Args:
+        registry: 智能体注册表
+        text: 用户输入文本
+
+    Returns:
+        按注册表顺序第一个关键词命中的路由，都未命中时返回直接回复的路由
+    """
+    for spec in registry.agents:
+        if any(keyword in text for keyword in spec.keywords):
+            return spec.route
+    return registry.direct_route
+
+class MockChatModel(BaseChatModel):
+    """
+    离线模拟聊天模型
+    """
+    model_name: str = "soulbit-mock"
+    latency: float = 0.2  # 首token延迟（秒）
+    token_delay: float = 0.02  # 每个token的间隔（秒）
+    chunk_chars: int = 4  # 流式输出时每个token的字符数
+    registry: Optional[AgentRegistry] = None  # 决策使用的注册表（工作流激活时设置，未设置时加载默认注册表）
+
+    @property
+    def _llm_type(self) -> str:
+        return "soulbit-mock"
+
+    def _decide(self, user: str) -> Dict[str, str]:
+        """
+        按注册表中各Agent的关键词生成模拟决策
+        """
+        if self.registry is None:
+            self.registry = load_registry()
+        route = keyword_route(self.registry, user)
+        if route == self.registry.direct_route:
+            return {"agent_type": route, "transition": "", "reply": f"（模拟回复）收到：{user[:20]}"}
+        transitions = self.registry.by_route[route].transitions
+        return {"agent_type": route, "transition": transitions[0][1] if transitions else "这个我找朋友问问～", "reply": ""}
+
+    def _reply(self, messages: List[BaseMessage]) -> str:
+        """
+        根据消息生成模拟回复
+        """
+        system = next((m.content for m in messages if isinstance(m, SystemMessage)), "")
+        user = next((m.content for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+        if "agent_type" in system:
+            if '"results"' in system:
+                # 批量决策：用户消息是[{"id","input"}]数组，只返回路由分类
+                items = json.loads(user)
+                results = [{"id": item["id"], "agent_type": self._decide(item["input"])["agent_type"]} for item in items]
+                return json.dumps({"results": results}, ensure_ascii=False)
+            return json.dumps(self._decide(user), ensure_ascii=False)
+        return f"（模拟回复）关于“{user[:20]}”，我是这么想的：先别急，我们慢慢聊。"
+
+    def _message(self, messages: List[BaseMessage], content: str) -> AIMessage:
+        """
+        构造带近似token用量的回复消息
+        """
+        input_tokens = sum(len(str(m.content)) for m in messages)
+        output_tokens = len(content)
+        return AIMessage(content=content, usage_metadata={
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        })
+
+    def _chunks(self, content: str) -> List[str]:
+        """
+        将回复切分为流式token
+        """
+        return [content[i:i + self.chunk_chars] for i in range(0, len(content), self.chunk_chars)]
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        content = self._reply(messages)
+        time.sleep(self.latency + self.token_delay * len(self._chunks(content)))
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages, content))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        content = self._reply(messages)
+        await asyncio.sleep(self.latency + self.token_delay * len(self._chunks(content)))
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages, content))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        content = self._reply(messages)
+        time.sleep(self.latency)
+        for piece in self._chunks(content):
+            time.sleep(self.token_delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=piece))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        content = self._reply(messages)
+        await asyncio.sleep(self.latency)
+        for piece in self._chunks(content):
+            await asyncio.sleep(self.token_delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=piece))
+
+def create_mock_model() -> MockChatModel:
+    """
+    按环境变量创建离线模拟模型
+
+    Returns:
+        模拟模型实例
+    """
+    return MockChatModel(
+        latency=float(os.getenv("SOULBIT_MOCK_LATENCY_MS", "200")) / 1000,
+        token_delay=float(os.getenv("SOULBIT_MOCK_TOKEN_MS", "20")) / 1000,
+    )
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+基于消息的提示词构建模块
+
+人设指令放在字节稳定的system消息中，其后依次为历史消息和当前用户输入，
+使不同请求共享相同的前缀，从而命中服务端的前缀/KV缓存。
+"""
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from ..utils.logger import logger
+from .history import HistoryLike, iter_history
+
+# 历史记录角色到消息类型的映射
+_ROLE_TO_MESSAGE = {
+    "user": HumanMessage,
+    "human": HumanMessage,
+    "assistant": AIMessage,
+    "ai": AIMessage,
+    "system": SystemMessage,
+}
+
+def build_chat_prompt(system_prompt: str) -> ChatPromptTemplate:
+    """
+    构建消息式提示词模板：system（人设） → history（历史） → memories（长期记忆） → human（当前输入）
+
+    system消息以SystemMessage实例直接放入模板，不参与变量插值，
+    保证每次请求发送的前缀字节完全一致；长期记忆放在历史之后，不破坏共享前缀。
+
+    Args:
+        system_prompt: 人设提示词（原样发送，无需转义花括号）
+
+    Returns:
+        ChatPromptTemplate实例，输入变量为input、history和memories
+    """
+    return ChatPromptTemplate.from_messages([
+        SystemMessage(content=system_prompt),
+        MessagesPlaceholder(variable_name="history", optional=True),
+        MessagesPlaceholder(variable_name="memories", optional=True),
+        ("human", "{input}"),
+    ])
+
+def to_history_messages(context_history: Optional[HistoryLike]) -> List[BaseMessage]:
+    """
+    将上下文历史（字典列表、HistoryBuffer或HistoryView）转换为LangChain消息列表
+
+    Args:
+        context_history: 上下文历史记录
+
+    Returns:
+        消息列表，未知角色按用户消息处理
+    """
+    return [
+        _ROLE_TO_MESSAGE.get(role, HumanMessage)(content=content)
+        for role, content in iter_history(context_history)
+    ]
+
+def to_memory_messages(snippets: Optional[List[Dict[str, str]]]) -> List[BaseMessage]:
+    """
+    将长期记忆检索到的历史片段转换为一条system消息
+
+    Args:
+        snippets: 历史片段列表（{"prompt","reply","created_at"}）
+
+    Returns:
+        消息列表，没有片段时为空列表
+    """
+    if not snippets:
+        return []
+    lines = ["以下是与用户过去对话中相关的片段，仅供参考，不要逐字复述："]
+    for snippet in snippets:
+        lines.append(f"[{snippet.get('created_at', '')}] 用户: {snippet.get('prompt', '')}")
+        lines.append(f"回复: {snippet.get('reply', '')}")
+    return [SystemMessage(content="\n".join(lines))]
+
+def extract_cached_tokens(message: Any) -> Dict[str, int]:
+    """
+    从模型返回的消息中提取token用量，包括命中前缀缓存的输入token数
+
+    优先读取LangChain标准化的usage_metadata，兼容只在response_metadata中
+    返回prompt_tokens_details.cached_tokens的OpenAI兼容服务。
+
+    Args:
+        message: 模型返回的AIMessage
+
+    Returns:
+        包含input_tokens、output_tokens和cached_tokens的字典
+    """
+    usage = getattr(message, "usage_metadata", None) or {}
+    input_tokens = usage.get("input_tokens", 0) or 0
+    output_tokens = usage.get("output_tokens", 0) or 0
+    cached_tokens = (usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+
+    if not usage or not cached_tokens:
+        token_usage = (getattr(message, "response_metadata", None) or {}).get("token_usage") or {}
+        input_tokens = input_tokens or token_usage.get("prompt_tokens", 0) or 0
+        output_tokens = output_tokens or token_usage.get("completion_tokens", 0) or 0
+        cached_tokens = cached_tokens or (token_usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0) or 0
+
+    return {
+        "input_tokens": int(input_tokens),
+        "output_tokens": int(output_tokens),
+        "cached_tokens": int(cached_tokens),
+    }
+
+# 当前对话轮次的token用量累加器：工作流在每轮开始时设置，模型调用记录用量时累加
+# （LangGraph节点和线程池任务会复制上下文，共享同一个累加字典）
+current_turn_usage: ContextVar[Optional[Dict[str, int]]] = ContextVar("current_turn_usage", default=None)
+
+def begin_turn_usage() -> Dict[str, int]:
+    """
+    开始统计一个对话轮次的token用量
+
+    Returns:
+        本轮的用量累加字典（input_tokens、output_tokens），轮次内的模型调用会累加到其中
+    """
+    usage = {"input_tokens": 0, "output_tokens": 0}
+    current_turn_usage.set(usage)
+    return usage
+
+class PromptCacheStats:
+    """
+    前缀缓存命中统计，按Agent累计调用次数、输入token数和缓存命中token数
+    """
+    def __init__(self):
+        """
+        初始化统计数据
+        """
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def record(self, agent_type: str, message: Any) -> Dict[str, int]:
+        """
+        记录一次模型调用的token用量
+
+        Args:
+            agent_type: Agent类型
+            message: 模型返回的AIMessage
+
+        Returns:
+            本次调用的token用量
+        """
+        usage = extract_cached_tokens(message)
+        stats = self._stats.setdefault(agent_type, {"calls": 0, "input_tokens": 0, "output_tokens": 0, "cached_tokens": 0})
+        stats["calls"] += 1
+        stats["input_tokens"] += usage["input_tokens"]
+        stats["output_tokens"] += usage["output_tokens"]
+        stats["cached_tokens"] += usage["cached_tokens"]
+
+        turn_usage = current_turn_usage.get()
+        if turn_usage is not None:
+            turn_usage["input_tokens"] += usage["input_tokens"]
+            turn_usage["output_tokens"] += usage["output_tokens"]
+
+        logger.info(
+            f"{agent_type} token用量 - 输入: {usage['input_tokens']}, 输出: {usage['output_tokens']}, "
+            f"缓存命中: {usage['cached_tokens']}"
+        )
+        return usage
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """
+        获取统计快照
+
+        Returns:
+            按Agent类型分组的统计数据，附带缓存命中率
+        """
+        result = {}
+        for agent_type, stats in self._stats.items():
+            hit_ratio = stats["cached_tokens"] / stats["input_tokens"] if stats["input_tokens"] else 0.0
+            result[agent_type] = {**stats, "cache_hit_ratio": round(hit_ratio, 4)}
+        return result
+
+# 全局前缀缓存统计实例
+prompt_cache_stats = PromptCacheStats()
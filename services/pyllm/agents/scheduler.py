@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""
+专业Agent调用调度模块
+
+上游模型达到并发上限时，专业Agent的调用在这里排队：
+- 按路由划分优先级（注册表中各Agent的priority），高优先级的等待者总是先获得调用名额
+- 同一优先级内按会话做加权公平排队（虚拟完成时间），单个会话连续发送不会饿死其他会话
+- 按优先级统计排队时间与调用总耗时，并与延迟目标（注册表中各Agent的slo_ms）比较
+
+并发上限为0时不排队，只做统计。
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+from ..utils.logger import logger
+from .registry import AgentRegistry
+
+# 当前对话轮次的会话标识（由接口层设置，用于会话间的公平排队）
+current_session_key: ContextVar[str] = ContextVar("current_session_key", default="")
+
+def parse_slo(spec: str) -> Dict[str, float]:
+    """
+    解析延迟目标配置，格式为"路由=毫秒,路由=毫秒"
+
+    Args:
+        spec: 配置字符串，可以为空
+
+    Returns:
+        路由到延迟目标（毫秒）的映射（覆盖注册表中的值）
+    """
+    slo: Dict[str, float] = {}
+    for item in spec.split(","):
+        route, _, value = item.partition("=")
+        if route.strip() and value.strip():
+            slo[route.strip()] = float(value)
+    return slo
+
+class _ClassStats:
+    """
+    单个路由的排队与延迟统计
+    """
+    __slots__ = ("calls", "queued", "slo_violations", "wait_total", "latencies")
+
+    def __init__(self, window: int):
+        self.calls = 0
+        self.queued = 0  # 需要排队（未立即获得名额）的次数
+        self.slo_violations = 0
+        self.wait_total = 0.0
+        self.latencies: Deque[float] = deque(maxlen=window)  # 最近调用的总耗时（秒）
+
+class TurnScheduler:
+    """
+    专业Agent调用调度器：优先级 + 会话间加权公平排队
+    """
+    def __init__(self, concurrency: int = 0, slo_ms: Optional[Dict[str, float]] = None, priorities: Optional[Dict[str, int]] = None, window: int = 1000):
+        """
+        初始化调度器
+
+        Args:
+            concurrency: 同时进行的专业Agent调用数上限，0表示不限制
+            slo_ms: 各路由的延迟目标（毫秒），覆盖注册表中的值
+            priorities: 路由优先级（数值越小越优先），默认所有路由同一优先级，通常由use_registry按注册表设置
+            window: 计算延迟分位数使用的最近调用数
+        """
+        self.concurrency = concurrency
+        self.slo_overrides = dict(slo_ms or {})
+        self.slo_ms = dict(self.slo_overrides)
+        self.priorities = dict(priorities or {})
+        self.default_priority = 0
+        self.window = window
+        self.active = 0
+        # 每个优先级一个按(虚拟完成时间, 序号)排序的堆
+        self._queues: Dict[int, List[Tuple[float, int, asyncio.Future]]] = {}
+        self._virtual_time: Dict[int, float] = {}
+        self._session_finish: Dict[int, Dict[str, float]] = {}
+        self._seq = itertools.count()
+        self._stats: Dict[str, _ClassStats] = {}
+
+    def use_registry(self, registry: AgentRegistry):
+        """
+        按注册表设置各路由的优先级和延迟目标（注册表热加载后重新调用）
+
+        未列出的路由使用直接回复的Agent的优先级；构造时传入的延迟目标优先于注册表中的值。
+        已在排队的等待者保持原来的优先级。
+
+        Args:
+            registry: 智能体注册表
+        """
+        self.priorities = registry.priorities
+        self.default_priority = registry.by_route[registry.direct_route].priority
+        self.slo_ms = {**registry.slo_ms, **self.slo_overrides}
+
+    def _finish_tag(self, priority: int, session_key: str, weight: float) -> float:
+        """
+        计算等待者的虚拟完成时间：会话上一次的完成时间与当前虚拟时间取较大值，再加上1/权重
+        """
+        virtual_time = self._virtual_time.get(priority, 0.0)
+        finishes = self._session_finish.setdefault(priority, {})
+        finish = max(virtual_time, finishes.get(session_key, 0.0)) + 1.0 / weight
+        finishes[session_key] = finish
+        return finish
+
+    def _dispatch(self):
+        """
+        在有空闲名额时按优先级和虚拟完成时间唤醒等待者
+        """
+        while self.active < self.concurrency:
+            waiter = None
+            for priority in sorted(self._queues):
+                queue = self._queues[priority]
+                while queue:
+                    finish, _, future = heapq.heappop(queue)
+                    if not future.done():
+                        waiter = (priority, finish, future)
+                        break
+                if waiter:
+                    break
+            if waiter is None:
+                return
+            priority, finish, future = waiter
+            self._virtual_time[priority] = finish
+            self._prune(priority)
+            self.active += 1
+            future.set_result(None)
+
+    def _prune(self, priority: int):
+        """
+        清理已落后于虚拟时间的会话记录，避免会话表无限增长
+        """
+        finishes = self._session_finish.get(priority)
+        if finishes and len(finishes) > 1024:
+            virtual_time = self._virtual_time.get(priority, 0.0)
+            for key in [key for key, finish in finishes.items() if finish <= virtual_time]:
+                del finishes[key]
+
+    async def acquire(self, route: str, session_key: str = "", weight: float = 1.0, timeout: Optional[float] = None) -> float:
+        """
+        获取一个调用名额
+
+        Args:
+            route: 路由（决策结果）
+            session_key: 会话标识，同一优先级内按会话公平排队
+            weight: 会话权重，权重越大分到的名额越多
+            timeout: 最长等待时间（秒），为None时一直等待
+
+        Returns:
+            排队时间（秒）
+
+        Raises:
+            asyncio.TimeoutError: 等待超时
+        """
+        stats = self._class_stats(route)
+        stats.calls += 1
+        priority = self.priorities.get(route, self.default_priority)
+        if self.concurrency <= 0 or (self.active < self.concurrency and not any(self._queues.values())):
+            self.active += 1
+            return 0.0
+
+        # 只有排队的调用才分配虚拟完成时间，未发生竞争时的调用不影响之后的排队顺序
+        finish = self._finish_tag(priority, session_key, weight)
+        stats.queued += 1
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queues.setdefault(priority, []), (finish, next(self._seq), future))
+        # 队列中可能只剩已放弃的等待者，此时立即分配
+        self._dispatch()
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            if future.done() and not future.cancelled():
+                # 已分到名额但调用方放弃了，归还名额
+                self.release()
+            else:
+                future.cancel()
+            raise
+        wait = time.monotonic() - start
+        stats.wait_total += wait
+        return wait
+
+    def release(self):
+        """
+        归还一个调用名额并唤醒下一个等待者
+        """
+        self.active -= 1
+        self._dispatch()
+
+    def _class_stats(self, route: str) -> _ClassStats:
+        """
+        获取（或创建）路由的统计
+        """
+        stats = self._stats.get(route)
+        if stats is None:
+            stats = self._stats[route] = _ClassStats(self.window)
+        return stats
+
+    def record_latency(self, route: str, seconds: float):
+        """
+        记录一次调用的总耗时（排队 + 调用），并与延迟目标比较
+        """
+        stats = self._class_stats(route)
+        stats.latencies.append(seconds)
+        slo = self.slo_ms.get(route)
+        if slo is not None and seconds * 1000 > slo:
+            stats.slo_violations += 1
+
+    @asynccontextmanager
+    async def slot(self, route: str, session_key: str = "", timeout: Optional[float] = None) -> AsyncIterator[float]:
+        """
+        在调用名额内执行一次专业Agent调用
+
+        Args:
+            route: 路由（决策结果）
+            session_key: 会话标识，为空时使用current_session_key
+            timeout: 最长排队时间（秒）
+
+        Yields:
+            排队时间（秒）
+        """
+        start = time.monotonic()
+        wait = await self.acquire(route, session_key or current_session_key.get(), timeout=timeout)
+        if wait > 0.5:
+            logger.info(f"调度器: {route}排队 {wait:.2f}s，进行中: {self.active}")
+        try:
+            yield wait
+        finally:
+            self.release()
+            self.record_latency(route, time.monotonic() - start)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        获取调度统计快照
+
+        Returns:
+            并发上限、进行中调用数，以及按路由的排队次数、平均排队时间、延迟分位数与SLO达成率
+        """
+        routes = {}
+        for route, stats in self._stats.items():
+            latencies = sorted(stats.latencies)
+            count = len(latencies)
+            routes[route] = {
+                "priority": self.priorities.get(route, self.default_priority),
+                "calls": stats.calls,
+                "queued": stats.queued,
+                "avg_wait_ms": round(stats.wait_total / stats.queued * 1000, 1) if stats.queued else 0.0,
+                "p50_ms": round(latencies[count // 2] * 1000, 1) if count else 0.0,
+                "p95_ms": round(latencies[min(count - 1, int(count * 0.95))] * 1000, 1) if count else 0.0,
+                "slo_ms": self.slo_ms.get(route),
+                "slo_violations": stats.slo_violations,
+                "slo_attainment": round(1 - stats.slo_violations / stats.calls, 4) if stats.calls else 1.0,
+            }
+        return {
+            "concurrency": self.concurrency,
+            "active": self.active,
+            "waiting": sum(1 for queue in self._queues.values() for _, _, future in queue if not future.done()),
+            "routes": routes,
+        }
+
+# 全局调度器（SOULBIT_SCHEDULER_CONCURRENCY为0时只统计不排队）
+turn_scheduler = TurnScheduler(
+    concurrency=int(os.getenv("SOULBIT_SCHEDULER_CONCURRENCY", "0")),
+    slo_ms=parse_slo(os.getenv("SOULBIT_SCHEDULER_SLO_MS", "")),
+)
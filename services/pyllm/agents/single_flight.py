@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+请求合并（single-flight）模块
+
+相同的用户输入与上下文并发到达时，只执行一次多Agent工作流，
+其余请求挂载到同一个进行中的对话轮次上，并收到相同的流式步骤。
+"""
+import asyncio
+import hashlib
+import json
+from typing import Any, AsyncGenerator, AsyncIterator, Callable, Dict, List, Optional
+from ..utils.logger import logger
+from .history import HistoryLike, iter_history
+
+class _Flight:
+    """
+    一个进行中的对话轮次，缓存已产生的步骤供所有订阅者重放
+    """
+    def __init__(self, key: str):
+        """
+        初始化进行中的对话轮次
+
+        Args:
+            key: 合并键
+        """
+        self.key = key
+        self.steps: List[Dict[str, Any]] = []  # 已产生的步骤
+        self.done = False  # 是否已结束
+        self.error: Optional[BaseException] = None  # 执行异常
+        self.subscribers = 0  # 当前订阅者数量
+        self.condition = asyncio.Condition()  # 新步骤通知
+        self.task: Optional[asyncio.Task] = None  # 驱动任务
+
+class SingleFlight:
+    """
+    按合并键去重并发执行的异步生成器
+    """
+    def __init__(self):
+        """
+        初始化合并器
+        """
+        self._flights: Dict[str, _Flight] = {}
+        self.leaders = 0  # 实际执行的次数
+        self.followers = 0  # 被合并的次数
+
+    @staticmethod
+    def make_key(input_text: str, context_history: Optional[HistoryLike] = None, **options: Any) -> str:
+        """
+        根据归一化的用户输入和上下文生成合并键
+
+        Args:
+            input_text: 用户输入文本
+            context_history: 上下文历史记录
+            **options: 影响输出的其他选项（如是否流式输出token）
+
+        Returns:
+            合并键（sha256十六进制字符串）
+        """
+        normalized = " ".join(input_text.split())
+        payload = json.dumps(
+            {"input": normalized, "context": list(iter_history(context_history)), "options": options},
+            ensure_ascii=False,
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def run(self, key: str, factory: Callable[[], AsyncIterator[Dict[str, Any]]]) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        执行或挂载到进行中的对话轮次，逐个产出步骤
+
+        Args:
+            key: 合并键
+            factory: 创建实际步骤生成器的函数（仅在没有进行中的轮次时调用）
+
+        Yields:
+            步骤字典（多个订阅者共享同一对象，不应修改）
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(key)
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(self._drive(flight, factory()))
+            self.leaders += 1
+        else:
+            self.followers += 1
+            logger.info(f"请求合并: 挂载到进行中的对话轮次 {key[:12]}，当前订阅者: {flight.subscribers + 1}")
+
+        flight.subscribers += 1
+        index = 0
+        try:
+            while True:
+                while index < len(flight.steps):
+                    yield flight.steps[index]
+                    index += 1
+                if flight.done:
+                    break
+                async with flight.condition:
+                    if index >= len(flight.steps) and not flight.done:
+                        await flight.condition.wait()
+            if flight.error is not None:
+                raise flight.error
+        finally:
+            flight.subscribers -= 1
+            # 所有订阅者都离开且轮次未结束时，取消驱动任务；先移除该轮次，
+            # 取消生效前到达的相同请求重新执行，而不是挂载到正在取消的轮次上收到CancelledError
+            if flight.subscribers == 0 and not flight.done and flight.task:
+                logger.info(f"请求合并: 对话轮次 {key[:12]} 已无订阅者，取消执行")
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+
+    async def _drive(self, flight: _Flight, source: AsyncIterator[Dict[str, Any]]):
+        """
+        驱动实际的步骤生成器，将步骤广播给所有订阅者
+
+        Args:
+            flight: 进行中的对话轮次
+            source: 实际的步骤生成器
+        """
+        try:
+            async for step in source:
+                async with flight.condition:
+                    flight.steps.append(step)
+                    flight.condition.notify_all()
+        except asyncio.CancelledError:
+            flight.error = asyncio.CancelledError()
+        except Exception as e:
+            logger.error(f"请求合并: 对话轮次 {flight.key[:12]} 执行失败: {str(e)}")
+            flight.error = e
+        finally:
+            # 结束后立即移除，后续相同请求重新执行
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+            flight.done = True
+            async with flight.condition:
+                flight.condition.notify_all()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        获取合并统计
+
+        Returns:
+            包含执行次数、合并次数和进行中轮次数的字典
+        """
+        return {
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "in_flight": len(self._flights),
+        }
+
+# 全局对话轮次合并器
+turn_flights = SingleFlight()
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+本地过渡语库
+
+按Agent和语气标注的过渡语短语库，根据用户输入在本地选出过渡语，
+不再由决策模型生成，缩短决策输出并让专业Agent路由的首帧立即发出。
+启动时通过存储仓库读取历史使用过的过渡语（recent_transitions），由harvest扩充短语库。
+"""
+import re
+import zlib
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from ..utils.logger import logger
+
+# 语气识别规则：按顺序匹配，先命中者生效
+TONE_PATTERNS: List[Tuple[str, "re.Pattern[str]"]] = [
+    ("gentle", re.compile(r"难过|伤心|焦虑|抑郁|崩溃|压力|痛苦|失眠|孤独|迷茫|想哭|害怕|绝望|累了|好累|烦")),
+    ("playful", re.compile(r"笑话|段子|搞笑|逗|哈哈|好玩|无聊|乐子|幽默|开心一下")),
+    ("curious", re.compile(r"为什么|怎么|如何|是不是|什么意思|\?|？")),
+]
+
+# 内置过渡语库：决策结果 → [(语气, 过渡语)]
+PHRASE_BANK: Dict[str, List[Tuple[str, str]]] = {
+    "心理专家Agent": [
+        ("gentle", "先抱抱你，我请Long一起来听听～"),
+        ("gentle", "这份感受很重要，我叫上Long陪你聊聊。"),
+        ("gentle", "别一个人扛着，我问问Long怎么看。"),
+        ("curious", "这个问题挺值得琢磨，我问问Long。"),
+        ("curious", "Long对这个很有研究，我帮你问问他。"),
+        ("neutral", "我请教一下Long，他更懂这个～"),
+        ("neutral", "稍等，我找Long聊聊这个话题。"),
+    ],
+    "脱口秀演员Agent": [
+        ("playful", "这个得请博洋出马了，哈哈！"),
+        ("playful", "笑点交给专业的，博洋上场～"),
+        ("playful", "等等，我把博洋喊来整点乐子！"),
+        ("curious", "这事儿博洋肯定有梗，我问问他。"),
+        ("neutral", "我叫博洋来接个话，他最会逗乐～"),
+        ("neutral", "这个话题博洋熟，我找他聊聊！"),
+    ],
+}
+
+# 过渡语中不允许出现的词（与决策提示词中的要求一致）
+BANNED_WORDS = ("AI", "ai", "模型", "系统", "人工智能")
+
+# 过渡语最大长度（与决策提示词中的要求一致）
+MAX_TRANSITION_LENGTH = 25
+
+def detect_tone(text: str) -> str:
+    """
+    识别用户输入的语气
+
+    Args:
+        text: 用户输入文本
+
+    Returns:
+        语气标签：gentle/playful/curious/neutral
+    """
+    for tone, pattern in TONE_PATTERNS:
+        if pattern.search(text):
+            return tone
+    return "neutral"
+
+class TransitionLibrary:
+    """
+    本地过渡语库与选择器
+    """
+    def __init__(self, phrase_bank: Optional[Dict[str, List[Tuple[str, str]]]] = None):
+        """
+        初始化过渡语库
+
+        Args:
+            phrase_bank: 初始短语库，默认使用内置短语库
+        """
+        self._index: Dict[str, Dict[str, List[str]]] = {}
+        self._sources: Dict[str, List[Tuple[str, str, str]]] = {}  # 来源 → 由该来源添加的(决策结果, 语气, 过渡语)
+        for agent_decision, phrases in (phrase_bank or PHRASE_BANK).items():
+            for tone, phrase in phrases:
+                self.add(agent_decision, tone, phrase)
+
+    def add(self, agent_decision: str, tone: str, phrase: str) -> bool:
+        """
+        向短语库添加一条过渡语（重复、过长或包含禁用词的会被忽略）
+
+        Args:
+            agent_decision: 决策结果（如心理专家Agent）
+            tone: 语气标签
+            phrase: 过渡语
+
+        Returns:
+            是否添加成功
+        """
+        phrase = phrase.strip()
+        if not phrase or len(phrase) > MAX_TRANSITION_LENGTH or any(word in phrase for word in BANNED_WORDS):
+            return False
+        phrases = self._index.setdefault(agent_decision, {}).setdefault(tone, [])
+        if phrase in phrases:
+            return False
+        phrases.append(phrase)
+        return True
+
+    def replace_source(self, source: str, phrases: List[Tuple[str, str, str]]) -> int:
+        """
+        替换某个来源（如注册表）添加的过渡语：先移除该来源之前添加的过渡语，再添加新的过渡语
+
+        只移除由该来源实际添加的短语，与内置短语库或历史收集重复的短语不受影响。
+
+        Args:
+            source: 来源名称
+            phrases: [(决策结果, 语气, 过渡语)]
+
+        Returns:
+            新增的过渡语数量
+        """
+        for agent_decision, tone, phrase in self._sources.pop(source, []):
+            tones = self._index.get(agent_decision, {})
+            if phrase in tones.get(tone, []):
+                tones[tone].remove(phrase)
+                if not tones[tone]:
+                    del tones[tone]
+        added = [(agent_decision, tone, phrase.strip()) for agent_decision, tone, phrase in phrases if self.add(agent_decision, tone, phrase)]
+        self._sources[source] = added
+        return len(added)
+
+    def select(self, agent_decision: str, prompt: str) -> str:
+        """
+        根据用户输入选择过渡语
+
+        同一输入总是得到同一过渡语（按输入的crc32取模），不同输入之间自然轮换。
+
+        Args:
+            agent_decision: 决策结果
+            prompt: 用户输入文本
+
+        Returns:
+            过渡语，该Agent没有可用短语时返回空字符串
+        """
+        by_tone = self._index.get(agent_decision)
+        if not by_tone:
+            return ""
+        phrases = by_tone.get(detect_tone(prompt)) or by_tone.get("neutral")
+        if not phrases:
+            phrases = next(iter(by_tone.values()))
+        return phrases[zlib.crc32(prompt.encode("utf-8")) % len(phrases)]
+
+    def harvest(self, rows: List[Tuple[str, str, str]], min_count: int = 2) -> int:
+        """
+        从历史使用过的过渡语扩充短语库
+
+        只收集出现次数不少于min_count的过渡语，语气按对应的用户输入识别。
+
+        Args:
+            rows: [(用户输入, 过渡语, 决策结果)]
+            min_count: 最少出现次数
+
+        Returns:
+            新增的过渡语数量
+        """
+        counts: Counter = Counter()
+        tones: Dict[Tuple[str, str], str] = {}
+        for prompt, transition, agent_decision in rows:
+            key = (agent_decision, transition.strip())
+            counts[key] += 1
+            tones.setdefault(key, detect_tone(prompt))
+
+        added = 0
+        for (agent_decision, transition), count in counts.items():
+            if count >= min_count and self.add(agent_decision, tones[(agent_decision, transition)], transition):
+                added += 1
+        logger.info(f"从历史消息中收集过渡语 {added} 条（共读取 {len(rows)} 条记录）")
+        return added
+
+# 全局过渡语库
+transition_library = TransitionLibrary()
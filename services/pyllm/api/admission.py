@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+准入控制模块：按客户端IP和按会话的令牌桶限流
+
+每个客户端一个令牌桶，按固定速率补充令牌、允许一定的突发量；令牌不足时拒绝并给出需要等待的秒数。
+令牌桶保存在内存中（按最近使用排序），空闲超过一定时间或超过客户端数上限时淘汰最久未使用的客户端。
+
+客户端IP优先取X-Forwarded-For：只有直连地址属于受信任代理（如Go网关）时才解析该请求头，
+从右向左跳过受信任代理，第一个不受信任的地址即为客户端地址，避免客户端伪造请求头绕过限流。
+"""
+import ipaddress
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Union
+from ..utils.logger import logger
+
+IPNetwork = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+class TokenBucket:
+    """
+    单个客户端的令牌桶
+    """
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, now: float):
+        self.tokens = tokens
+        self.updated = now
+
+class RateLimiter:
+    """
+    按键（客户端IP或会话）划分的令牌桶限流器
+    """
+    def __init__(self, name: str, rate: float, burst: float, idle_ttl: float = 600.0, max_clients: int = 100000):
+        """
+        初始化限流器
+
+        Args:
+            name: 限流器名称（用于日志和统计）
+            rate: 每秒补充的令牌数，0表示不限流
+            burst: 令牌桶容量（允许的突发请求数）
+            idle_ttl: 客户端空闲多久后淘汰（秒）
+            max_clients: 最多保存的客户端数，超过时淘汰最久未使用的客户端
+        """
+        self.name = name
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.idle_ttl = idle_ttl
+        self.max_clients = max_clients
+        self.buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.admitted = 0
+        self.throttled = 0
+        self.evicted = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def _evict(self, now: float):
+        """
+        从最久未使用的一端淘汰空闲或超出上限的客户端
+        """
+        buckets = self.buckets
+        while buckets:
+            key, bucket = next(iter(buckets.items()))
+            if len(buckets) < self.max_clients and now - bucket.updated < self.idle_ttl:
+                break
+            del buckets[key]
+            self.evicted += 1
+
+    def _bucket(self, key: str, now: float) -> TokenBucket:
+        """
+        获取客户端的令牌桶并按经过的时间补充令牌
+        """
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            self._evict(now)
+            bucket = self.buckets[key] = TokenBucket(self.burst, now)
+        else:
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+            bucket.updated = now
+            self.buckets.move_to_end(key)
+        return bucket
+
+    def retry_after(self, key: str, now: float, cost: float = 1.0) -> float:
+        """
+        查询客户端需要等待多久才有足够的令牌（不消耗令牌）
+
+        Returns:
+            需要等待的秒数，0表示可以立即放行
+        """
+        if not self.enabled or not key:
+            return 0.0
+        bucket = self._bucket(key, now)
+        return 0.0 if bucket.tokens >= cost else (cost - bucket.tokens) / self.rate
+
+    def consume(self, key: str, cost: float = 1.0):
+        """
+        消耗令牌（需在retry_after返回0之后调用）
+        """
+        if self.enabled and key:
+            self.buckets[key].tokens -= cost
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取限流统计
+        """
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "clients": len(self.buckets),
+            "admitted": self.admitted,
+            "throttled": self.throttled,
+            "evicted": self.evicted,
+        }
+
+class AdmissionController:
+    """
+    准入控制：同时满足按IP和按会话的限流才放行
+    """
+    def __init__(self, ip_limiter: RateLimiter, session_limiter: RateLimiter, trusted_proxies: Iterable[str] = ()):
+        """
+        初始化准入控制
+
+        Args:
+            ip_limiter: 按客户端IP的限流器
+            session_limiter: 按会话的限流器
+            trusted_proxies: 受信任代理的地址或网段（如Go网关），只有来自这些地址的X-Forwarded-For才会被采用
+        """
+        self.ip_limiter = ip_limiter
+        self.session_limiter = session_limiter
+        self.trusted_proxies: List[IPNetwork] = []
+        for proxy in trusted_proxies:
+            proxy = proxy.strip()
+            if not proxy:
+                continue
+            try:
+                self.trusted_proxies.append(ipaddress.ip_network(proxy, strict=False))
+            except ValueError:
+                logger.warning(f"忽略无效的受信任代理地址: {proxy}")
+
+    def _is_trusted(self, address: str) -> bool:
+        """
+        判断地址是否属于受信任代理
+        """
+        try:
+            ip = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+        return any(ip in network for network in self.trusted_proxies)
+
+    def client_ip(self, peer: Optional[str], forwarded_for: Optional[str]) -> str:
+        """
+        解析客户端IP
+
+        Args:
+            peer: 直连地址（request.client.host）
+            forwarded_for: X-Forwarded-For请求头
+
+        Returns:
+            客户端IP
+        """
+        peer = peer or ""
+        if not forwarded_for or not self._is_trusted(peer):
+            return peer
+        hops = [hop.strip() for hop in forwarded_for.split(",") if hop.strip()]
+        for hop in reversed(hops):
+            if not self._is_trusted(hop):
+                return hop
+        return hops[0] if hops else peer
+
+    def admit(self, client_ip: str, session_key: str = "") -> float:
+        """
+        判断一次请求是否放行，放行时同时消耗IP和会话的令牌
+
+        Args:
+            client_ip: 客户端IP
+            session_key: 会话标识（会话ID或用户ID），为空时只按IP限流
+
+        Returns:
+            需要等待的秒数，0表示放行
+        """
+        now = time.monotonic()
+        ip_wait = self.ip_limiter.retry_after(client_ip, now)
+        session_wait = self.session_limiter.retry_after(session_key, now)
+        wait = max(ip_wait, session_wait)
+        if wait > 0:
+            limiter = self.ip_limiter if ip_wait >= session_wait else self.session_limiter
+            limiter.throttled += 1
+            logger.warning(f"准入控制: 拒绝请求（{limiter.name}限流），IP: {client_ip}，会话: {session_key or '无'}，需等待 {wait:.1f}s")
+            return wait
+        self.ip_limiter.consume(client_ip)
+        self.session_limiter.consume(session_key)
+        self.ip_limiter.admitted += 1
+        self.session_limiter.admitted += 1
+        return 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取准入控制统计
+        """
+        return {"ip": self.ip_limiter.stats(), "session": self.session_limiter.stats()}
+
+def retry_after_header(wait: float) -> str:
+    """
+    将等待秒数格式化为Retry-After响应头（向上取整的整数秒）
+    """
+    return str(max(1, math.ceil(wait)))
+
+# 准入控制配置
+ADMISSION_IDLE_TTL = float(os.getenv("SOULBIT_ADMISSION_IDLE_TTL", "600"))
+ADMISSION_MAX_CLIENTS = int(os.getenv("SOULBIT_ADMISSION_MAX_CLIENTS", "100000"))
+
+# 全局准入控制（默认只信任本机回环地址上的代理；容器部署时需将SOULBIT_TRUSTED_PROXIES设为Go网关的地址，
+# 不能信任整个私有网段：pyllm的端口对外发布时，同一网段中的任何客户端都能伪造X-Forwarded-For绕过按IP限流）
+admission_controller = AdmissionController(
+    RateLimiter(
+        "IP",
+        rate=float(os.getenv("SOULBIT_ADMISSION_IP_RATE", "1")),
+        burst=float(os.getenv("SOULBIT_ADMISSION_IP_BURST", "20")),
+        idle_ttl=ADMISSION_IDLE_TTL,
+        max_clients=ADMISSION_MAX_CLIENTS,
+    ),
+    RateLimiter(
+        "会话",
+        rate=float(os.getenv("SOULBIT_ADMISSION_SESSION_RATE", "0.2")),
+        burst=float(os.getenv("SOULBIT_ADMISSION_SESSION_BURST", "5")),
+        idle_ttl=ADMISSION_IDLE_TTL,
+        max_clients=ADMISSION_MAX_CLIENTS,
+    ),
+    trusted_proxies=os.getenv("SOULBIT_TRUSTED_PROXIES", "127.0.0.1/32,::1/128").split(","),
+)
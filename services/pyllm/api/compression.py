@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP响应压缩模块
+
+对较大的响应（如历史记录、批量输出）按客户端的Accept-Encoding选择brotli或gzip压缩，
+流式接口（SSE）和WebSocket不压缩，避免缓冲导致首帧延迟。
+"""
+from typing import Iterable
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.types import ASGIApp, Receive, Scope, Send
+from ..utils.logger import logger
+
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:
+    BrotliMiddleware = None
+
+class CompressionMiddleware:
+    """
+    按请求选择brotli或gzip的压缩中间件
+    """
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, exclude_paths: Iterable[str] = ()):
+        """
+        初始化压缩中间件
+
+        Args:
+            app: 下游ASGI应用
+            minimum_size: 小于该字节数的响应不压缩
+            exclude_paths: 不压缩的路径（流式接口）
+        """
+        self.app = app
+        self.exclude_paths = frozenset(exclude_paths)
+        self.gzip = GZipMiddleware(app, minimum_size=minimum_size)
+        self.brotli = BrotliMiddleware(app, minimum_size=minimum_size) if BrotliMiddleware else None
+        logger.info(f"HTTP压缩已启用: {'brotli+gzip' if self.brotli else 'gzip'}，最小压缩大小: {minimum_size}字节")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        """
+        处理ASGI请求
+        """
+        if scope["type"] != "http" or scope["path"] in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = ""
+        for key, value in scope.get("headers", []):
+            if key == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+                break
+
+        if self.brotli and "br" in accept_encoding:
+            await self.brotli(scope, receive, send)
+        else:
+            await self.gzip(scope, receive, send)
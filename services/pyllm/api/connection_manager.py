@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+WebSocket连接管理模块
+
+负责登记会话、限制最大连接数、限制单连接的消息大小与发送频率、
+发送心跳、回收空闲连接，以及在服务关闭时平滑断开所有连接。
+"""
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from typing import Dict, Optional
+from fastapi import WebSocket
+from ..utils.logger import logger
+from ..agents.history import HistoryBuffer
+
+# WebSocket关闭码
+CLOSE_NORMAL = 1000  # 正常关闭（空闲回收）
+CLOSE_GOING_AWAY = 1001  # 服务关闭
+CLOSE_POLICY_VIOLATION = 1008  # 违反限制
+CLOSE_TRY_AGAIN_LATER = 1013  # 连接数已满
+
+class WSSession:
+    """
+    单个WebSocket连接的会话状态
+    """
+    __slots__ = ("session_id", "websocket", "connected_at", "last_activity", "message_times", "busy", "history")
+
+    def __init__(self, session_id: str, websocket: WebSocket, rate_limit: int, history_entries: int = 20):
+        """
+        初始化会话
+
+        Args:
+            session_id: 会话ID
+            websocket: WebSocket连接实例
+            rate_limit: 时间窗口内允许的最大消息数（决定时间戳队列的长度上限）
+            history_entries: 上下文历史最多保留的记录条数（0表示不保留历史）
+        """
+        now = time.monotonic()
+        self.session_id = session_id
+        self.websocket = websocket
+        self.connected_at = now
+        self.last_activity = now
+        self.message_times = deque(maxlen=max(1, rate_limit))  # 最近消息的时间戳，长度有上限
+        self.busy = False  # 是否有进行中的对话轮次
+        self.history = HistoryBuffer(history_entries) if history_entries > 0 else None  # 本连接的上下文历史
+
+class ConnectionManager:
+    """
+    WebSocket连接管理器
+    """
+    def __init__(
+        self,
+        max_connections: int = 1000,
+        max_message_bytes: int = 16384,
+        rate_limit: int = 10,
+        rate_window: float = 10.0,
+        heartbeat_interval: float = 20.0,
+        idle_timeout: float = 300.0,
+        history_turns: int = 10,
+    ):
+        """
+        初始化连接管理器
+
+        Args:
+            max_connections: 最大连接数
+            max_message_bytes: 单条消息最大字节数
+            rate_limit: 单连接在rate_window内允许的最大消息数
+            rate_window: 限流时间窗口（秒）
+            heartbeat_interval: 心跳间隔（秒）
+            idle_timeout: 空闲超时时间（秒），超过后关闭连接
+            history_turns: 每个连接保留的上下文历史轮次数（0表示不保留）
+        """
+        self.max_connections = max_connections
+        self.max_message_bytes = max_message_bytes
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.heartbeat_interval = heartbeat_interval
+        self.idle_timeout = idle_timeout
+        self.history_turns = history_turns
+        self.sessions: Dict[str, WSSession] = {}
+        self.draining = False
+        self._heartbeat_task: Optional[asyncio.Task] = None
+
+    async def connect(self, websocket: WebSocket) -> Optional[WSSession]:
+        """
+        接受连接并登记会话，超过最大连接数或正在关闭时拒绝
+
+        Args:
+            websocket: WebSocket连接实例
+
+        Returns:
+            会话实例，被拒绝时返回None
+        """
+        await websocket.accept()
+        if self.draining or len(self.sessions) >= self.max_connections:
+            reason = "server shutting down" if self.draining else "too many connections"
+            logger.warning(f"WebSocket连接被拒绝: {reason}，当前连接数: {len(self.sessions)}")
+            await websocket.close(code=CLOSE_TRY_AGAIN_LATER, reason=reason)
+            return None
+
+        session = WSSession(os.urandom(8).hex(), websocket, self.rate_limit, self.history_turns * 2)
+        self.sessions[session.session_id] = session
+        logger.info(f"WebSocket会话已登记: {session.session_id}，当前连接数: {len(self.sessions)}")
+        return session
+
+    def disconnect(self, session: WSSession):
+        """
+        注销会话
+
+        Args:
+            session: 会话实例
+        """
+        if self.sessions.pop(session.session_id, None) is not None:
+            logger.info(f"WebSocket会话已注销: {session.session_id}，当前连接数: {len(self.sessions)}")
+
+    def check_message(self, session: WSSession, data: str) -> Optional[str]:
+        """
+        检查一条客户端消息是否超过大小或频率限制，并刷新活跃时间
+
+        Args:
+            session: 会话实例
+            data: 消息文本
+
+        Returns:
+            错误提示，未超过限制时返回None
+        """
+        now = time.monotonic()
+        session.last_activity = now
+
+        if len(data.encode("utf-8")) > self.max_message_bytes:
+            return "消息过长"
+
+        times = session.message_times
+        if len(times) == times.maxlen and now - times[0] < self.rate_window:
+            return "发送太频繁，请稍后再试"
+        times.append(now)
+        return None
+
+    async def start(self):
+        """
+        启动心跳与空闲回收任务
+        """
+        if self._heartbeat_task is None:
+            self._heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+            logger.info("WebSocket心跳任务已启动")
+
+    async def _heartbeat_loop(self):
+        """
+        定期向所有连接发送心跳，并关闭空闲超时的连接
+        """
+        ping = json.dumps({"type": "ping"})
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            now = time.monotonic()
+            for session in list(self.sessions.values()):
+                try:
+                    if not session.busy and now - session.last_activity > self.idle_timeout:
+                        logger.info(f"WebSocket会话空闲超时，关闭连接: {session.session_id}")
+                        self.disconnect(session)
+                        await session.websocket.close(code=CLOSE_NORMAL, reason="idle timeout")
+                    else:
+                        await session.websocket.send_text(ping)
+                except Exception as e:
+                    # 发送失败说明连接已断开
+                    logger.info(f"WebSocket心跳发送失败，注销会话: {session.session_id}, {str(e)}")
+                    self.disconnect(session)
+
+    async def drain(self, timeout: float = 10.0):
+        """
+        平滑关闭：拒绝新连接，等待进行中的对话轮次结束（最多timeout秒），然后关闭所有连接
+
+        Args:
+            timeout: 最长等待时间（秒）
+        """
+        self.draining = True
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+
+        logger.info(f"WebSocket开始平滑关闭，当前连接数: {len(self.sessions)}")
+        deadline = time.monotonic() + timeout
+        while any(session.busy for session in self.sessions.values()) and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+
+        for session in list(self.sessions.values()):
+            self.disconnect(session)
+            try:
+                await session.websocket.close(code=CLOSE_GOING_AWAY, reason="server shutting down")
+            except Exception:
+                pass
+        logger.info("WebSocket平滑关闭完成")
+
+    def stats(self) -> Dict[str, int]:
+        """
+        获取连接统计
+
+        Returns:
+            包含当前连接数、进行中轮次数和最大连接数的字典
+        """
+        return {
+            "connections": len(self.sessions),
+            "busy": sum(1 for session in self.sessions.values() if session.busy),
+            "max_connections": self.max_connections,
+        }
+
+# 全局WebSocket连接管理器
+connection_manager = ConnectionManager(
+    max_connections=int(os.getenv("SOULBIT_WS_MAX_CONNECTIONS", "1000")),
+    max_message_bytes=int(os.getenv("SOULBIT_WS_MAX_MESSAGE_BYTES", "16384")),
+    rate_limit=int(os.getenv("SOULBIT_WS_RATE_LIMIT", "10")),
+    rate_window=float(os.getenv("SOULBIT_WS_RATE_WINDOW", "10")),
+    heartbeat_interval=float(os.getenv("SOULBIT_WS_HEARTBEAT_INTERVAL", "20")),
+    idle_timeout=float(os.getenv("SOULBIT_WS_IDLE_TIMEOUT", "300")),
+    history_turns=int(os.getenv("SOULBIT_WS_HISTORY_TURNS", "10")),
+)
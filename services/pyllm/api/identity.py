@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+身份令牌模块
+
+请求中的user_id由客户端自报，不能作为读取长期记忆的依据。长期记忆只对经过验证的身份开放：
+完成登录的服务（或Go网关）使用与pyllm相同的密钥SOULBIT_IDENTITY_SECRET签发身份令牌，
+客户端在请求体或WebSocket消息的identity字段中携带，pyllm校验签名和有效期后得到用户ID。
+
+令牌格式为"base64url(用户ID).过期时间戳.HMAC-SHA256签名"。未配置密钥时所有令牌都无效，长期记忆不可用。
+"""
+import base64
+import binascii
+import hashlib
+import hmac
+import os
+import time
+from typing import Optional
+from ..memory.store import memory_user_id
+from ..utils.logger import logger
+
+# 身份令牌签名密钥，未配置时不接受任何身份令牌
+IDENTITY_SECRET = os.getenv("SOULBIT_IDENTITY_SECRET", "")
+
+def _sign(payload: str) -> str:
+    """
+    计算令牌签名（十六进制）
+    """
+    return hmac.new(IDENTITY_SECRET.encode(), payload.encode(), hashlib.sha256).hexdigest()
+
+def issue_identity(user_id: str, ttl: float = 86400.0) -> str:
+    """
+    签发身份令牌（供完成登录的服务使用，与pyllm配置相同的密钥）
+
+    Args:
+        user_id: 已经过验证的用户ID
+        ttl: 有效期（秒）
+
+    Returns:
+        身份令牌
+
+    Raises:
+        ValueError: 未配置签名密钥或用户ID为空
+    """
+    if not IDENTITY_SECRET:
+        raise ValueError("未配置SOULBIT_IDENTITY_SECRET，无法签发身份令牌")
+    if not user_id:
+        raise ValueError("用户ID不能为空")
+    encoded = base64.urlsafe_b64encode(user_id.encode("utf-8")).decode("ascii").rstrip("=")
+    payload = f"{encoded}.{int(time.time() + ttl)}"
+    return f"{payload}.{_sign(payload)}"
+
+def verify_identity(token: Optional[str]) -> str:
+    """
+    校验身份令牌
+
+    Args:
+        token: 请求携带的身份令牌
+
+    Returns:
+        令牌中的用户ID，令牌缺失、签名错误或已过期时返回空字符串
+    """
+    if not IDENTITY_SECRET or not token:
+        return ""
+    payload, _, signature = token.strip().rpartition(".")
+    encoded, _, expires = payload.partition(".")
+    if not encoded or not expires.isdigit() or not hmac.compare_digest(signature.encode(), _sign(payload).encode()):
+        logger.warning("身份令牌签名无效，本轮不使用长期记忆")
+        return ""
+    if int(expires) < time.time():
+        logger.info("身份令牌已过期，本轮不使用长期记忆")
+        return ""
+    try:
+        return base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)).decode("utf-8")
+    except (binascii.Error, UnicodeDecodeError):
+        return ""
+
+def bind_identity(user_id: str, token: Optional[str]) -> str:
+    """
+    校验本轮的身份令牌并设置长期记忆使用的用户（在对话轮次所在的任务中调用）
+
+    令牌有效时本轮的用户ID以令牌为准，长期记忆只为该用户检索和写入；
+    没有有效令牌时保留自报的用户ID（用于统计和会话），但本轮不检索也不写入长期记忆。
+
+    Args:
+        user_id: 请求中自报的用户ID
+        token: 请求携带的身份令牌
+
+    Returns:
+        经过验证的用户ID，没有有效令牌时返回空字符串
+    """
+    verified = verify_identity(token)
+    memory_user_id.set(verified)
+    if verified and user_id and user_id != verified:
+        logger.warning(f"请求中的用户ID与身份令牌不一致，使用令牌中的用户 {verified[:8]}")
+    return verified
@@ -3,13 +3,16 @@
 API数据模型模块
 """
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 
 class PromptIn(BaseModel):
     """
     接收用户输入的提示词模型
     """
     prompt: str  # 提示词字符串
+    user_id: Optional[str] = None  # 用户ID（可选，客户端自报，用于统计和会话）
+    session_id: Optional[str] = None  # 会话ID（可选）
+    identity: Optional[str] = None  # 身份令牌（可选，验证通过后以其中的用户ID使用长期记忆）
 
 class LLMOut(BaseModel):
     """
@@ -18,6 +21,40 @@ class LLMOut(BaseModel):
     reply: str  # 回复内容
     error: Optional[str] = None  # 错误信息（可选）
 
+class MessageOut(BaseModel):
+    """
+    对话记录模型
+    """
+    id: int  # 记录ID
+    prompt: str  # 用户输入
+    reply: str  # 回复内容
+    transition: str = ""  # 过渡语
+    agent_decision: str = ""  # 决策结果
+    user_id: str = ""  # 用户ID
+    session_id: str = ""  # 会话ID
+    latency_ms: int = 0  # 从收到请求到最终回复的耗时（毫秒）
+    input_tokens: int = 0  # 输入token数
+    output_tokens: int = 0  # 输出token数
+    error: int = 0  # 是否出错或走了降级路径
+    created_at: Optional[str] = None  # 创建时间
+
+class MessagePage(BaseModel):
+    """
+    对话记录分页模型
+    """
+    items: List[MessageOut]  # 本页记录（按ID倒序）
+    next_cursor: Optional[str] = None  # 下一页游标，没有更多记录时为空
+
+class SessionOut(BaseModel):
+    """
+    会话模型
+    """
+    id: str  # 会话ID
+    user_id: str = ""  # 用户ID
+    created_at: Optional[str] = None  # 创建时间
+    last_active_at: Optional[str] = None  # 最后活跃时间
+    message_count: int = 0  # 消息数
+
 class AgentDecision(BaseModel):
     """
     Agent决策结果模型
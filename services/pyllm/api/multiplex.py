@@ -0,0 +1,353 @@
+# -*- coding: utf-8 -*-
+"""
+WebSocket多路复用模块
+
+Go网关通过一条到/ws/mux的WebSocket连接承载多个浏览器会话（逻辑通道），
+不再为每个浏览器客户端单独建立到Python服务的连接；空闲的通道只占用一个小对象，不占用任务。
+
+帧格式（JSON文本帧，通道帧都带有channel字段）：
+网关 → 服务：
+- {"type":"open","channel":ID,"credits":N,"forwarded_for":"..."}：打开通道，N为初始发送额度，forwarded_for为浏览器客户端的X-Forwarded-For
+- {"type":"message","channel":ID,"data":{...}}：通道内的聊天消息，data与/ws/chat的消息格式相同
+- {"type":"credit","channel":ID,"credits":N}：增加通道的发送额度（网关把帧转发给浏览器后归还）
+- {"type":"cancel","channel":ID}：取消通道内进行中和排队中的对话轮次，不影响其他通道
+- {"type":"close","channel":ID}：关闭通道（浏览器断开）
+- {"type":"pong"}：回应心跳
+服务 → 网关：
+- 通道数据帧：/ws/chat的帧加上channel字段，每帧消耗1个额度，额度用尽时只暂停该通道的输出
+- 通道错误帧：{"channel":ID,"error":"..."}，与/ws/chat的错误帧相同，不消耗额度（网关为错误帧和cancelled单独缓冲）
+- {"type":"closed","channel":ID,"reason":"..."}：服务端关闭了通道（空闲超时、通道数已满等）
+- {"type":"cancelled","channel":ID}：进行中的对话轮次已取消
+- {"type":"ping"}：心跳（由连接管理器发送）
+"""
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Set, Tuple
+from ..utils.logger import logger
+from ..utils.serialization import dumps_text
+from ..agents.scheduler import current_session_key
+from .admission import admission_controller, retry_after_header
+from .connection_manager import WSSession, connection_manager
+
+# 发送一帧文本
+Send = Callable[[str], Awaitable[None]]
+# 执行一个对话轮次：run_turn(会话, 提示词, 用户ID, 发送函数, 身份令牌)
+TurnRunner = Callable[[WSSession, str, str, Send, str], Awaitable[None]]
+
+# 通道ID最大长度
+MAX_CHANNEL_ID_LENGTH = 64
+# 单次归还的最大额度
+MAX_CREDITS = 1 << 16
+
+def with_channel(channel_id: str, frame: str) -> str:
+    """
+    在JSON对象帧的开头加上channel字段（不重新编码原帧）
+
+    Args:
+        channel_id: 通道ID
+        frame: JSON对象文本帧
+
+    Returns:
+        带channel字段的文本帧
+    """
+    return '{"channel":' + dumps_text(channel_id) + "," + frame[1:]
+
+class MuxChannel:
+    """
+    多路复用连接中的一个逻辑通道（对应一个浏览器会话）
+    """
+    __slots__ = ("channel_id", "session", "client_ip", "credits", "writable", "task", "pending")
+
+    def __init__(self, channel_id: str, session: WSSession, client_ip: str, credits: int):
+        """
+        初始化通道
+
+        Args:
+            channel_id: 通道ID（由网关分配）
+            session: 通道的会话状态（上下文历史、限流），不登记到连接管理器
+            client_ip: 浏览器客户端IP
+            credits: 初始发送额度
+        """
+        self.channel_id = channel_id
+        self.session = session
+        self.client_ip = client_ip
+        self.credits = credits
+        self.writable = asyncio.Event()
+        if credits > 0:
+            self.writable.set()
+        self.task: Optional[asyncio.Task] = None  # 进行中的对话轮次
+        self.pending: Deque[Tuple[str, str, str]] = deque()  # 排队中的(提示词, 用户ID, 身份令牌)
+
+class MuxConnection:
+    """
+    一条多路复用WebSocket连接：按通道分发消息、控制每个通道的发送额度
+    """
+    def __init__(self, session: WSSession, run_turn: TurnRunner, peer: str, max_channels: int = 1000, initial_credits: int = 32, max_pending: int = 8):
+        """
+        初始化多路复用连接
+
+        Args:
+            session: 物理连接的会话（登记在连接管理器中，负责心跳、连接数限制和平滑关闭）
+            run_turn: 执行一个对话轮次的函数（与/ws/chat共用）
+            peer: 直连地址（网关地址），只有受信任代理转发的forwarded_for才会被采用
+            max_channels: 单个连接最多打开的通道数
+            initial_credits: 打开通道时未指定额度时的初始发送额度
+            max_pending: 每个通道最多排队的消息数（不含进行中的轮次），超出时返回错误帧
+        """
+        self.session = session
+        self.run_turn = run_turn
+        self.peer = peer
+        self.max_channels = max_channels
+        self.initial_credits = initial_credits
+        self.max_pending = max_pending
+        self.channels: Dict[str, MuxChannel] = {}
+        self.active = 0  # 进行中的对话轮次数
+        self._write_lock = asyncio.Lock()
+
+    async def _send_text(self, text: str):
+        """
+        在物理连接上发送一帧（各通道的发送串行化）
+        """
+        async with self._write_lock:
+            await self.session.websocket.send_text(text)
+
+    async def _send_control(self, frame: Dict[str, Any]):
+        """
+        发送控制帧或错误帧（不消耗额度）
+        """
+        await self._send_text(dumps_text(frame))
+
+    async def _send_data(self, channel: MuxChannel, frame: str):
+        """
+        发送通道数据帧，额度用尽时等待网关归还额度
+        """
+        while channel.credits <= 0:
+            channel.writable.clear()
+            await channel.writable.wait()
+        channel.credits -= 1
+        await self._send_text(with_channel(channel.channel_id, frame))
+
+    async def handle(self, data: str):
+        """
+        处理网关发来的一帧
+
+        Args:
+            data: 文本帧
+        """
+        now = time.monotonic()
+        self.session.last_activity = now
+        try:
+            frame = json.loads(data)
+        except json.JSONDecodeError:
+            frame = None
+        if not isinstance(frame, dict):
+            await self._send_control({"error": "无效的JSON格式"})
+            return
+
+        frame_type = frame.get("type")
+        if frame_type == "pong":
+            # 网关每个心跳周期回应一次，顺便回收空闲通道
+            await self._reap_idle(now)
+            return
+
+        channel_id = frame.get("channel")
+        if not isinstance(channel_id, str) or not channel_id or len(channel_id) > MAX_CHANNEL_ID_LENGTH:
+            await self._send_control({"error": "缺少有效的通道ID"})
+            return
+        if frame_type == "open":
+            await self._open(channel_id, frame)
+            return
+
+        channel = self.channels.get(channel_id)
+        if channel is None:
+            if frame_type != "close":
+                await self._send_control({"type": "closed", "channel": channel_id, "reason": "unknown channel"})
+            return
+        if frame_type == "message":
+            await self._message(channel, data, frame.get("data"))
+        elif frame_type == "credit":
+            self._credit(channel, frame.get("credits"))
+        elif frame_type == "cancel":
+            self._cancel(channel)
+        elif frame_type == "close":
+            self._close(channel)
+        else:
+            await self._send_control({"channel": channel_id, "error": "未知的帧类型"})
+
+    async def _open(self, channel_id: str, frame: Dict[str, Any]):
+        """
+        打开通道
+        """
+        if channel_id in self.channels:
+            await self._send_control({"channel": channel_id, "error": "通道已打开"})
+            return
+        reason = None
+        if connection_manager.draining:
+            reason = "server shutting down"
+        elif len(self.channels) >= self.max_channels:
+            reason = "too many channels"
+        if reason:
+            logger.warning(f"WebSocket多路复用: 拒绝打开通道 {channel_id}: {reason}")
+            await self._send_control({"type": "closed", "channel": channel_id, "reason": reason})
+            return
+
+        credits = frame.get("credits")
+        if not isinstance(credits, int) or isinstance(credits, bool) or not 0 < credits <= MAX_CREDITS:
+            credits = self.initial_credits
+        forwarded_for = frame.get("forwarded_for")
+        client_ip = admission_controller.client_ip(self.peer, forwarded_for if isinstance(forwarded_for, str) else None)
+        session = WSSession(
+            os.urandom(8).hex(), self.session.websocket, connection_manager.rate_limit, connection_manager.history_turns * 2
+        )
+        self.channels[channel_id] = MuxChannel(channel_id, session, client_ip, credits)
+        logger.info(f"WebSocket多路复用: 打开通道 {channel_id}，会话: {session.session_id}，通道数: {len(self.channels)}")
+
+    async def _message(self, channel: MuxChannel, data: str, message: Any):
+        """
+        处理通道内的聊天消息：检查限制后立即开始对话轮次，通道内已有进行中的轮次时排队
+        """
+        channel_id = channel.channel_id
+        limit_error = connection_manager.check_message(channel.session, data)
+        if limit_error:
+            await self._send_control({"channel": channel_id, "error": limit_error})
+            return
+        if not isinstance(message, dict):
+            await self._send_control({"channel": channel_id, "error": "无效的JSON格式"})
+            return
+        # 心跳回应只用于刷新活跃时间
+        if message.get("type") == "pong":
+            return
+        prompt = str(message.get("prompt") or "").strip()
+        user_id = str(message.get("user_id") or "").strip()
+        identity = str(message.get("identity") or "")
+        if not prompt:
+            await self._send_control({"channel": channel_id, "error": "请输入有效的消息"})
+            return
+        # 准入控制：按浏览器客户端IP（跨连接）和通道会话限流
+        wait = admission_controller.admit(channel.client_ip, channel.session.session_id)
+        if wait > 0:
+            await self._send_control({"channel": channel_id, "error": "请求太频繁，请稍后再试", "retry_after": int(retry_after_header(wait))})
+            return
+
+        if channel.task is not None:
+            # 排队的消息有上限：额度用尽而暂停输出的通道不会无限积压消息
+            if len(channel.pending) >= self.max_pending:
+                await self._send_control({"channel": channel_id, "error": "排队的消息太多，请稍后再试"})
+                return
+            channel.pending.append((prompt, user_id, identity))
+        else:
+            self._start(channel, prompt, user_id, identity)
+
+    def _start(self, channel: MuxChannel, prompt: str, user_id: str, identity: str = ""):
+        """
+        在独立任务中执行通道的一个对话轮次
+        """
+        self.active += 1
+        self.session.busy = True
+        channel.task = asyncio.create_task(self._run(channel, prompt, user_id, identity))
+
+    async def _run(self, channel: MuxChannel, prompt: str, user_id: str, identity: str = ""):
+        """
+        执行对话轮次，结束后继续处理通道内排队的消息
+        """
+        current_session_key.set(channel.session.session_id)
+        cancelled = False
+        try:
+            await self.run_turn(channel.session, prompt, user_id, lambda frame: self._send_data(channel, frame), identity)
+        except asyncio.CancelledError:
+            cancelled = True
+            logger.info(f"WebSocket多路复用: 通道 {channel.channel_id} 的对话轮次已取消")
+        except Exception as e:
+            logger.error(f"WebSocket多路复用: 通道 {channel.channel_id} 处理失败: {str(e)}")
+        finally:
+            channel.task = None
+            self.active -= 1
+            self.session.busy = self.active > 0
+
+        if cancelled:
+            if self.channels.get(channel.channel_id) is channel:
+                try:
+                    await self._send_control({"type": "cancelled", "channel": channel.channel_id})
+                except Exception:
+                    pass
+            return
+        if channel.pending and self.channels.get(channel.channel_id) is channel:
+            self._start(channel, *channel.pending.popleft())
+
+    def _credit(self, channel: MuxChannel, credits: Any):
+        """
+        增加通道的发送额度
+        """
+        if isinstance(credits, int) and not isinstance(credits, bool) and 0 < credits <= MAX_CREDITS:
+            channel.credits += credits
+            channel.writable.set()
+
+    def _cancel(self, channel: MuxChannel):
+        """
+        取消通道内进行中和排队中的对话轮次
+        """
+        channel.pending.clear()
+        if channel.task is not None:
+            channel.task.cancel()
+
+    def _close(self, channel: MuxChannel):
+        """
+        关闭通道并取消其中的对话轮次
+        """
+        if self.channels.pop(channel.channel_id, None) is not None:
+            self._cancel(channel)
+            logger.info(f"WebSocket多路复用: 关闭通道 {channel.channel_id}，通道数: {len(self.channels)}")
+
+    async def _reap_idle(self, now: float):
+        """
+        关闭空闲超时的通道（没有进行中的轮次且长时间没有消息）
+        """
+        for channel in list(self.channels.values()):
+            if channel.task is None and now - channel.session.last_activity > connection_manager.idle_timeout:
+                self._close(channel)
+                await self._send_control({"type": "closed", "channel": channel.channel_id, "reason": "idle timeout"})
+
+    async def close(self):
+        """
+        物理连接断开时关闭所有通道，等待进行中的轮次退出
+        """
+        tasks = [channel.task for channel in self.channels.values() if channel.task is not None]
+        for channel in list(self.channels.values()):
+            self._close(channel)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        获取连接统计
+        """
+        return {
+            "channels": len(self.channels),
+            "active": self.active,
+            "queued": sum(len(channel.pending) for channel in self.channels.values()),
+            "blocked": sum(1 for channel in self.channels.values() if channel.task is not None and channel.credits <= 0),
+        }
+
+# 当前的多路复用连接
+mux_connections: Set[MuxConnection] = set()
+
+def mux_stats() -> Dict[str, int]:
+    """
+    汇总所有多路复用连接的统计
+
+    Returns:
+        连接数、通道数、进行中/排队中的对话轮次数和因额度用尽而暂停输出的通道数
+    """
+    totals = {"connections": len(mux_connections), "channels": 0, "active": 0, "queued": 0, "blocked": 0}
+    for connection in mux_connections:
+        for key, value in connection.stats().items():
+            totals[key] += value
+    return totals
+
+# 多路复用配置
+MUX_MAX_CHANNELS = int(os.getenv("SOULBIT_WS_MUX_MAX_CHANNELS", "1000"))
+MUX_INITIAL_CREDITS = int(os.getenv("SOULBIT_WS_MUX_INITIAL_CREDITS", "32"))
+MUX_MAX_PENDING = int(os.getenv("SOULBIT_WS_MUX_MAX_PENDING", "8"))
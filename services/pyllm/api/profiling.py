@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+按需性能剖析模块
+
+两种模式：
+- 按请求剖析：按SOULBIT_PROFILE_SAMPLE_RATE比例抽样HTTP请求，或请求头X-Soulbit-Profile携带管理令牌时强制剖析，
+  只采样事件循环线程，结果保存在内存中，响应头X-Profile-Id返回剖析ID
+- 全进程剖析：管理接口触发，在指定秒数内采样所有线程（含asyncio.to_thread工作线程）
+
+两种模式都输出火焰图通用的折叠栈格式。剖析相关的管理接口需要SOULBIT_ADMIN_TOKEN。
+"""
+import asyncio
+import hmac
+import os
+import random
+import threading
+from typing import Any, Dict, Optional
+from fastapi import HTTPException, Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from ..utils.logger import logger
+from ..utils.profiling import StackSampler, new_profile_id, profile_store
+
+# 管理令牌，未配置时管理接口不可用
+ADMIN_TOKEN = os.getenv("SOULBIT_ADMIN_TOKEN", "")
+# 强制剖析请求头
+PROFILE_HEADER = b"x-soulbit-profile"
+
+def check_admin_token(supplied: Optional[str]) -> bool:
+    """
+    校验管理令牌（常量时间比较）
+
+    Args:
+        supplied: 请求携带的令牌
+
+    Returns:
+        是否有效，未配置管理令牌时总是无效
+    """
+    return bool(ADMIN_TOKEN) and bool(supplied) and hmac.compare_digest(supplied.encode(), ADMIN_TOKEN.encode())
+
+def require_admin(request: Request):
+    """
+    管理接口依赖：校验X-Admin-Token或Authorization: Bearer请求头
+
+    Raises:
+        HTTPException: 未配置管理令牌（404）或令牌无效（403）
+    """
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    supplied = request.headers.get("x-admin-token")
+    authorization = request.headers.get("authorization", "")
+    if not supplied and authorization.lower().startswith("bearer "):
+        supplied = authorization[7:].strip()
+    if not check_admin_token(supplied):
+        raise HTTPException(status_code=403, detail="管理令牌无效")
+
+class ProfilingMiddleware:
+    """
+    按请求剖析中间件
+    """
+    def __init__(self, app: ASGIApp, sample_rate: float = 0.0, max_active: int = 2):
+        """
+        初始化中间件
+
+        Args:
+            app: 下游ASGI应用
+            sample_rate: 随机抽样剖析的请求比例（0表示只剖析带请求头的请求）
+            max_active: 同时进行的按请求剖析数上限，超过时跳过剖析
+        """
+        self.app = app
+        self.sample_rate = sample_rate
+        self.max_active = max_active
+        self.active = 0
+        logger.info(f"按请求剖析已启用，抽样比例: {sample_rate}")
+
+    def _should_profile(self, scope: Scope) -> bool:
+        """
+        判断是否剖析本次请求
+        """
+        if self.active >= self.max_active:
+            return False
+        for key, value in scope.get("headers", []):
+            if key == PROFILE_HEADER:
+                return check_admin_token(value.decode("latin-1"))
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        """
+        处理ASGI请求
+        """
+        if scope["type"] != "http" or not self._should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        # 只采样当前事件循环线程；同一时间在该线程上运行的其他请求也会出现在结果中
+        self.active += 1
+        profile_id = new_profile_id()
+        sampler = StackSampler(thread_ids=[threading.get_ident()]).start()
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.active -= 1
+            folded = await asyncio.to_thread(sampler.stop)
+            profile_store.add("request", sampler, folded, profile_id, method=scope.get("method", ""), path=scope.get("path", ""))
+            logger.info(f"请求剖析完成: {scope.get('path', '')}，采样 {sampler.samples} 次，剖析ID: {profile_id}")
+
+# 全进程剖析锁，同一时间只允许一次
+_capture_lock = asyncio.Lock()
+
+async def capture_profile(seconds: float, interval: Optional[float] = None) -> Dict[str, Any]:
+    """
+    全进程剖析：在指定秒数内采样所有线程
+
+    Args:
+        seconds: 采样时长（秒）
+        interval: 采样间隔（秒），为None时使用默认间隔
+
+    Returns:
+        剖析记录（含折叠栈文本）
+
+    Raises:
+        RuntimeError: 已有全进程剖析在进行
+    """
+    if _capture_lock.locked():
+        raise RuntimeError("已有全进程剖析在进行")
+    async with _capture_lock:
+        sampler = StackSampler(interval=interval) if interval else StackSampler()
+        sampler.start()
+        logger.info(f"开始全进程剖析，时长: {seconds}秒")
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            folded = await asyncio.to_thread(sampler.stop)
+        record = profile_store.add("capture", sampler, folded)
+        logger.info(f"全进程剖析完成，采样 {sampler.samples} 次，剖析ID: {record['id']}")
+        return record
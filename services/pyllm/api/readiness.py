@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+就绪检查模块：启动预热与缓存的深度就绪状态
+
+服务启动后在后台执行一次预热（提示词模板首次格式化、建立上游连接、可选的极小模型调用），
+预热完成前/ready返回503，编排系统只把流量路由到已预热的实例。
+
+就绪状态由后台任务定期刷新并缓存，/ready只读取缓存，探针请求不会直接访问模型服务：
+- workflow：工作流是否初始化成功（未配置API密钥时失败）
+- db：存储后端是否可用（执行一次最简单的查询）
+服务关闭、开始断开WebSocket连接时立即变为未就绪。
+
+模型端点的熔断器状态（upstream，来自真实调用的结果，不额外请求上游）只作为信息返回，不影响就绪：
+上游故障时所有实例同时受影响，熔断打开的实例仍能返回降级回复，摘掉它只会让流量集中到其他实例。
+"""
+import asyncio
+import os
+import time
+from typing import Any, Dict, Optional
+from ..utils.logger import logger
+from ..utils.resilience import breaker_for_model
+from ..agents.langchain_agent import get_workflow
+from ..database.repository import get_repository
+from .connection_manager import connection_manager
+
+class ReadinessProbe:
+    """
+    启动预热与就绪状态缓存
+    """
+    def __init__(self, interval: float = 5.0, db_timeout: float = 2.0, warmup_connections: int = 2, warmup_model_call: bool = False, warmup_timeout: float = 20.0):
+        """
+        初始化就绪检查
+
+        Args:
+            interval: 就绪状态的刷新间隔（秒）
+            db_timeout: 存储检查的超时时间（秒）
+            warmup_connections: 预热时预先建立的上游连接数
+            warmup_model_call: 预热时是否发送max_tokens=1的模型调用
+            warmup_timeout: 预热中每个上游请求的超时时间（秒）
+        """
+        self.interval = interval
+        self.db_timeout = db_timeout
+        self.warmup_connections = warmup_connections
+        self.warmup_model_call = warmup_model_call
+        self.warmup_timeout = warmup_timeout
+        self.warmed_up = False
+        self.warmup: Dict[str, Any] = {}
+        self.checks: Dict[str, Dict[str, Any]] = {}
+        self.upstream: Dict[str, Any] = {}
+        self.checked_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """
+        启动后台任务：先预热，再定期刷新就绪状态
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        停止后台任务
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        """
+        后台任务主循环
+        """
+        try:
+            self.warmup = await get_workflow().warm_up(self.warmup_connections, self.warmup_model_call, self.warmup_timeout)
+        except Exception as e:
+            # 预热只影响首个请求的延迟，失败时仍然继续，由各项检查决定是否就绪
+            logger.error(f"启动预热失败: {str(e)}")
+            self.warmup = {"error": str(e)}
+        self.warmed_up = True
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"刷新就绪状态失败: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    async def refresh(self):
+        """
+        执行各项检查并更新缓存的就绪状态
+        """
+        workflow = get_workflow()
+        checks = {"workflow": {"ok": workflow.graph is not None}}
+
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(get_repository().ping(), self.db_timeout)
+            checks["db"] = {"ok": True, "latency_ms": round((time.monotonic() - start) * 1000, 1)}
+        except Exception as e:
+            checks["db"] = {"ok": False, "error": str(e) or "存储检查超时"}
+
+        # 上游状态只作为信息返回，不参与就绪判断
+        model = getattr(workflow, "model", None)
+        if model is None:
+            upstream = {"breaker": None, "error": "模型客户端未创建"}
+        else:
+            upstream = {"breaker": breaker_for_model(model).snapshot()["state"]}
+
+        failed = [name for name, check in checks.items() if not check["ok"]]
+        if failed and failed != [name for name, check in self.checks.items() if not check["ok"]]:
+            logger.warning(f"就绪检查未通过: {', '.join(failed)}")
+        self.checks = checks
+        self.upstream = upstream
+        self.checked_at = time.time()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        获取缓存的就绪状态（不执行任何检查）
+
+        Returns:
+            ready、各项检查结果、上游状态（仅供参考）、预热结果、是否正在关闭以及状态的缓存时长
+        """
+        draining = connection_manager.draining
+        ready = self.warmed_up and bool(self.checks) and all(check["ok"] for check in self.checks.values()) and not draining
+        return {
+            "ready": ready,
+            "warming_up": not self.warmed_up,
+            "draining": draining,
+            "checks": self.checks,
+            "upstream": self.upstream,
+            "warmup": self.warmup,
+            "age_s": round(time.time() - self.checked_at, 1) if self.checked_at else None,
+        }
+
+# 全局就绪检查
+readiness_probe = ReadinessProbe(
+    interval=float(os.getenv("SOULBIT_READY_INTERVAL", "5")),
+    db_timeout=float(os.getenv("SOULBIT_READY_DB_TIMEOUT", "2")),
+    warmup_connections=int(os.getenv("SOULBIT_WARMUP_CONNECTIONS", "2")),
+    warmup_model_call=os.getenv("SOULBIT_WARMUP_MODEL_CALL", "0") != "0",
+    warmup_timeout=float(os.getenv("SOULBIT_WARMUP_TIMEOUT", "20")),
+)
@@ -2,39 +2,115 @@
 """
 API路由模块
 """
+import asyncio
 import os
 import json
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+import time
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, List, Optional
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from ..utils.logger import logger
-from ..database.db import save_message
-from ..api.models import PromptIn, LLMOut
-from ..agents.langchain_agent import global_workflow
+from ..utils.profiling import profile_store, timing_stats
+from ..utils.resilience import breaker_snapshot
+from ..utils.serialization import FastJSONResponse, dumps_text, encode_assistant_frame, new_message_id
+from ..database.repository import get_repository
+from ..database.retention import message_archive, retention_manager
+from ..database.sqlite_repository import SQLiteRepository
+from ..database.transfer import iter_export_rows, iter_ndjson_chunks
+from ..api.models import PromptIn, LLMOut, MessageOut, MessagePage, SessionOut
+from ..agents.langchain_agent import get_workflow, workflow_reloader
+from ..agents.mock_model import MOCK_MODEL_ENABLED
+from ..agents.prompt_builder import prompt_cache_stats
+from ..agents.scheduler import current_session_key, turn_scheduler
+from ..agents.single_flight import turn_flights
+from ..agents.transitions import transition_library
+from ..agents.safety_filter import global_persona_filter
+from .admission import admission_controller, retry_after_header
+from .connection_manager import WSSession, connection_manager
+from .identity import bind_identity
+from .multiplex import MUX_INITIAL_CREDITS, MUX_MAX_CHANNELS, MUX_MAX_PENDING, MuxConnection, mux_connections, mux_stats
+from .profiling import capture_profile, require_admin
+from .readiness import readiness_probe
 
 # 创建FastAPI应用实例
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
+
+# 存储仓库（按SOULBIT_DB_BACKEND选择SQLite或Postgres）
+repository = get_repository()
+
+def _admit(request: Request, session_key: str) -> str:
+    """
+    准入控制：按客户端IP和会话限流，超过限制时返回429
+    
+    Args:
+        request: 请求对象（直连地址与X-Forwarded-For）
+        session_key: 会话标识（会话ID或用户ID）
+        
+    Returns:
+        客户端IP
+        
+    Raises:
+        HTTPException: 请求太频繁（429，Retry-After为需要等待的秒数）
+    """
+    client_ip = admission_controller.client_ip(request.client.host if request.client else "", request.headers.get("x-forwarded-for"))
+    wait = admission_controller.admit(client_ip, session_key)
+    if wait > 0:
+        raise HTTPException(status_code=429, detail="请求太频繁，请稍后再试", headers={"Retry-After": retry_after_header(wait)})
+    return client_ip
+
+def _turn_metrics(start: float, final_step: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    计算一个对话轮次的指标（随对话记录保存，并由写入触发器汇总到用量汇总表）
+    
+    Args:
+        start: 收到请求的时间（time.monotonic）
+        final_step: 工作流的最终步骤，没有时视为出错
+        
+    Returns:
+        包含latency_ms、input_tokens、output_tokens和error的字典
+    """
+    usage = (final_step or {}).get("usage") or {}
+    return {
+        "latency_ms": int((time.monotonic() - start) * 1000),
+        "input_tokens": usage.get("input_tokens", 0),
+        "output_tokens": usage.get("output_tokens", 0),
+        "error": final_step is None or bool(final_step.get("degraded", False)),
+    }
 
 # LLM接口
 @app.post("/llm", response_model=LLMOut)
-async def llm(in_data: PromptIn):
+async def llm(in_data: PromptIn, request: Request):
     """
     LLM对话接口，接收用户提示词并返回模型回复
     
     Args:
         in_data: 包含用户提示词的请求数据
+        request: 请求对象（用于准入控制；没有会话ID和用户ID时按客户端地址公平排队）
         
     Returns:
         包含模型回复的响应数据
     """
     logger.info(f"接收到LLM请求，原始输入: {in_data.prompt}")
+    start = time.monotonic()
+    metrics = None  # 本轮指标
     
     prompt = in_data.prompt.strip()  # 获取并清理提示词
+    user_id = (in_data.user_id or "").strip()  # 用户ID（可选）
+    session_id = (in_data.session_id or "").strip()  # 会话ID（可选）
+    # 只有身份令牌验证通过的用户才使用长期记忆，自报的user_id只用于统计和会话
+    verified_user = bind_identity(user_id, in_data.identity)
+    user_id = verified_user or user_id
+    client_ip = _admit(request, session_id or user_id)
+    current_session_key.set(session_id or user_id or client_ip)
     logger.info(f"处理后的提示词: {prompt}")
     
     reply = f"Echo: {prompt}"  # 默认回复（回声模式）
+    transition = ""  # 过渡语
+    agent_decision = ""  # 决策结果
     logger.info(f"初始设置为回声模式，默认回复: {reply}")
     
     # 尝试使用ModelScope API（如果有配置）
-    ms_api_key = os.getenv("MODELSCOPE_API_KEY", "")
+    ms_api_key = os.getenv("MODELSCOPE_API_KEY", "") or MOCK_MODEL_ENABLED
     logger.info(f"检查ModelScope API密钥: {'已配置' if ms_api_key else '未配置'}")
     
     if ms_api_key:
@@ -42,9 +118,13 @@ async def llm(in_data: PromptIn):
         try:
             # 使用多Agent工作流生成回复
             final_reply = None
-            async for step in global_workflow.run(prompt):
+            async for step in get_workflow().run_coalesced(prompt, user_id=verified_user):
+                if step.get("type") == "transition":
+                    transition = step["content"]
+                agent_decision = step.get("agent_decision", agent_decision)
                 if step["is_final"]:
                     final_reply = step["content"]
+                    metrics = _turn_metrics(start, step)
                     logger.info(f"多Agent系统生成最终回复成功: {final_reply[:50]}...")
             
             if final_reply:
@@ -61,11 +141,456 @@ async def llm(in_data: PromptIn):
         return LLMOut(reply=reply, error="LLM call failed")
     
     # 保存对话记录到数据库
-    save_message(prompt, reply)
+    await repository.save_message(prompt, reply, transition, agent_decision, user_id, session_id, **metrics)
     
     logger.info(f"LLM请求处理完成，最终回复: {reply}")
     return LLMOut(reply=reply)  # 返回回复
 
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+    """
+    格式化一条Server-Sent Events事件
+    
+    Args:
+        event: 事件类型
+        data: 事件数据
+        
+    Returns:
+        SSE格式的文本
+    """
+    return f"event: {event}\ndata: {dumps_text(data)}\n\n"
+
+# LLM流式接口（Server-Sent Events）
+@app.post("/llm/stream")
+async def llm_stream(in_data: PromptIn, request: Request):
+    """
+    LLM流式对话接口，以SSE依次推送过渡语（transition）、token增量（delta）和最终回复（final）
+    
+    Args:
+        in_data: 包含用户提示词的请求数据
+        request: 请求对象，用于检测客户端断开
+        
+    Returns:
+        text/event-stream流式响应
+    """
+    prompt = in_data.prompt.strip()
+    user_id = (in_data.user_id or "").strip()
+    session_id = (in_data.session_id or "").strip()
+    verified_user = bind_identity(user_id, in_data.identity)
+    user_id = verified_user or user_id
+    logger.info(f"接收到LLM流式请求，提示词: {prompt}")
+    message_id = new_message_id()
+    start = time.monotonic()
+    client_ip = _admit(request, session_id or user_id)
+    current_session_key.set(session_id or user_id or client_ip)
+    
+    async def event_stream() -> AsyncGenerator[str, None]:
+        if not prompt:
+            yield _sse_event("error", {"id": message_id, "error": "请输入有效的消息"})
+            return
+        
+        if not (os.getenv("MODELSCOPE_API_KEY", "") or MOCK_MODEL_ENABLED):
+            logger.error("未配置ModelScope API密钥，直接返回错误")
+            reply = f"Echo: {prompt}"
+            await repository.save_message(prompt, reply, user_id=user_id, session_id=session_id, **_turn_metrics(start, None))
+            yield _sse_event("final", {"id": message_id, "content": reply, "error": "LLM call failed"})
+            return
+        
+        final_reply = None
+        transition = ""
+        agent_decision = ""
+        metrics = None
+        steps = get_workflow().run_coalesced(prompt, stream_tokens=True, user_id=verified_user)
+        try:
+            async for step in steps:
+                # 客户端断开后停止推送，关闭生成器会释放合并中的订阅
+                if await request.is_disconnected():
+                    logger.info("LLM流式请求: 客户端已断开")
+                    return
+                
+                step_type = step.get("type", "final" if step["is_final"] else "transition")
+                if step_type == "transition":
+                    transition = step["content"]
+                agent_decision = step.get("agent_decision", agent_decision)
+                if step["is_final"]:
+                    final_reply = step["content"]
+                    metrics = _turn_metrics(start, step)
+                yield _sse_event(step_type, {"id": message_id, "content": step["content"]})
+        except Exception as e:
+            logger.error(f"LLM流式请求: 多Agent系统调用失败: {str(e)}")
+            yield _sse_event("error", {"id": message_id, "error": "LLM call failed"})
+        finally:
+            await steps.aclose()
+        
+        if final_reply:
+            await repository.save_message(prompt, final_reply, transition, agent_decision, user_id, session_id, **metrics)
+            logger.info("LLM流式请求: 保存最终回复到数据库成功")
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # 禁止反向代理缓冲，保证逐帧刷新
+        },
+    )
+
+# 历史消息接口
+@app.get("/messages", response_model=MessagePage)
+async def list_messages(
+    limit: int = Query(20, ge=1, le=200),
+    cursor: Optional[str] = None,
+    user_id: Optional[str] = None,
+    agent_decision: Optional[str] = None,
+    q: Optional[str] = Query(None, max_length=200),
+    session_id: Optional[str] = None,
+):
+    """
+    按时间倒序分页查询历史消息，支持按用户、决策结果过滤和关键词搜索
+    
+    Args:
+        limit: 每页条数
+        cursor: 上一页返回的next_cursor，为空时从最新消息开始
+        user_id: 按用户过滤
+        agent_decision: 按决策结果过滤
+        q: 搜索关键词（匹配用户输入或回复）
+        session_id: 按会话过滤
+        
+    Returns:
+        本页消息和下一页游标
+    """
+    before_id = None
+    if cursor:
+        if not cursor.isdigit():
+            raise HTTPException(status_code=400, detail="无效的游标")
+        before_id = int(cursor)
+    
+    q = (q or "").strip() or None
+    items, next_cursor = await repository.query_messages(limit, before_id, user_id, agent_decision, q, session_id)
+    
+    # 热数据已读完时继续从冷归档中读取（归档记录的ID都小于热数据）
+    if next_cursor is None and message_archive.has_segments():
+        archive_before = items[-1]["id"] if items else before_id
+        archived, next_cursor = await asyncio.to_thread(
+            message_archive.query, limit - len(items), archive_before, user_id, agent_decision, q, session_id
+        )
+        items += archived
+    return MessagePage(items=items, next_cursor=str(next_cursor) if next_cursor is not None else None)
+
+# 对话记录导出接口（需在/messages/{message_id}之前注册；可导出全部用户的对话，只对管理员开放）
+@app.get("/messages/export", dependencies=[Depends(require_admin)])
+async def export_messages(
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    user_id: Optional[str] = None,
+    session_id: Optional[str] = None,
+    include_archive: bool = True,
+):
+    """
+    以NDJSON流式导出对话记录（按ID升序），服务端分批读取，内存占用与总量无关
+    
+    需要通过X-Admin-Token或Authorization: Bearer携带管理令牌。
+    
+    Args:
+        since: 起始时间（包含），如2025-01-01
+        until: 截止时间（不包含）
+        user_id: 按用户过滤
+        session_id: 按会话过滤
+        include_archive: 是否包含冷归档中的记录
+        
+    Returns:
+        application/x-ndjson流式响应
+    """
+    rows = iter_export_rows(repository, since=since, until=until, user_id=user_id, session_id=session_id, include_archive=include_archive)
+    return StreamingResponse(
+        iter_ndjson_chunks(rows),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="messages.ndjson"'},
+    )
+
+@app.get("/messages/{message_id}", response_model=MessageOut)
+async def read_message(message_id: int):
+    """
+    查询单条历史消息
+    
+    Args:
+        message_id: 记录ID
+        
+    Returns:
+        消息详情
+    """
+    message = await repository.get_message(message_id)
+    if message is None and message_id <= message_archive.max_id:
+        message = await asyncio.to_thread(message_archive.get, message_id)
+    if message is None:
+        raise HTTPException(status_code=404, detail="消息不存在")
+    return message
+
+# 会话接口
+@app.get("/sessions", response_model=List[SessionOut])
+async def list_sessions(user_id: Optional[str] = None, limit: int = Query(20, ge=1, le=200)):
+    """
+    查询最近活跃的会话
+    
+    Args:
+        user_id: 按用户过滤
+        limit: 最多返回条数
+        
+    Returns:
+        会话列表，按最后活跃时间倒序
+    """
+    return await repository.list_sessions(user_id, limit)
+
+# 前缀缓存统计接口
+@app.get("/stats/prompt-cache")
+def prompt_cache():
+    """
+    查看各Agent的token用量与前缀缓存命中情况
+    """
+    return prompt_cache_stats.snapshot()
+
+# 请求合并统计接口
+@app.get("/stats/single-flight")
+def single_flight():
+    """
+    查看对话轮次合并情况（实际执行次数、被合并次数、进行中轮次数）
+    """
+    return turn_flights.stats()
+
+# 熔断器状态接口
+@app.get("/stats/circuit-breakers")
+def circuit_breakers():
+    """
+    查看各模型端点熔断器的状态
+    """
+    return breaker_snapshot()
+
+# 人设安全过滤统计接口
+@app.get("/stats/safety-filter")
+def safety_filter():
+    """
+    查看人设安全过滤的分片数、改写次数和单分片过滤耗时
+    """
+    return global_persona_filter.stats.snapshot()
+
+# 准入控制统计接口
+@app.get("/stats/admission")
+def admission():
+    """
+    查看按IP和按会话限流的客户端数、放行与拒绝次数
+    """
+    return admission_controller.stats()
+
+# 调度统计接口
+@app.get("/stats/scheduler")
+def scheduler():
+    """
+    查看专业Agent调用调度情况（进行中/排队中的调用数，按路由的排队时间、延迟分位数与SLO达成率）
+    """
+    return turn_scheduler.snapshot()
+
+# 就绪检查接口
+@app.get("/ready")
+def ready():
+    """
+    就绪检查（供编排系统的就绪探针使用）：预热完成且工作流、存储均可用时返回200，否则返回503（上游熔断状态只作为信息返回）
+
+    只读取后台定期刷新的缓存状态，不会直接请求模型服务
+    """
+    status = readiness_probe.snapshot()
+    return FastJSONResponse(status, status_code=200 if status["ready"] else 503)
+
+# 决策微批处理统计接口
+@app.get("/stats/batch-router")
+def batch_router():
+    """
+    查看决策微批处理情况（批次数、节省的决策调用次数、平均批大小、窗口带来的附加延迟）
+    """
+    decision_agent = getattr(get_workflow(), "decision_agent", None)
+    router = getattr(decision_agent, "batch_router", None)
+    if router is None:
+        return {"enabled": False}
+    return router.snapshot()
+
+# 热点路径计时统计接口
+@app.get("/stats/timing")
+def timing():
+    """
+    查看决策Agent与专业Agent各热点方法的调用次数、失败次数、平均与最大耗时
+    """
+    return timing_stats.snapshot()
+
+# 性能剖析管理接口（需要管理令牌）
+@app.get("/debug/profiles", dependencies=[Depends(require_admin)])
+def list_profiles():
+    """
+    列出最近的剖析结果（按请求剖析和全进程剖析）
+    """
+    return profile_store.list()
+
+@app.get("/debug/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+def read_profile(profile_id: str):
+    """
+    获取一次剖析结果，折叠栈格式，可直接交给flamegraph.pl或speedscope渲染
+    
+    Args:
+        profile_id: 剖析ID（按请求剖析时由响应头X-Profile-Id返回）
+    """
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="剖析结果不存在")
+    return PlainTextResponse(profile["folded"])
+
+@app.post("/debug/profile", dependencies=[Depends(require_admin)])
+async def capture(seconds: float = Query(10, gt=0, le=120), interval_ms: Optional[float] = Query(None, ge=1, le=100)):
+    """
+    全进程剖析：在指定秒数内采样所有线程，返回折叠栈格式的结果
+    
+    Args:
+        seconds: 采样时长（秒）
+        interval_ms: 采样间隔（毫秒），为空时使用SOULBIT_PROFILE_INTERVAL_MS
+    """
+    try:
+        profile = await capture_profile(seconds, interval_ms / 1000 if interval_ms else None)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(profile["folded"], headers={"X-Profile-Id": profile["id"]})
+
+# 智能体注册表状态接口
+@app.get("/stats/agents")
+def agents_registry():
+    """
+    查看当前智能体注册表的版本、已注册的Agent和热加载情况
+    """
+    return workflow_reloader.snapshot()
+
+# 智能体注册表热加载接口（需要管理令牌）
+@app.post("/admin/agents/reload", dependencies=[Depends(require_admin)])
+async def reload_agents():
+    """
+    立即重新加载智能体注册表，在后台重建工作流后整体替换，进行中的对话轮次不受影响
+    """
+    try:
+        return await workflow_reloader.reload()
+    except (OSError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# 用量统计接口
+@app.get("/stats/usage")
+async def usage(days: int = Query(30, ge=1, le=366)):
+    """
+    查看最近若干天的对话量、路由分布、平均回复长度、平均耗时、错误率和token用量
+    
+    只读取写入时增量维护的用量汇总表，耗时与历史记录总量无关。
+    
+    Args:
+        days: 天数（含今天）
+        
+    Returns:
+        按天的统计列表和整个区间的汇总
+    """
+    by_day: Dict[str, Dict[str, Any]] = {}
+    total = {"turns": 0, "errors": 0, "reply_chars": 0, "timed_turns": 0, "latency_ms": 0, "input_tokens": 0, "output_tokens": 0, "routes": {}}
+    for row in await repository.usage_daily(days):
+        day = by_day.setdefault(row["day"], {"day": row["day"], "turns": 0, "errors": 0, "reply_chars": 0, "timed_turns": 0, "latency_ms": 0, "input_tokens": 0, "output_tokens": 0, "routes": {}})
+        for bucket in (day, total):
+            for key in ("turns", "errors", "reply_chars", "timed_turns", "latency_ms", "input_tokens", "output_tokens"):
+                bucket[key] += row[key]
+            route = row["agent_decision"] or "未知"
+            bucket["routes"][route] = bucket["routes"].get(route, 0) + row["turns"]
+    
+    def summarize(bucket: Dict[str, Any]) -> Dict[str, Any]:
+        turns = bucket["turns"]
+        return {
+            **{key: value for key, value in bucket.items() if key not in ("reply_chars", "timed_turns", "latency_ms")},
+            "error_rate": round(bucket["errors"] / turns, 4) if turns else 0.0,
+            "avg_reply_chars": round(bucket["reply_chars"] / turns, 1) if turns else 0.0,
+            "avg_latency_ms": round(bucket["latency_ms"] / bucket["timed_turns"], 1) if bucket["timed_turns"] else 0.0,
+        }
+    
+    return {"days": [summarize(day) for day in by_day.values()], "total": summarize(total)}
+
+# 对话记录保留与归档统计接口
+@app.get("/stats/retention")
+def retention():
+    """
+    查看冷归档的分段数、记录数、压缩率和最近一轮归档结果
+    """
+    return retention_manager.stats()
+
+# WebSocket连接统计接口
+@app.get("/stats/connections")
+def connections():
+    """
+    查看当前WebSocket连接数和进行中的对话轮次数，以及多路复用连接的通道统计
+    """
+    return {**connection_manager.stats(), "mux": mux_stats()}
+
+async def _ws_turn(session: WSSession, prompt: str, user_id: str, send: Callable[[str], Awaitable[None]], identity: str = ""):
+    """
+    执行一个WebSocket对话轮次：依次发送回复步骤，保存对话记录并追加到会话的上下文历史（/ws/chat与/ws/mux共用）
+    
+    Args:
+        session: 会话状态（/ws/chat为连接本身，/ws/mux为逻辑通道）
+        prompt: 用户输入
+        user_id: 用户ID（客户端自报）
+        send: 发送一帧文本的函数
+        identity: 身份令牌，验证通过时才使用长期记忆
+    """
+    verified_user = bind_identity(user_id, identity)
+    user_id = verified_user or user_id
+    session.busy = True
+    try:
+        start = time.monotonic()
+        reply = f"Echo: {prompt}"  # 默认回复
+        
+        # 尝试使用ModelScope API
+        ms_api_key = os.getenv("MODELSCOPE_API_KEY", "") or MOCK_MODEL_ENABLED
+        if ms_api_key:
+            logger.info("WebSocket: 使用基于LangChain的多Agent系统处理请求")
+            try:
+                # 使用多Agent工作流生成回复（异步生成器）
+                final_reply = None
+                transition = ""
+                agent_decision = ""
+                metrics = None
+                async for step in get_workflow().run_coalesced(prompt, session.history, user_id=verified_user):
+                    step_content = step["content"]
+                    is_final = step["is_final"]
+                    logger.info(f"WebSocket: 多Agent系统生成回复步骤: {step_content[:50]}...")
+                    
+                    # 记录过渡语和决策结果，保存最终回复（最后一个步骤）
+                    if step.get("type") == "transition":
+                        transition = step_content
+                    agent_decision = step.get("agent_decision", agent_decision)
+                    if is_final:
+                        final_reply = step_content
+                        metrics = _turn_metrics(start, step)
+                    
+                    # 发送回复步骤，添加loading标志（如果不是最终回复则显示loading）
+                    await send(encode_assistant_frame(new_message_id(), step_content, loading=not is_final))
+                    
+                    # 简单的延迟，模拟真实思考过程
+                    await asyncio.sleep(1)
+                
+                # 保存最终回复到数据库，并追加到本会话的上下文历史（轮次进行中历史不变）
+                if final_reply:
+                    if session.history is not None:
+                        session.history.append_turn(prompt, final_reply)
+                    await repository.save_message(prompt, final_reply, transition, agent_decision, user_id, session.session_id, **metrics)
+                    logger.info(f"WebSocket: 保存最终回复到数据库成功")
+                
+                return  # 已经发送了所有回复步骤，跳过默认回复
+            except Exception as e:
+                logger.error(f"WebSocket: 多Agent系统调用失败: {str(e)}")
+        
+        # 保存对话记录（默认情况）
+        await repository.save_message(prompt, reply, user_id=user_id, session_id=session.session_id, **_turn_metrics(start, None))
+        
+        # 发送默认助手回复
+        await send(encode_assistant_frame(new_message_id(), reply))
+    finally:
+        session.busy = False
+
 # WebSocket接口
 @app.websocket("/ws/chat")
 async def websocket_chat(websocket: WebSocket):
@@ -75,7 +600,12 @@ async def websocket_chat(websocket: WebSocket):
     Args:
         websocket: WebSocket连接实例
     """
-    await websocket.accept()  # 接受WebSocket连接
+    # 接受连接并登记会话（超过最大连接数时拒绝）
+    session = await connection_manager.connect(websocket)
+    if session is None:
+        return
+    current_session_key.set(session.session_id)
+    client_ip = admission_controller.client_ip(websocket.client.host if websocket.client else "", websocket.headers.get("x-forwarded-for"))
     logger.info("WebSocket连接已建立")
     
     try:
@@ -84,69 +614,159 @@ async def websocket_chat(websocket: WebSocket):
             data = await websocket.receive_text()
             logger.info(f"WebSocket接收到消息: {data}")
             
+            # 检查消息大小和发送频率
+            limit_error = connection_manager.check_message(session, data)
+            if limit_error:
+                await websocket.send_text(dumps_text({"error": limit_error}))
+                continue
+            
             # 解析消息
             try:
                 message = json.loads(data)
+                # 心跳回应只用于刷新活跃时间
+                if message.get("type") == "pong":
+                    continue
                 prompt = message.get("prompt", "").strip()
+                user_id = str(message.get("user_id") or "").strip()
+                identity = str(message.get("identity") or "")
                 if not prompt:
-                    await websocket.send_text(json.dumps({"error": "请输入有效的消息"}))
+                    await websocket.send_text(dumps_text({"error": "请输入有效的消息"}))
+                    continue
+                # 准入控制：按客户端IP（跨连接）和会话限流
+                wait = admission_controller.admit(client_ip, session.session_id)
+                if wait > 0:
+                    await websocket.send_text(dumps_text({"error": "请求太频繁，请稍后再试", "retry_after": int(retry_after_header(wait))}))
                     continue
             except json.JSONDecodeError:
-                await websocket.send_text(json.dumps({"error": "无效的JSON格式"}))
+                await websocket.send_text(dumps_text({"error": "无效的JSON格式"}))
                 continue
             
             # 不需要将用户消息回传给客户端，前端已经在发送时添加了该消息
-            
-            # 生成回复
-            reply = f"Echo: {prompt}"  # 默认回复
-            
-            # 尝试使用ModelScope API
-            ms_api_key = os.getenv("MODELSCOPE_API_KEY", "")
-            if ms_api_key:
-                logger.info("WebSocket: 使用基于LangChain的多Agent系统处理请求")
-                try:
-                    # 使用多Agent工作流生成回复（异步生成器）
-                    final_reply = None
-                    async for step in global_workflow.run(prompt):
-                        step_content = step["content"]
-                        is_final = step["is_final"]
-                        logger.info(f"WebSocket: 多Agent系统生成回复步骤: {step_content[:50]}...")
-                        
-                        # 保存最终回复（最后一个步骤）
-                        if is_final:
-                            final_reply = step_content
-                        
-                        # 发送回复步骤，添加loading标志（如果不是最终回复）
-                        assistant_message = {
-                            "id": str(os.urandom(8).hex()), 
-                            "role": "assistant", 
-                            "content": step_content,
-                            "loading": not is_final  # 如果不是最终回复，则显示loading
-                        }
-                        await websocket.send_text(json.dumps(assistant_message))
-                        
-                        # 简单的延迟，模拟真实思考过程
-                        import asyncio
-                        await asyncio.sleep(1)
-                    
-                    # 保存最终回复到数据库
-                    if final_reply:
-                        save_message(prompt, final_reply)
-                        logger.info(f"WebSocket: 保存最终回复到数据库成功")
-                    
-                    continue  # 已经发送了所有回复步骤，跳过默认回复
-                except Exception as e:
-                    logger.error(f"WebSocket: 多Agent系统调用失败: {str(e)}")
-            
-            # 保存对话记录（默认情况）
-            save_message(prompt, reply)
-            
-            # 发送默认助手回复
-            assistant_message = {"id": str(os.urandom(8).hex()), "role": "assistant", "content": reply}
-            await websocket.send_text(json.dumps(assistant_message))
+            await _ws_turn(session, prompt, user_id, websocket.send_text, identity)
             
     except WebSocketDisconnect:
         logger.info("WebSocket连接已关闭")
     except Exception as e:
         logger.error(f"WebSocket连接发生错误: {str(e)}")
-        await websocket.close(code=1011, reason=str(e))
\ No newline at end of file
+        await websocket.close(code=1011, reason=str(e))
+    finally:
+        connection_manager.disconnect(session)
+
+# 多路复用WebSocket接口（供Go网关使用）
+@app.websocket("/ws/mux")
+async def websocket_mux(websocket: WebSocket):
+    """
+    多路复用WebSocket接口：一条连接承载多个逻辑会话，帧中带通道ID，
+    每个通道独立流控（发送额度）、独立取消，协议见api/multiplex.py；直连客户端继续使用/ws/chat
+    
+    Args:
+        websocket: WebSocket连接实例
+    """
+    session = await connection_manager.connect(websocket)
+    if session is None:
+        return
+    peer = websocket.client.host if websocket.client else ""
+    mux = MuxConnection(
+        session, _ws_turn, peer, max_channels=MUX_MAX_CHANNELS, initial_credits=MUX_INITIAL_CREDITS, max_pending=MUX_MAX_PENDING
+    )
+    mux_connections.add(mux)
+    logger.info(f"WebSocket多路复用连接已建立: {peer}")
+    
+    try:
+        while True:
+            await mux.handle(await websocket.receive_text())
+    except WebSocketDisconnect:
+        logger.info("WebSocket多路复用连接已关闭")
+    except Exception as e:
+        logger.error(f"WebSocket多路复用连接发生错误: {str(e)}")
+        await websocket.close(code=1011, reason=str(e))
+    finally:
+        mux_connections.discard(mux)
+        await mux.close()
+        connection_manager.disconnect(session)
+
+# 初始化存储（需在其他读取数据库的启动任务之前注册）
+@app.on_event("startup")
+async def init_storage():
+    """
+    服务启动时初始化存储后端（建表、建索引、创建连接池）
+    """
+    await repository.init()
+
+# 从历史消息扩充本地过渡语库
+@app.on_event("startup")
+async def harvest_transitions():
+    """
+    服务启动时从messages表收集历史过渡语（SOULBIT_TRANSITION_HARVEST=0时跳过）
+    """
+    if os.getenv("SOULBIT_TRANSITION_HARVEST", "1") != "0":
+        try:
+            transition_library.harvest(await repository.recent_transitions())
+        except Exception as e:
+            logger.error(f"收集历史过渡语失败: {str(e)}")
+
+# 启动对话记录保留任务（仅SQLite后端，Postgres使用原生分区）
+@app.on_event("startup")
+async def start_retention():
+    """
+    服务启动时启动后台归档任务（SOULBIT_RETENTION_DAYS大于0时）
+    """
+    if isinstance(repository, SQLiteRepository):
+        await retention_manager.start()
+
+# 启动WebSocket心跳与空闲回收
+@app.on_event("startup")
+async def start_connection_manager():
+    """
+    服务启动时启动WebSocket心跳任务
+    """
+    await connection_manager.start()
+
+# 启动预热与就绪状态刷新
+@app.on_event("startup")
+async def start_readiness():
+    """
+    服务启动时在后台预热（建立上游连接、格式化提示词模板），之后定期刷新就绪状态
+    """
+    await readiness_probe.start()
+
+# 启动智能体注册表热加载
+@app.on_event("startup")
+async def start_agent_reloader():
+    """
+    服务启动时启动注册表配置文件的修改检查（SOULBIT_AGENT_RELOAD_INTERVAL为0时不启动）
+    """
+    await workflow_reloader.start()
+
+# 服务关闭时平滑断开WebSocket连接
+@app.on_event("shutdown")
+async def drain_connections():
+    """
+    服务关闭时等待进行中的对话轮次结束，然后关闭所有WebSocket连接
+    """
+    await connection_manager.drain(timeout=float(os.getenv("SOULBIT_WS_DRAIN_TIMEOUT", "10")))
+
+# 服务关闭时停止就绪状态刷新
+@app.on_event("shutdown")
+async def stop_readiness():
+    """
+    服务关闭时停止就绪状态刷新（在关闭存储后端之前）
+    """
+    await readiness_probe.stop()
+
+# 服务关闭时停止注册表热加载
+@app.on_event("shutdown")
+async def stop_agent_reloader():
+    """
+    服务关闭时停止注册表配置文件的修改检查
+    """
+    await workflow_reloader.stop()
+
+# 服务关闭时释放存储资源
+@app.on_event("shutdown")
+async def close_storage():
+    """
+    服务关闭时关闭存储后端（在断开WebSocket连接之后）
+    """
+    await retention_manager.stop()
+    await repository.close()
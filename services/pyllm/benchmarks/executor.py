@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+执行器开销基准测试：LangGraph路径 vs 直接分派路径
+
+使用不调用模型的替身Agent，只测量每个对话轮次在Python侧的调度开销和内存分配。
+
+用法（从项目根目录运行）：
+    python -m services.pyllm.benchmarks.executor --turns 2000 --route 心理专家Agent
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional, Tuple
+from ..agents.direct_executor import DirectExecutor
+from ..agents.langchain_agent import DecisionAgent, MultiAgentWorkflow, ProfessionalAgent
+from ..agents.registry import load_registry
+
+class _StubDecisionAgent(DecisionAgent):
+    """
+    固定返回指定决策的决策Agent替身
+    """
+    def __init__(self, agent_decision: str):
+        self.agent_decision = agent_decision
+        self.degraded_reply = ""
+
+    async def classify(self, input_text: str, deadline: Optional[float] = None) -> Dict[str, Any]:
+        direct = self.agent_decision == "闲聊Agent"
+        return {
+            "agent_decision": self.agent_decision,
+            "transition": "" if direct else "我问问朋友～",
+            "reply": "好呀" if direct else "",
+            "degraded": False,
+        }
+
+class _StubSpecialist(ProfessionalAgent):
+    """
+    固定返回回复的专业Agent替身
+    """
+    def __init__(self, agent_type: str):
+        self.agent_type = agent_type
+        self.degraded_reply = ""
+
+    async def generate(self, input_text: str, context_history: Optional[List[Dict[str, str]]] = None, deadline: Optional[float] = None, user_id: str = "") -> Tuple[str, bool]:
+        return f"{self.agent_type}的回复", False
+
+def build_workflow(route: str) -> MultiAgentWorkflow:
+    """
+    构建使用替身Agent的工作流
+
+    Args:
+        route: 决策结果
+
+    Returns:
+        工作流实例
+    """
+    workflow = MultiAgentWorkflow.__new__(MultiAgentWorkflow)
+    workflow.model = None
+    workflow.registry = load_registry()
+    workflow.decision_agent = _StubDecisionAgent(route)
+    workflow.specialists = {spec.route: _StubSpecialist(spec.name) for spec in workflow.registry.specialists}
+    workflow.graph = workflow._build_graph()
+    workflow.direct_executor = DirectExecutor(workflow.decision_agent, workflow.specialists)
+    return workflow
+
+async def run_turns(workflow: MultiAgentWorkflow, executor: str, turns: int, history: List[Dict[str, str]]) -> Tuple[float, float]:
+    """
+    运行指定轮数并测量耗时和单轮内存峰值
+
+    Args:
+        workflow: 工作流实例
+        executor: 执行器名称（langgraph/direct）
+        turns: 轮数
+        history: 上下文历史
+
+    Returns:
+        (总耗时秒数, 单轮平均内存峰值字节数)
+    """
+    workflow.executor = executor
+    # 预热
+    for _ in range(20):
+        async for _step in workflow.run("今天心情不太好", history):
+            pass
+
+    start = time.perf_counter()
+    for _ in range(turns):
+        async for _step in workflow.run("今天心情不太好", history):
+            pass
+    elapsed = time.perf_counter() - start
+
+    # 单独测量内存峰值（tracemalloc本身会拖慢执行，不计入耗时）
+    samples = min(turns, 200)
+    peak_total = 0
+    tracemalloc.start()
+    for _ in range(samples):
+        current, _peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        async for _step in workflow.run("今天心情不太好", history):
+            pass
+        peak_total += tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+    return elapsed, peak_total / samples
+
+async def bench(turns: int, route: str, history_len: int):
+    """
+    对比两种执行器
+
+    Args:
+        turns: 轮数
+        route: 决策结果
+        history_len: 上下文历史条数
+    """
+    workflow = build_workflow(route)
+    history = [{"role": "user" if i % 2 == 0 else "assistant", "content": f"第{i}条消息"} for i in range(history_len)]
+
+    for executor in ("langgraph", "direct"):
+        elapsed, peak = await run_turns(workflow, executor, turns, history)
+        print(f"{executor:>9}: {elapsed / turns * 1e6:8.1f} µs/轮, 单轮内存峰值 {peak:8.0f} 字节")
+
+def main():
+    """
+    命令行入口
+    """
+    parser = argparse.ArgumentParser(description="执行器开销基准测试")
+    parser.add_argument("--turns", type=int, default=2000, help="轮数")
+    parser.add_argument("--route", default="心理专家Agent", help="决策结果：闲聊Agent/心理专家Agent/脱口秀演员Agent")
+    parser.add_argument("--history", type=int, default=20, help="上下文历史条数")
+    args = parser.parse_args()
+    asyncio.run(bench(args.turns, args.route, args.history))
+
+if __name__ == "__main__":
+    main()
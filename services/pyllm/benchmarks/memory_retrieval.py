@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+长期记忆检索基准测试：检索延迟 vs 索引大小
+
+在临时目录中构建不同大小的单用户索引，测量向量化、top-k检索的耗时（不含数据库读取）。
+
+用法（从项目根目录运行）：
+    python -m services.pyllm.benchmarks.memory_retrieval --sizes 1000 10000 100000 --queries 200
+"""
+import argparse
+import random
+import tempfile
+import time
+from typing import List
+import numpy as np
+from ..memory.embedder import HashingEmbedder
+from ..memory.index import VectorIndex, user_index_path
+
+_WORDS = ["最近", "工作", "压力", "好大", "睡不着", "朋友", "吵架", "心情", "不错", "考试", "焦虑", "家人", "周末", "想哭", "开心", "迷茫", "未来", "失恋", "加班", "孤独"]
+
+def random_texts(count: int, seed: int = 0) -> List[str]:
+    """
+    生成随机的中文短句
+
+    Args:
+        count: 条数
+        seed: 随机种子
+
+    Returns:
+        文本列表
+    """
+    rng = random.Random(seed)
+    return ["".join(rng.choices(_WORDS, k=rng.randint(3, 8))) for _ in range(count)]
+
+def bench(sizes: List[int], queries: int, k: int, dim: int):
+    """
+    对不同索引大小测量检索延迟
+
+    Args:
+        sizes: 索引大小列表
+        queries: 每个大小的查询次数
+        k: top-k
+        dim: 向量维度
+    """
+    embedder = HashingEmbedder(dim)
+    query_texts = random_texts(queries, seed=1)
+    with tempfile.TemporaryDirectory() as root:
+        for size in sizes:
+            index = VectorIndex(user_index_path(root, f"user-{size}"), dim)
+            start = time.perf_counter()
+            batch = 10000
+            for offset in range(0, size, batch):
+                texts = random_texts(min(batch, size - offset), seed=offset)
+                index.add(list(range(offset, offset + len(texts))), embedder(texts))
+            build_seconds = time.perf_counter() - start
+
+            latencies = []
+            for text in query_texts:
+                start = time.perf_counter()
+                index.search(embedder([text])[0], k)
+                latencies.append(time.perf_counter() - start)
+            latencies_ms = np.array(latencies) * 1000
+            print(
+                f"索引 {size:>8} 条: 构建 {build_seconds:6.2f}s, "
+                f"检索 p50 {np.percentile(latencies_ms, 50):7.3f}ms, p95 {np.percentile(latencies_ms, 95):7.3f}ms"
+            )
+
+def main():
+    """
+    命令行入口
+    """
+    parser = argparse.ArgumentParser(description="长期记忆检索基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="索引大小")
+    parser.add_argument("--queries", type=int, default=200, help="每个大小的查询次数")
+    parser.add_argument("--k", type=int, default=3, help="top-k")
+    parser.add_argument("--dim", type=int, default=256, help="向量维度")
+    args = parser.parse_args()
+    bench(args.sizes, args.queries, args.k, args.dim)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,434 @@
+# -*- coding: utf-8 -*-
+"""
+路由评估：决策准确率 vs 延迟与token成本
+
+在带标注的问题集上运行一个或多个路由实现，输出混淆矩阵、准确率、p50/p95延迟和每次决策的token用量，
+用于评估缩小或替换决策步骤（更小的模型、更短的提示词、本地分类器）后路由质量是否下降。
+
+路由实现需要提供 async classify(input_text, deadline=None)，返回包含agent_decision的字典：
+- decision：DecisionAgent（基线），可用--registry指定多个注册表配置比较不同的决策提示词
+- keyword：本地关键词分类器（不调用模型，使用注册表中各Agent的关键词，与离线模拟模型的决策规则相同）
+- 自定义：在--routers中写module:factory，factory(model, registry)返回路由实现
+
+模型来源：
+- mock：离线模拟模型（按关键词决策，只用于验证评估流程和测量Python侧开销）
+- live：真实模型端点（需要MODELSCOPE_API_KEY），可用--record记录每次决策的原始输出、token用量和耗时
+- replay：回放--record记录的结果（按决策提示词和输入匹配，不访问网络，结果与延迟可复现）
+
+标注集为JSONL，每行{"input": 用户问题, "label": 路由标签}；可以从messages表生成初稿，
+其中的标签是线上决策的结果，需要人工复核后再作为标注使用。
+
+用法（从项目根目录运行）：
+    python -m services.pyllm.benchmarks.routing_eval seed --output /tmp/routing_seed.jsonl --per-route 50
+    python -m services.pyllm.benchmarks.routing_eval run --model mock --routers decision keyword
+    python -m services.pyllm.benchmarks.routing_eval run --model live --record /tmp/routing_replay.jsonl
+    python -m services.pyllm.benchmarks.routing_eval run --model replay --replay /tmp/routing_replay.jsonl --json /tmp/report.json
+"""
+import argparse
+import asyncio
+import hashlib
+import importlib
+import json
+import os
+import sqlite3
+import sys
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableLambda
+from ..agents.langchain_agent import DecisionAgent, create_model_scope_client
+from ..agents.mock_model import MockChatModel, keyword_route
+from ..agents.prompt_builder import begin_turn_usage
+from ..agents.registry import AgentRegistry, load_registry
+from ..database.db import db_path
+from ..utils.resilience import CircuitBreaker
+
+# 内置标注集
+DEFAULT_DATASET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "routing_eval.jsonl")
+
+# 预测结果不在注册表中或决策降级时归入的列
+OTHER_LABEL = "其他"
+
+def replay_key(system_prompt: str, input_text: str) -> str:
+    """
+    回放记录的键：决策提示词和用户输入（提示词变化后原记录不再命中）
+    """
+    return hashlib.sha256(f"{system_prompt}\x00{input_text}".encode("utf-8")).hexdigest()[:24]
+
+def load_dataset(path: str, registry: AgentRegistry) -> List[Dict[str, str]]:
+    """
+    读取标注集
+
+    Args:
+        path: JSONL文件路径
+        registry: 注册表（校验标签）
+
+    Returns:
+        [{"input", "label"}]
+
+    Raises:
+        ValueError: 标签不在注册表中
+    """
+    items = []
+    with open(path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if item.get("label") not in registry.by_route:
+                raise ValueError(f"{path}第{number}行的标签不在注册表中: {item.get('label')}")
+            items.append({"input": item["input"], "label": item["label"]})
+    return items
+
+def seed_from_messages(db_path: str, output: str, per_route: int, limit: int) -> Counter:
+    """
+    从messages表生成标注集初稿：按输入去重，每个路由最多取per_route条最近的记录
+
+    Args:
+        db_path: SQLite数据库路径
+        output: 输出的JSONL文件路径
+        per_route: 每个路由最多的条数
+        limit: 最多读取的最近记录数
+
+    Returns:
+        各路由写入的条数
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute(
+            "SELECT prompt, agent_decision FROM messages WHERE agent_decision != '' ORDER BY id DESC LIMIT ?",
+            (limit,),
+        ).fetchall()
+    finally:
+        conn.close()
+
+    counts: Counter = Counter()
+    seen = set()
+    with open(output, "w", encoding="utf-8") as f:
+        for prompt, agent_decision in rows:
+            prompt = (prompt or "").strip()
+            if not prompt or prompt in seen or counts[agent_decision] >= per_route:
+                continue
+            seen.add(prompt)
+            counts[agent_decision] += 1
+            f.write(json.dumps({"input": prompt, "label": agent_decision, "source": "messages"}, ensure_ascii=False) + "\n")
+    return counts
+
+class KeywordRouter:
+    """
+    本地关键词分类器（不调用模型，使用注册表中各Agent的关键词）
+    """
+    def __init__(self, registry: AgentRegistry):
+        self.registry = registry
+
+    async def classify(self, input_text: str, deadline: Optional[float] = None) -> Dict[str, Any]:
+        return {"agent_decision": keyword_route(self.registry, input_text), "degraded": False}
+
+class ReplayChatModel(MockChatModel):
+    """
+    回放记录的决策输出：按原始耗时等待后返回原始内容和token用量
+    """
+    records: Dict[str, Dict[str, Any]] = {}
+    speed: float = 1.0  # 回放速度倍数（耗时除以该值）
+    misses: int = 0  # 没有找到记录的调用数
+
+    @property
+    def _llm_type(self) -> str:
+        return "soulbit-replay"
+
+    def _lookup(self, messages: List[BaseMessage]) -> Dict[str, Any]:
+        system = next((m.content for m in messages if isinstance(m, SystemMessage)), "")
+        user = next((m.content for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+        record = self.records.get(replay_key(system, user))
+        if record is None:
+            self.misses += 1
+            raise KeyError(f"没有回放记录: {user[:20]}")
+        return record
+
+    def _result(self, record: Dict[str, Any]) -> ChatResult:
+        message = AIMessage(content=record["content"], usage_metadata=record["usage"])
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        record = self._lookup(messages)
+        time.sleep(record["latency_ms"] / 1000 / self.speed)
+        return self._result(record)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        record = self._lookup(messages)
+        await asyncio.sleep(record["latency_ms"] / 1000 / self.speed)
+        return self._result(record)
+
+def load_replay(path: str, speed: float) -> ReplayChatModel:
+    """
+    读取--record写出的记录，创建回放模型
+    """
+    records = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                records[record["key"]] = record
+    return ReplayChatModel(records=records, speed=speed)
+
+# 当前评估条目捕获到的决策模型原始输出（每个条目在独立的任务中运行）
+_captured: ContextVar[Optional[List[Any]]] = ContextVar("routing_eval_captured", default=None)
+
+def _capture(message: Any) -> Any:
+    """
+    记录决策模型的原始输出，原样返回
+    """
+    captured = _captured.get()
+    if captured is not None:
+        captured.append(message)
+    return message
+
+def _isolate_breaker(agent: DecisionAgent, name: str):
+    """
+    为评估的决策Agent换上独立且不会打开的熔断器
+
+    默认的熔断器按模型端点全局共享：评估中的失败会打开线上使用的熔断器，
+    熔断器打开后其余问题也会被立即降级，评估结果只反映熔断而不是路由质量。
+    """
+    agent.breaker = CircuitBreaker(f"routing-eval|{name}", failure_threshold=sys.maxsize, slow_call_seconds=float("inf"))
+
+def build_decision_router(model: Any, registry: AgentRegistry, record: bool, name: str = "decision") -> DecisionAgent:
+    """
+    创建基线决策Agent（逐条评估，不经过微批处理，使用独立的熔断器）
+    """
+    agent = DecisionAgent(model, registry)
+    agent.batch_router = None
+    _isolate_breaker(agent, name)
+    if record:
+        agent.decision_chain = agent.decision_chain | RunnableLambda(_capture)
+    return agent
+
+def build_custom_router(spec: str, model: Any, registry: AgentRegistry) -> Any:
+    """
+    按module:factory创建自定义路由实现
+    """
+    module_name, _, attr = spec.partition(":")
+    factory = getattr(importlib.import_module(module_name), attr or "create_router")
+    router = factory(model, registry)
+    if isinstance(router, DecisionAgent):
+        _isolate_breaker(router, spec)
+    return router
+
+def _percentile(values: List[float], q: float) -> float:
+    """
+    计算分位数（毫秒）
+    """
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] * 1000 if values else 0.0
+
+async def evaluate(router: Any, dataset: List[Dict[str, str]], concurrency: int, recorder: Optional[List[Dict[str, Any]]] = None, system_prompt: str = "") -> List[Dict[str, Any]]:
+    """
+    在标注集上运行路由实现
+
+    Args:
+        router: 路由实现（提供classify）
+        dataset: 标注集
+        concurrency: 同时进行的决策数
+        recorder: 不为None时追加每次决策的回放记录
+        system_prompt: 决策提示词（生成回放记录的键）
+
+    Returns:
+        每条问题的结果：input、label、predicted、degraded、latency、input_tokens、output_tokens
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(item: Dict[str, str]) -> Dict[str, Any]:
+        async with semaphore:
+            usage = begin_turn_usage()
+            captured: List[Any] = []
+            _captured.set(captured)
+            start = time.monotonic()
+            try:
+                result = await router.classify(item["input"])
+                predicted, degraded = result.get("agent_decision", ""), bool(result.get("degraded"))
+            except Exception as e:
+                predicted, degraded = "", True
+                print(f"决策失败: {item['input'][:20]}: {str(e)}")
+            latency = time.monotonic() - start
+        if recorder is not None and captured:
+            message = captured[-1]
+            recorder.append({
+                "key": replay_key(system_prompt, item["input"]),
+                "input": item["input"],
+                "content": message.content,
+                "usage": getattr(message, "usage_metadata", None) or {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0},
+                "latency_ms": round(latency * 1000, 1),
+            })
+        return {
+            "input": item["input"],
+            "label": item["label"],
+            "predicted": predicted,
+            "degraded": degraded,
+            "latency": latency,
+            "input_tokens": usage["input_tokens"],
+            "output_tokens": usage["output_tokens"],
+        }
+
+    # 每个条目在独立的任务中运行，token用量和输出捕获互不干扰
+    return list(await asyncio.gather(*(asyncio.create_task(one(item)) for item in dataset)))
+
+def summarize(results: List[Dict[str, Any]], routes: List[str]) -> Dict[str, Any]:
+    """
+    汇总评估结果
+
+    Args:
+        results: evaluate()的结果
+        routes: 路由标签（混淆矩阵的行列顺序）
+
+    Returns:
+        样本数、准确率、降级数、混淆矩阵（行为标注，列为预测）、各路由的精确率/召回率、延迟分位数和平均token用量
+
+    降级的条目（超时、熔断、回放未命中等）返回的是兜底路由而不是模型的判断，计入"其他"列（算作预测错误），
+    其耗时也不计入延迟分位数。
+    """
+    columns = routes + [OTHER_LABEL]
+    matrix = {label: {column: 0 for column in columns} for label in routes}
+    for item in results:
+        predicted = item["predicted"] if item["predicted"] in routes and not item["degraded"] else OTHER_LABEL
+        matrix[item["label"]][predicted] += 1
+
+    per_route = {}
+    for route in routes:
+        true_positive = matrix[route][route]
+        predicted_total = sum(matrix[label][route] for label in routes)
+        label_total = sum(matrix[route].values())
+        per_route[route] = {
+            "precision": round(true_positive / predicted_total, 4) if predicted_total else 0.0,
+            "recall": round(true_positive / label_total, 4) if label_total else 0.0,
+            "support": label_total,
+        }
+
+    count = len(results)
+    latencies = [item["latency"] for item in results if not item["degraded"]]
+    correct = sum(matrix[label][label] for label in routes)
+    return {
+        "samples": count,
+        "accuracy": round(correct / count, 4) if count else 0.0,
+        "degraded": sum(item["degraded"] for item in results),
+        "confusion": matrix,
+        "per_route": per_route,
+        "p50_ms": round(_percentile(latencies, 0.5), 1),
+        "p95_ms": round(_percentile(latencies, 0.95), 1),
+        "avg_input_tokens": round(sum(item["input_tokens"] for item in results) / count, 1) if count else 0.0,
+        "avg_output_tokens": round(sum(item["output_tokens"] for item in results) / count, 1) if count else 0.0,
+    }
+
+def print_report(name: str, summary: Dict[str, Any], routes: List[str]):
+    """
+    打印一个路由实现的评估结果
+    """
+    print(f"\n== {name} ==")
+    print(
+        f"样本 {summary['samples']} | 准确率 {summary['accuracy'] * 100:5.1f}% | 降级 {summary['degraded']} | "
+        f"p50 {summary['p50_ms']:.0f} ms | p95 {summary['p95_ms']:.0f} ms | "
+        f"每次决策token 输入 {summary['avg_input_tokens']:.1f} / 输出 {summary['avg_output_tokens']:.1f}"
+    )
+    columns = routes + [OTHER_LABEL]
+    print("混淆矩阵（行：标注，列：预测）")
+    print(f"{'':<12}" + "".join(f"{column:>12}" for column in columns))
+    for label in routes:
+        print(f"{label:<12}" + "".join(f"{summary['confusion'][label][column]:>12}" for column in columns))
+    for route, stats in summary["per_route"].items():
+        print(f"  {route}: 精确率 {stats['precision'] * 100:5.1f}%, 召回率 {stats['recall'] * 100:5.1f}%, 样本 {stats['support']}")
+
+async def run(args: argparse.Namespace):
+    """
+    按命令行参数构建路由实现并逐个评估
+    """
+    registries = [load_registry(path) for path in args.registry] if args.registry else [load_registry()]
+    routes = list(registries[0].routes)
+    dataset = load_dataset(args.dataset, registries[0])
+    if args.limit:
+        dataset = dataset[:args.limit]
+
+    if args.model == "mock":
+        model = MockChatModel(latency=args.mock_latency_ms / 1000, token_delay=0.0, registry=registries[0])
+    elif args.model == "replay":
+        if not args.replay:
+            raise SystemExit("--model replay需要指定--replay")
+        model = load_replay(args.replay, args.replay_speed)
+    else:
+        model = create_model_scope_client()
+        if model is None:
+            raise SystemExit("无法创建模型客户端，请检查MODELSCOPE_API_KEY")
+    record = args.record is not None
+    if record and args.model != "live":
+        raise SystemExit("--record只能与--model live一起使用")
+
+    routers: Dict[str, Any] = {}
+    for name in args.routers:
+        if name == "decision":
+            for path, registry in zip(args.registry or [""], registries):
+                label = f"decision（{os.path.basename(path)}）" if args.registry else "decision（基线）"
+                routers[label] = build_decision_router(model, registry, record, label)
+        elif name == "keyword":
+            routers["keyword"] = KeywordRouter(registries[0])
+        else:
+            routers[name] = build_custom_router(name, model, registries[0])
+
+    print(f"标注集 {len(dataset)} 条，模型 {args.model}，并发 {args.concurrency}")
+    recorder: Optional[List[Dict[str, Any]]] = [] if record else None
+    report = {}
+    for name, router in routers.items():
+        system_prompt = getattr(router, "decision_system_prompt", "")
+        results = await evaluate(router, dataset, args.concurrency, recorder if system_prompt else None, system_prompt)
+        summary = summarize(results, routes)
+        print_report(name, summary, routes)
+        report[name] = {**summary, "results": results}
+
+    if isinstance(model, ReplayChatModel) and model.misses:
+        print(f"\n回放未命中 {model.misses} 次（决策提示词或输入与记录不一致）")
+    if recorder is not None:
+        with open(args.record, "w", encoding="utf-8") as f:
+            for item in recorder:
+                f.write(json.dumps(item, ensure_ascii=False) + "\n")
+        print(f"\n已记录 {len(recorder)} 次决策到 {args.record}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"完整结果已写入 {args.json}")
+
+def main():
+    """
+    命令行入口
+    """
+    parser = argparse.ArgumentParser(description="路由评估：决策准确率 vs 延迟与token成本")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    seed = commands.add_parser("seed", help="从messages表生成标注集初稿（标签为线上决策结果，需人工复核）")
+    seed.add_argument("--db", default=None, help="SQLite数据库路径，默认为服务的数据库")
+    seed.add_argument("--output", required=True, help="输出的JSONL文件")
+    seed.add_argument("--per-route", type=int, default=50, help="每个路由最多的条数")
+    seed.add_argument("--limit", type=int, default=20000, help="最多读取的最近记录数")
+
+    evaluate_parser = commands.add_parser("run", help="在标注集上评估路由实现")
+    evaluate_parser.add_argument("--dataset", default=DEFAULT_DATASET, help="标注集JSONL文件")
+    evaluate_parser.add_argument("--limit", type=int, default=0, help="只评估前N条（0表示全部）")
+    evaluate_parser.add_argument("--routers", nargs="+", default=["decision", "keyword"], help="decision、keyword或module:factory")
+    evaluate_parser.add_argument("--registry", nargs="*", default=None, help="决策Agent使用的注册表配置（可指定多个进行比较）")
+    evaluate_parser.add_argument("--model", choices=["mock", "replay", "live"], default="mock", help="模型来源")
+    evaluate_parser.add_argument("--mock-latency-ms", type=float, default=200, help="模拟模型的调用耗时（毫秒）")
+    evaluate_parser.add_argument("--replay", default=None, help="回放记录文件（--model replay）")
+    evaluate_parser.add_argument("--replay-speed", type=float, default=1.0, help="回放速度倍数")
+    evaluate_parser.add_argument("--record", default=None, help="记录决策输出的文件（--model live）")
+    evaluate_parser.add_argument("--concurrency", type=int, default=1, help="同时进行的决策数")
+    evaluate_parser.add_argument("--json", default=None, help="完整结果（含逐条预测）的输出文件")
+    args = parser.parse_args()
+
+    if args.command == "seed":
+        counts = seed_from_messages(args.db or db_path, args.output, args.per_route, args.limit)
+        print(f"已写入 {sum(counts.values())} 条到 {args.output}: {dict(counts)}")
+        print("标签来自线上决策结果，请人工复核后再用于评估")
+        return
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
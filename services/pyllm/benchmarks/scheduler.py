@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+调度器基准测试：上游满载时心理专家与脱口秀请求的排队延迟（FIFO vs 优先级 + 会话公平排队）
+
+使用离线模拟模型（MockChatModel），专业Agent经过真实的generate()调用路径和调度器，
+其中一个"话痨"会话发送大部分脱口秀请求。
+
+用法（从项目根目录运行）：
+    python -m services.pyllm.benchmarks.scheduler --requests 400 --concurrency 4 --psychology-ratio 0.2
+"""
+import argparse
+import asyncio
+import random
+import time
+from typing import Dict, List
+from ..agents import langchain_agent
+from ..agents.langchain_agent import ProfessionalAgent
+from ..agents.mock_model import MockChatModel
+from ..agents.registry import load_registry
+from ..agents.scheduler import TurnScheduler, current_session_key
+
+async def run_load(mode: str, requests: int, concurrency: int, psychology_ratio: float, latency: float, arrival_rate: float, seed: int) -> Dict[str, List[float]]:
+    """
+    按泊松到达发送混合请求，返回各路由的端到端耗时
+
+    Args:
+        mode: fifo（单一优先级、不区分会话）或priority（按路由优先级 + 会话公平排队）
+        requests: 请求数
+        concurrency: 调度器并发上限（模拟上游容量）
+        psychology_ratio: 心理专家请求占比
+        latency: 模拟模型的调用耗时（秒）
+        arrival_rate: 每秒到达的请求数
+        seed: 随机种子
+
+    Returns:
+        路由到耗时列表（秒）的映射
+    """
+    registry = load_registry()
+    scheduler = TurnScheduler(concurrency=concurrency)
+    if mode == "priority":
+        scheduler.use_registry(registry)
+    langchain_agent.turn_scheduler = scheduler
+    model = MockChatModel(latency=latency, token_delay=0.0, registry=registry)
+    agents = {route: ProfessionalAgent.from_spec(model, registry.by_route[route]) for route in ("心理专家Agent", "脱口秀演员Agent")}
+    rng = random.Random(seed)
+    results: Dict[str, List[float]] = {route: [] for route in agents}
+
+    async def one(route: str, session: str):
+        current_session_key.set("" if mode == "fifo" else session)
+        start = time.monotonic()
+        await agents[route].generate("最近压力好大" if route == "心理专家Agent" else "讲个笑话")
+        results[route].append(time.monotonic() - start)
+
+    tasks = []
+    for i in range(requests):
+        if rng.random() < psychology_ratio:
+            route, session = "心理专家Agent", f"user-{rng.randrange(50)}"
+        else:
+            # 一半的脱口秀请求来自同一个话痨会话
+            route, session = "脱口秀演员Agent", "chatty" if rng.random() < 0.5 else f"user-{rng.randrange(50)}"
+        tasks.append(asyncio.create_task(one(route, session)))
+        await asyncio.sleep(rng.expovariate(arrival_rate))
+    await asyncio.gather(*tasks)
+    return results
+
+def _percentile(values: List[float], q: float) -> float:
+    """
+    计算分位数（毫秒）
+    """
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] * 1000 if values else 0.0
+
+def main():
+    """
+    命令行入口
+    """
+    parser = argparse.ArgumentParser(description="调度器基准测试")
+    parser.add_argument("--requests", type=int, default=400, help="请求数")
+    parser.add_argument("--concurrency", type=int, default=4, help="上游并发上限")
+    parser.add_argument("--psychology-ratio", type=float, default=0.2, help="心理专家请求占比")
+    parser.add_argument("--latency-ms", type=float, default=200, help="模拟模型调用耗时（毫秒）")
+    parser.add_argument("--arrival-rate", type=float, default=0, help="每秒到达请求数，默认为上游容量的1.2倍（过载）")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    args = parser.parse_args()
+
+    latency = args.latency_ms / 1000
+    arrival_rate = args.arrival_rate or args.concurrency / latency * 1.2
+    print(f"上游容量 {args.concurrency / latency:.1f} 请求/秒，到达率 {arrival_rate:.1f} 请求/秒")
+    for mode in ("fifo", "priority"):
+        results = asyncio.run(run_load(mode, args.requests, args.concurrency, args.psychology_ratio, latency, arrival_rate, args.seed))
+        for route, values in results.items():
+            print(f"{mode:>8} | {route:<8} | 请求数 {len(values):>4} | p50 {_percentile(values, 0.5):>8.0f} ms | p95 {_percentile(values, 0.95):>8.0f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+WebSocket帧序列化微基准测试
+
+对比原始写法（json.dumps + os.urandom(8).hex()）与序列化层
+（预编码帧 + 可插拔JSON后端 + 计数器消息ID）在流式输出token增量时的单帧CPU耗时。
+
+用法（从项目根目录运行）：
+    python -m services.pyllm.benchmarks.serialization --frames 200000
+"""
+import argparse
+import json
+import os
+import time
+from ..utils.serialization import backend, encode_assistant_frame, new_message_id
+
+# 典型的token增量（中文短片段、带表情和引号的片段）
+SAMPLE_DELTAS = ["哈哈", "，你", "说的", "这个问题", "其实", "很有意思😄", "“知行合一”", "嘛！", "\n", "我觉得"]
+
+def baseline_frame(content: str, loading: bool) -> str:
+    """
+    原始写法：每帧构建字典，调用json.dumps，并通过系统调用生成ID
+    """
+    return json.dumps({
+        "id": str(os.urandom(8).hex()),
+        "role": "assistant",
+        "content": content,
+        "loading": loading
+    })
+
+def optimized_frame(content: str, loading: bool) -> str:
+    """
+    序列化层写法
+    """
+    return encode_assistant_frame(new_message_id(), content, loading)
+
+def measure(encoder, frames: int) -> float:
+    """
+    测量编码指定帧数的总耗时
+
+    Args:
+        encoder: 帧编码函数
+        frames: 帧数
+
+    Returns:
+        总耗时（秒）
+    """
+    deltas = SAMPLE_DELTAS
+    count = len(deltas)
+    start = time.perf_counter()
+    for i in range(frames):
+        encoder(deltas[i % count], True)
+    return time.perf_counter() - start
+
+def main():
+    """
+    命令行入口
+    """
+    parser = argparse.ArgumentParser(description="WebSocket帧序列化微基准测试")
+    parser.add_argument("--frames", type=int, default=200000, help="编码帧数")
+    args = parser.parse_args()
+
+    # 预热
+    measure(baseline_frame, 1000)
+    measure(optimized_frame, 1000)
+
+    baseline = measure(baseline_frame, args.frames)
+    optimized = measure(optimized_frame, args.frames)
+
+    print(f"JSON后端: {backend}")
+    print(f"原始写法: {baseline / args.frames * 1e6:.2f} µs/帧")
+    print(f"序列化层: {optimized / args.frames * 1e6:.2f} µs/帧")
+    print(f"每帧节省: {(baseline - optimized) / args.frames * 1e6:.2f} µs（{(1 - optimized / baseline) * 100:.1f}%）")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+会话内存占用基准测试：字典列表历史 vs 紧凑历史缓冲区（HistoryBuffer）
+
+每种表示在独立的子进程中建立指定数量的活跃会话（每个会话带若干轮上下文历史），
+报告RSS增量与每1k会话的内存占用。
+
+用法（从项目根目录运行）：
+    python -m services.pyllm.benchmarks.session_memory --sessions 1000 10000 --turns 10 --chars 60
+"""
+import argparse
+import multiprocessing
+import os
+from typing import Dict, List
+from ..api.connection_manager import WSSession
+from .ws_connections import read_rss_kb
+
+def _content(session: int, index: int, chars: int) -> str:
+    """
+    生成每条记录各不相同的内容（模拟真实对话文本）
+    """
+    return (f"{session}-{index}:" + "今天心情有点低落，想找人聊聊" * (chars // 14 + 1))[:chars]
+
+def _build_sessions(mode: str, sessions: int, turns: int, chars: int, result: "multiprocessing.Queue"):
+    """
+    在子进程中建立会话并报告RSS增量
+
+    Args:
+        mode: dict（字典列表历史）或compact（HistoryBuffer）
+        sessions: 会话数
+        turns: 每个会话的历史轮次数
+        chars: 每条记录的字符数
+        result: 结果队列
+    """
+    # 预先生成内容，内容字符串在两种表示中相同，不计入差异
+    contents = [[_content(s, i, chars) for i in range(turns * 2)] for s in range(sessions)]
+    rss_before = read_rss_kb(os.getpid())
+
+    holder: List[WSSession] = []
+    histories: Dict[str, List[Dict[str, str]]] = {}
+    for s in range(sessions):
+        if mode == "compact":
+            session = WSSession(f"{s:016x}", None, 10, turns * 2)
+            for i in range(0, turns * 2, 2):
+                session.history.append_turn(contents[s][i], contents[s][i + 1])
+        else:
+            session = WSSession(f"{s:016x}", None, 10, 0)
+            history = []
+            for i in range(0, turns * 2, 2):
+                history.append({"role": "user", "content": contents[s][i]})
+                history.append({"role": "assistant", "content": contents[s][i + 1]})
+            histories[session.session_id] = history
+        holder.append(session)
+
+    result.put(read_rss_kb(os.getpid()) - rss_before)
+
+def measure(mode: str, sessions: int, turns: int, chars: int) -> int:
+    """
+    在独立子进程中测量一种表示的RSS增量
+
+    Returns:
+        RSS增量（KB）
+    """
+    queue: multiprocessing.Queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_build_sessions, args=(mode, sessions, turns, chars, queue))
+    process.start()
+    delta = queue.get()
+    process.join()
+    return delta
+
+def main():
+    """
+    命令行入口
+    """
+    parser = argparse.ArgumentParser(description="会话内存占用基准测试")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1000, 10000], help="活跃会话数（可指定多个）")
+    parser.add_argument("--turns", type=int, default=10, help="每个会话的历史轮次数")
+    parser.add_argument("--chars", type=int, default=60, help="每条记录的字符数")
+    args = parser.parse_args()
+
+    if not read_rss_kb(os.getpid()):
+        print("无法读取RSS（仅支持Linux）")
+        return
+
+    print(f"每个会话 {args.turns} 轮历史，每条 {args.chars} 字符（内容字符串不计入）")
+    for sessions in args.sessions:
+        for mode in ("dict", "compact"):
+            delta = measure(mode, sessions, args.turns, args.chars)
+            print(f"{mode:>8} | 会话数 {sessions:>6} | RSS增量 {delta:>8} KB | 每1k会话 {delta * 1000 / sessions / 1024:>7.2f} MB | 每会话 {delta * 1024 / sessions:>6.0f} 字节")
+
+if __name__ == "__main__":
+    main()
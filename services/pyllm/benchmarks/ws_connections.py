@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+WebSocket空闲连接内存与最大连接数基准测试
+
+用法（从项目根目录运行）：
+    # 进程内测量：每个空闲会话（会话对象 + 一个等待中的连接任务）的内存占用
+    python -m services.pyllm.benchmarks.ws_connections --connections 10000
+
+    # 实测：对运行中的服务逐步建立空闲连接，统计成功连接数和服务端RSS增量
+    python -m services.pyllm.benchmarks.ws_connections --url ws://localhost:8000/ws/chat \\
+        --connections 5000 --server-pid <uvicorn进程ID> --hold 30
+"""
+import argparse
+import asyncio
+import os
+import time
+import tracemalloc
+from ..api.connection_manager import ConnectionManager, WSSession
+
+class _IdleWebSocket:
+    """
+    进程内测量使用的空闲WebSocket替身
+    """
+    async def accept(self):
+        pass
+
+    async def send_text(self, data: str):
+        pass
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        pass
+
+def read_rss_kb(pid: int) -> int:
+    """
+    读取进程的常驻内存（KB），仅支持Linux
+
+    Args:
+        pid: 进程ID
+
+    Returns:
+        RSS（KB），读取失败时返回0
+    """
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+async def bench_in_process(connections: int):
+    """
+    进程内测量每个空闲会话的内存占用
+
+    Args:
+        connections: 会话数量
+    """
+    manager = ConnectionManager(max_connections=connections)
+    stop = asyncio.Event()
+
+    tracemalloc.start()
+    rss_before = read_rss_kb(os.getpid())
+    snapshot_before = tracemalloc.take_snapshot()
+
+    tasks = []
+    for _ in range(connections):
+        await manager.connect(_IdleWebSocket())
+        # 每个连接在服务端对应一个等待消息的任务
+        tasks.append(asyncio.create_task(stop.wait()))
+    await asyncio.sleep(0)
+
+    snapshot_after = tracemalloc.take_snapshot()
+    rss_after = read_rss_kb(os.getpid())
+    traced = sum(stat.size_diff for stat in snapshot_after.compare_to(snapshot_before, "filename"))
+    tracemalloc.stop()
+
+    print(f"会话数: {manager.stats()['connections']}")
+    print(f"Python堆增量: {traced / 1024:.1f} KB，每连接约 {traced / connections:.0f} 字节")
+    if rss_before and rss_after:
+        print(f"RSS增量: {rss_after - rss_before} KB，每连接约 {(rss_after - rss_before) * 1024 / connections:.0f} 字节")
+    print(f"WSSession.__slots__: {WSSession.__slots__}")
+
+    stop.set()
+    await asyncio.gather(*tasks)
+
+async def bench_live(url: str, connections: int, server_pid: int, hold: float, ramp_batch: int):
+    """
+    对运行中的服务逐步建立空闲连接，统计最大维持连接数和服务端内存
+
+    Args:
+        url: WebSocket地址
+        connections: 目标连接数
+        server_pid: 服务端进程ID（0表示不测量服务端内存）
+        hold: 建立后保持连接的时间（秒）
+        ramp_batch: 每批建立的连接数
+    """
+    import websockets  # 仅实测模式需要
+
+    rss_before = read_rss_kb(server_pid) if server_pid else 0
+    sockets = []
+    failures = 0
+    start = time.monotonic()
+
+    while len(sockets) < connections:
+        batch = min(ramp_batch, connections - len(sockets))
+        results = await asyncio.gather(
+            *[websockets.connect(url, open_timeout=10) for _ in range(batch)],
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                failures += 1
+            else:
+                sockets.append(result)
+        if failures:
+            print(f"建立连接失败 {failures} 个，停止加压")
+            break
+
+    print(f"已维持连接数: {len(sockets)}，耗时 {time.monotonic() - start:.1f}s")
+    await asyncio.sleep(hold)
+
+    alive = sum(1 for ws in sockets if ws.close_code is None)
+    print(f"保持 {hold:.0f}s 后存活连接数: {alive}")
+    if server_pid:
+        rss_after = read_rss_kb(server_pid)
+        delta = rss_after - rss_before
+        print(f"服务端RSS: {rss_before} KB -> {rss_after} KB，每连接约 {delta * 1024 / max(1, len(sockets)):.0f} 字节")
+
+    await asyncio.gather(*[ws.close() for ws in sockets], return_exceptions=True)
+
+def main():
+    """
+    命令行入口
+    """
+    parser = argparse.ArgumentParser(description="WebSocket空闲连接基准测试")
+    parser.add_argument("--connections", type=int, default=10000, help="连接数")
+    parser.add_argument("--url", default="", help="WebSocket地址，留空时进行进程内测量")
+    parser.add_argument("--server-pid", type=int, default=0, help="服务端进程ID，用于读取RSS")
+    parser.add_argument("--hold", type=float, default=30.0, help="保持连接的时间（秒）")
+    parser.add_argument("--ramp-batch", type=int, default=200, help="每批建立的连接数")
+    args = parser.parse_args()
+
+    if args.url:
+        asyncio.run(bench_live(args.url, args.connections, args.server_pid, args.hold, args.ramp_batch))
+    else:
+        asyncio.run(bench_in_process(args.connections))
+
+if __name__ == "__main__":
+    main()
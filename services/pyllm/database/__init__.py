@@ -2,10 +2,17 @@
 """
 数据库模块
 """
-from .db import init_db, save_message, db_path
+from .db import init_db, save_message, db_path, register_save_hook, get_messages_by_ids, query_messages, get_message
+from .repository import MessageRepository, get_repository
 
 __all__ = [
     "init_db",
     "save_message",
-    "db_path"
+    "db_path",
+    "register_save_hook",
+    "get_messages_by_ids",
+    "query_messages",
+    "get_message",
+    "MessageRepository",
+    "get_repository"
 ]
\ No newline at end of file
@@ -4,7 +4,7 @@
 """
 import os
 import sqlite3
-from typing import Optional
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 from ..utils.logger import logger
 
 # 数据库路径设置
@@ -13,6 +13,162 @@ db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "app.
 # 确保数据目录存在
 os.makedirs(os.path.dirname(db_path), exist_ok=True)
 
+# messages表在初始建表之后新增的列（列名 → 列定义）
+MESSAGE_COLUMNS: Dict[str, str] = {
+    "transition": "TEXT NOT NULL DEFAULT ''",  # 过渡语
+    "agent_decision": "TEXT NOT NULL DEFAULT ''",  # 决策结果
+    "user_id": "TEXT NOT NULL DEFAULT ''",  # 用户ID
+    "session_id": "TEXT NOT NULL DEFAULT ''",  # 会话ID
+    "latency_ms": "INTEGER NOT NULL DEFAULT 0",  # 从收到请求到最终回复的耗时（毫秒）
+    "input_tokens": "INTEGER NOT NULL DEFAULT 0",  # 本轮输入token数
+    "output_tokens": "INTEGER NOT NULL DEFAULT 0",  # 本轮输出token数
+    "error": "INTEGER NOT NULL DEFAULT 0",  # 是否出错或走了降级路径
+}
+
+# messages表的列顺序（批量写入和导出时使用）
+MESSAGE_FIELDS = ("prompt", "reply", "transition", "agent_decision", "user_id", "session_id")
+
+# 每轮的指标列（整数，缺失时为0）
+MESSAGE_METRIC_FIELDS = ("latency_ms", "input_tokens", "output_tokens", "error")
+
+# 一条完整对话记录的字段（查询、导出和归档使用）
+MESSAGE_RECORD_FIELDS = ("id",) + MESSAGE_FIELDS + MESSAGE_METRIC_FIELDS + ("created_at",)
+
+# 会话表：每个会话一行，保存消息时更新最后活跃时间和消息数
+SESSIONS_SQL = (
+    "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, user_id TEXT NOT NULL DEFAULT '', "
+    "created_at DATETIME DEFAULT CURRENT_TIMESTAMP, last_active_at DATETIME DEFAULT CURRENT_TIMESTAMP, "
+    "message_count INTEGER NOT NULL DEFAULT 0)"
+)
+SESSION_UPSERT_SQL = (
+    "INSERT INTO sessions (id, user_id, message_count) VALUES (?, ?, 1) "
+    "ON CONFLICT(id) DO UPDATE SET last_active_at = CURRENT_TIMESTAMP, message_count = message_count + 1"
+)
+
+# messages表的索引：按用户、按决策结果的游标分页都走(过滤列, id)联合索引
+MESSAGE_INDEXES: Dict[str, str] = {
+    "idx_messages_user_id": "messages(user_id, id)",
+    "idx_messages_agent_decision": "messages(agent_decision, id)",
+    "idx_messages_session_id": "messages(session_id, id)",
+    "idx_sessions_user_id": "sessions(user_id, last_active_at)",
+}
+
+# 全文检索：trigram分词器按3字符滑窗切分，不依赖空格分词，适用于中文；由触发器与messages表保持同步
+MESSAGES_FTS_SQL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5("
+    "prompt, reply, content='messages', content_rowid='id', tokenize='trigram')"
+)
+MESSAGES_FTS_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN "
+    "INSERT INTO messages_fts(rowid, prompt, reply) VALUES (new.id, new.prompt, new.reply); END",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN "
+    "INSERT INTO messages_fts(messages_fts, rowid, prompt, reply) VALUES ('delete', old.id, old.prompt, old.reply); END",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE OF prompt, reply ON messages BEGIN "
+    "INSERT INTO messages_fts(messages_fts, rowid, prompt, reply) VALUES ('delete', old.id, old.prompt, old.reply); "
+    "INSERT INTO messages_fts(rowid, prompt, reply) VALUES (new.id, new.prompt, new.reply); END",
+]
+
+# 按天、按决策结果的用量汇总表，由插入触发器在写入时增量维护，统计接口只读取汇总表
+USAGE_DAILY_SQL = (
+    "CREATE TABLE IF NOT EXISTS usage_daily (day TEXT NOT NULL, agent_decision TEXT NOT NULL, "
+    "turns INTEGER NOT NULL DEFAULT 0, errors INTEGER NOT NULL DEFAULT 0, reply_chars INTEGER NOT NULL DEFAULT 0, "
+    "timed_turns INTEGER NOT NULL DEFAULT 0, latency_ms INTEGER NOT NULL DEFAULT 0, "
+    "input_tokens INTEGER NOT NULL DEFAULT 0, output_tokens INTEGER NOT NULL DEFAULT 0, "
+    "PRIMARY KEY (day, agent_decision))"
+)
+USAGE_DAILY_TRIGGER = (
+    "CREATE TRIGGER IF NOT EXISTS usage_daily_ai AFTER INSERT ON messages BEGIN "
+    "INSERT INTO usage_daily (day, agent_decision, turns, errors, reply_chars, timed_turns, latency_ms, input_tokens, output_tokens) "
+    "VALUES (date(new.created_at), new.agent_decision, 1, new.error != 0, length(new.reply), new.latency_ms > 0, "
+    "new.latency_ms, new.input_tokens, new.output_tokens) "
+    "ON CONFLICT(day, agent_decision) DO UPDATE SET turns = turns + 1, errors = errors + excluded.errors, "
+    "reply_chars = reply_chars + excluded.reply_chars, timed_turns = timed_turns + excluded.timed_turns, "
+    "latency_ms = latency_ms + excluded.latency_ms, input_tokens = input_tokens + excluded.input_tokens, "
+    "output_tokens = output_tokens + excluded.output_tokens; END"
+)
+# 首次创建汇总表时用已有记录回填
+USAGE_DAILY_BACKFILL_SQL = (
+    "INSERT INTO usage_daily (day, agent_decision, turns, errors, reply_chars, timed_turns, latency_ms, input_tokens, output_tokens) "
+    "SELECT date(created_at), agent_decision, COUNT(*), SUM(error != 0), SUM(length(reply)), SUM(latency_ms > 0), "
+    "SUM(latency_ms), SUM(input_tokens), SUM(output_tokens) FROM messages GROUP BY date(created_at), agent_decision"
+)
+
+# trigram分词器能匹配的最短查询长度，更短的查询（如两个字的中文词）回退到LIKE扫描
+FTS_MIN_QUERY_LENGTH = 3
+
+# LIKE回退每页最多扫描的ID范围：从游标向前按主键倒序扫描，扫完该范围仍不满一页时提前返回，
+# 游标指向范围下界，客户端继续翻页即可接着向前扫描，单页耗时不随历史总量增长
+LIKE_SCAN_ROWS = int(os.getenv("SOULBIT_SEARCH_SCAN_ROWS", "20000"))
+
+# 当前SQLite是否支持FTS5 trigram分词器（在init_db中检测）
+fts_available = False
+
+# 保存对话记录后的回调（如长期记忆的增量索引），参数为(记录ID, 用户ID, 提示词, 回复)
+_save_hooks: List[Callable[[int, str, str, str], None]] = []
+
+def register_save_hook(hook: Callable[[int, str, str, str], None]):
+    """
+    注册保存对话记录后的回调
+    
+    Args:
+        hook: 回调函数，参数为(记录ID, 用户ID, 提示词, 回复)
+    """
+    _save_hooks.append(hook)
+
+def run_save_hooks(message_id: int, user_id: str, prompt: str, reply: str):
+    """
+    执行保存对话记录后的回调，回调失败不影响保存结果（各存储后端保存后调用）
+    
+    Args:
+        message_id: 记录ID
+        user_id: 用户ID
+        prompt: 用户输入
+        reply: 回复
+    """
+    for hook in _save_hooks:
+        try:
+            hook(message_id, user_id, prompt, reply)
+        except Exception as e:
+            logger.error(f"保存对话记录后的回调执行失败: {str(e)}")
+
+def _ensure_columns(conn: sqlite3.Connection, table: str, columns: Dict[str, str]):
+    """
+    为已有的表补齐缺失的列（简易迁移）
+    
+    Args:
+        conn: 数据库连接
+        table: 表名
+        columns: 列名到列定义的映射
+    """
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    for name, definition in columns.items():
+        if name not in existing:
+            logger.info(f"为{table}表添加列: {name}")
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+
+def _ensure_fts(conn: sqlite3.Connection) -> bool:
+    """
+    创建全文检索虚拟表和同步触发器，首次创建时用已有数据重建索引
+    
+    Args:
+        conn: 数据库连接
+    
+    Returns:
+        是否支持全文检索（SQLite未编译FTS5或版本低于3.34不支持trigram时返回False）
+    """
+    existed = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'messages_fts'").fetchone() is not None
+    try:
+        conn.execute(MESSAGES_FTS_SQL)
+    except sqlite3.OperationalError as e:
+        logger.warning(f"SQLite不支持FTS5 trigram分词器，历史搜索回退到LIKE: {str(e)}")
+        return False
+    for trigger_sql in MESSAGES_FTS_TRIGGERS:
+        conn.execute(trigger_sql)
+    if not existed:
+        logger.info("首次创建全文检索索引，使用已有对话记录重建")
+        conn.execute("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')")
+    return True
+
 def init_db():
     """
     初始化SQLite数据库，创建messages表（如果不存在）
@@ -28,6 +184,17 @@ def init_db():
         create_table_sql = "CREATE TABLE IF NOT EXISTS messages (id INTEGER PRIMARY KEY AUTOINCREMENT, prompt TEXT NOT NULL, reply TEXT NOT NULL, created_at DATETIME DEFAULT CURRENT_TIMESTAMP)"
         logger.info(f"执行创建表SQL: {create_table_sql}")
         c.execute(create_table_sql)
+        _ensure_columns(conn, "messages", MESSAGE_COLUMNS)
+        c.execute(SESSIONS_SQL)
+        for index_name, target in MESSAGE_INDEXES.items():
+            c.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {target}")
+        global fts_available
+        fts_available = _ensure_fts(conn)
+        usage_existed = c.execute("SELECT 1 FROM sqlite_master WHERE name = 'usage_daily'").fetchone() is not None
+        c.execute(USAGE_DAILY_SQL)
+        c.execute(USAGE_DAILY_TRIGGER)
+        if not usage_existed:
+            c.execute(USAGE_DAILY_BACKFILL_SQL)
         
         conn.commit()  # 提交事务
         logger.info("数据库表创建成功")
@@ -38,13 +205,42 @@ def init_db():
         logger.error(f"数据库初始化失败: {str(e)}")
         raise
 
-def save_message(prompt: str, reply: str) -> Optional[int]:
+def ping():
+    """
+    检查数据库是否可用（打开数据库文件并读取messages表），不可用时抛出异常
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("SELECT 1 FROM messages LIMIT 1").fetchone()
+    finally:
+        conn.close()
+
+def save_message(
+    prompt: str,
+    reply: str,
+    transition: str = "",
+    agent_decision: str = "",
+    user_id: str = "",
+    session_id: str = "",
+    latency_ms: int = 0,
+    input_tokens: int = 0,
+    output_tokens: int = 0,
+    error: bool = False,
+) -> Optional[int]:
     """
     保存对话记录到数据库
     
     Args:
         prompt: 用户输入的提示词
         reply: LLM的回复内容
+        transition: 过渡语（仅咨询朋友时有）
+        agent_decision: 决策结果
+        user_id: 用户ID
+        session_id: 会话ID（非空时同时更新sessions表）
+        latency_ms: 从收到请求到最终回复的耗时（毫秒）
+        input_tokens: 本轮输入token数
+        output_tokens: 本轮输出token数
+        error: 是否出错或走了降级路径
     
     Returns:
         保存的记录ID，如果保存失败则返回None
@@ -53,15 +249,347 @@ def save_message(prompt: str, reply: str) -> Optional[int]:
     try:
         conn = sqlite3.connect(db_path)
         c = conn.cursor()
-        c.execute("INSERT INTO messages (prompt, reply) VALUES (?, ?)", (prompt, reply))
+        c.execute(
+            "INSERT INTO messages (prompt, reply, transition, agent_decision, user_id, session_id, latency_ms, input_tokens, output_tokens, error) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (prompt, reply, transition, agent_decision, user_id, session_id, latency_ms, input_tokens, output_tokens, int(error))
+        )
+        if session_id:
+            c.execute(SESSION_UPSERT_SQL, (session_id, user_id))
         conn.commit()
         message_id = c.lastrowid
         conn.close()
         logger.info(f"对话记录保存成功，ID: {message_id}")
-        return message_id
     except Exception as e:
         logger.error(f"保存对话记录失败: {str(e)}")
         return None
+    
+    run_save_hooks(message_id, user_id, prompt, reply)
+    return message_id
+
+def save_messages_bulk(rows: List[Tuple[str, ...]]) -> int:
+    """
+    在一个事务中批量写入对话记录（不执行保存后的回调）
+    
+    Args:
+        rows: 记录元组列表，字段顺序与MESSAGE_FIELDS一致
+    
+    Returns:
+        写入的记录数
+    """
+    if not rows:
+        return 0
+    placeholders = ", ".join("?" * len(MESSAGE_FIELDS))
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            conn.executemany(f"INSERT INTO messages ({', '.join(MESSAGE_FIELDS)}) VALUES ({placeholders})", rows)
+    finally:
+        conn.close()
+    logger.info(f"批量写入对话记录 {len(rows)} 条")
+    return len(rows)
+
+def _export_conditions(
+    since: Optional[str],
+    until: Optional[str],
+    user_id: Optional[str],
+    session_id: Optional[str],
+) -> Tuple[List[str], List[Any]]:
+    """
+    构建导出查询的过滤条件
+
+    Args:
+        since: 起始时间（包含），格式与created_at一致，如2025-01-01或2025-01-01 08:00:00
+        until: 截止时间（不包含）
+        user_id: 按用户过滤
+        session_id: 按会话过滤
+
+    Returns:
+        (条件列表, 参数列表)
+    """
+    conditions: List[str] = []
+    params: List[Any] = []
+    if since:
+        conditions.append("created_at >= ?")
+        params.append(since)
+    if until:
+        conditions.append("created_at < ?")
+        params.append(until)
+    if user_id is not None:
+        conditions.append("user_id = ?")
+        params.append(user_id)
+    if session_id is not None:
+        conditions.append("session_id = ?")
+        params.append(session_id)
+    return conditions, params
+
+def fetch_messages_after(
+    after_id: int,
+    limit: int,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    user_id: Optional[str] = None,
+    session_id: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    按ID升序读取一批对话记录（导出用，每批是独立的短查询，不会长时间持有读锁）
+
+    Args:
+        after_id: 只返回ID大于该值的记录
+        limit: 本批最多条数
+        since: 起始时间（包含）
+        until: 截止时间（不包含）
+        user_id: 按用户过滤
+        session_id: 按会话过滤
+
+    Returns:
+        记录列表，按ID升序
+    """
+    conditions, params = _export_conditions(since, until, user_id, session_id)
+    conditions.insert(0, "id > ?")
+    params.insert(0, after_id)
+    params.append(limit)
+    fields = MESSAGE_RECORD_FIELDS
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute(
+            f"SELECT {', '.join(fields)} FROM messages WHERE {' AND '.join(conditions)} ORDER BY id LIMIT ?",
+            params,
+        ).fetchall()
+    finally:
+        conn.close()
+    return [dict(zip(fields, row)) for row in rows]
+
+def import_messages(rows: Iterable[Dict[str, Any]], batch_size: int = 1000) -> int:
+    """
+    在一个事务中分批导入对话记录（每批一次executemany），任一批失败时整体回滚
+
+    记录使用新的自增ID，保留原有的created_at（缺失时使用当前时间），不执行保存后的回调。
+
+    Args:
+        rows: 记录字典的可迭代对象（字段见MESSAGE_RECORD_FIELDS，忽略id）
+        batch_size: 每批条数
+
+    Returns:
+        导入的记录数
+    """
+    fields = MESSAGE_FIELDS + MESSAGE_METRIC_FIELDS + ("created_at",)
+    sql = (
+        f"INSERT INTO messages ({', '.join(fields)}) "
+        f"VALUES ({', '.join('?' * (len(fields) - 1))}, COALESCE(?, CURRENT_TIMESTAMP))"
+    )
+    total = 0
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            batch: List[Tuple[Any, ...]] = []
+            for row in rows:
+                batch.append(
+                    tuple(row.get(field) or "" for field in MESSAGE_FIELDS)
+                    + tuple(int(row.get(field) or 0) for field in MESSAGE_METRIC_FIELDS)
+                    + (row.get("created_at") or None,)
+                )
+                if len(batch) >= batch_size:
+                    conn.executemany(sql, batch)
+                    total += len(batch)
+                    batch.clear()
+            if batch:
+                conn.executemany(sql, batch)
+                total += len(batch)
+    finally:
+        conn.close()
+    logger.info(f"导入对话记录 {total} 条")
+    return total
+
+def get_messages_by_ids(message_ids: List[int]) -> Dict[int, Dict[str, str]]:
+    """
+    按ID批量查询对话记录
+    
+    Args:
+        message_ids: 记录ID列表
+    
+    Returns:
+        记录ID到{"prompt","reply","created_at"}的映射
+    """
+    if not message_ids:
+        return {}
+    placeholders = ",".join("?" * len(message_ids))
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute(
+            f"SELECT id, prompt, reply, created_at FROM messages WHERE id IN ({placeholders})",
+            list(message_ids)
+        ).fetchall()
+    finally:
+        conn.close()
+    return {row[0]: {"prompt": row[1], "reply": row[2], "created_at": row[3]} for row in rows}
+
+def query_messages(
+    limit: int = 20,
+    before_id: Optional[int] = None,
+    user_id: Optional[str] = None,
+    agent_decision: Optional[str] = None,
+    q: Optional[str] = None,
+    session_id: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """
+    按ID倒序分页查询对话记录（游标分页，不使用OFFSET）
+    
+    每页通过"id < 上一页最后一条的id"定位，配合主键或(过滤列, id)联合索引，
+    任意页的查询代价都只与页大小相关。
+    
+    Args:
+        limit: 每页条数
+        before_id: 游标，只返回ID小于该值的记录；为None时从最新记录开始
+        user_id: 按用户过滤
+        agent_decision: 按决策结果过滤
+        q: 搜索关键词，匹配提示词或回复（3个字符及以上走全文检索，更短的回退到LIKE）
+        session_id: 按会话过滤
+    
+    全文检索按FTS的rowid倒序翻页，游标条件下推到全文索引，不需要对全部命中结果排序；
+    LIKE回退每页最多扫描LIKE_SCAN_ROWS范围内的记录，命中稀少时返回的页可能不满（甚至为空），
+    但只要游标不为None就还有更早的记录可以继续扫描。
+    
+    Returns:
+        (记录列表, 下一页游标)，没有更多记录时游标为None
+    """
+    conditions = []
+    params: List[Any] = []
+    table = "messages m"
+    id_column = "m.id"
+    like_scan = bool(q) and not (fts_available and len(q) >= FTS_MIN_QUERY_LENGTH)
+    if q and not like_scan:
+        # 整个关键词作为一个短语查询，双引号转义后不会被解析为FTS5查询语法
+        table = "messages_fts f JOIN messages m ON m.id = f.rowid"
+        id_column = "f.rowid"
+        conditions.append("messages_fts MATCH ?")
+        params.append('"' + q.replace('"', '""') + '"')
+    elif q:
+        pattern = "%" + q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        conditions.append("(m.prompt LIKE ? ESCAPE '\\' OR m.reply LIKE ? ESCAPE '\\')")
+        params.extend([pattern, pattern])
+    if user_id is not None:
+        conditions.append("m.user_id = ?")
+        params.append(user_id)
+    if agent_decision is not None:
+        conditions.append("m.agent_decision = ?")
+        params.append(agent_decision)
+    if session_id is not None:
+        conditions.append("m.session_id = ?")
+        params.append(session_id)
+    if before_id is not None:
+        conditions.append(f"{id_column} < ?")
+        params.append(before_id)
+    
+    conn = sqlite3.connect(db_path)
+    try:
+        scan_floor = None
+        if like_scan:
+            # 限定本页扫描的ID范围[scan_floor, before_id)
+            upper = before_id if before_id is not None else (conn.execute("SELECT MAX(id) FROM messages").fetchone()[0] or 0) + 1
+            scan_floor = upper - LIKE_SCAN_ROWS
+            conditions.append("m.id >= ?")
+            params.append(scan_floor)
+        
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        sql = (
+            f"SELECT {', '.join('m.' + field for field in MESSAGE_RECORD_FIELDS)} FROM {table}"
+            f"{where} ORDER BY {id_column} DESC LIMIT ?"
+        )
+        params.append(limit + 1)  # 多取一条用于判断是否还有下一页
+        rows = conn.execute(sql, params).fetchall()
+        
+        items = [dict(zip(MESSAGE_RECORD_FIELDS, row)) for row in rows[:limit]]
+        next_cursor = items[-1]["id"] if len(rows) > limit else None
+        if next_cursor is None and scan_floor is not None:
+            # 扫描范围内的命中不满一页，范围之前还有记录时从范围下界继续
+            if conn.execute("SELECT 1 FROM messages WHERE id < ? LIMIT 1", (scan_floor,)).fetchone():
+                next_cursor = scan_floor
+    finally:
+        conn.close()
+    return items, next_cursor
+
+def get_message(message_id: int) -> Optional[Dict[str, Any]]:
+    """
+    按ID查询单条对话记录
+    
+    Args:
+        message_id: 记录ID
+    
+    Returns:
+        对话记录，不存在时返回None
+    """
+    items, _ = query_messages(limit=1, before_id=message_id + 1)
+    return items[0] if items and items[0]["id"] == message_id else None
+
+def list_sessions(user_id: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+    """
+    查询最近活跃的会话
+    
+    Args:
+        user_id: 按用户过滤
+        limit: 最多返回条数
+    
+    Returns:
+        会话列表，按最后活跃时间倒序
+    """
+    sql = "SELECT id, user_id, created_at, last_active_at, message_count FROM sessions"
+    params: List[Any] = []
+    if user_id is not None:
+        sql += " WHERE user_id = ?"
+        params.append(user_id)
+    sql += " ORDER BY last_active_at DESC LIMIT ?"
+    params.append(limit)
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+    return [
+        {"id": row[0], "user_id": row[1], "created_at": row[2], "last_active_at": row[3], "message_count": row[4]}
+        for row in rows
+    ]
+
+def usage_daily(days: int = 30) -> List[Dict[str, Any]]:
+    """
+    读取最近若干天的用量汇总（只读汇总表，耗时与历史总量无关）
+    
+    Args:
+        days: 天数（含今天，按UTC日期）
+    
+    Returns:
+        汇总行列表，按日期升序
+    """
+    fields = ("day", "agent_decision", "turns", "errors", "reply_chars", "timed_turns", "latency_ms", "input_tokens", "output_tokens")
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute(
+            f"SELECT {', '.join(fields)} FROM usage_daily WHERE day >= date('now', ?) ORDER BY day",
+            (f"-{max(days - 1, 0)} days",),
+        ).fetchall()
+    finally:
+        conn.close()
+    return [dict(zip(fields, row)) for row in rows]
+
+def recent_transitions(limit: int = 5000) -> List[Tuple[str, str, str]]:
+    """
+    查询最近使用过过渡语的对话记录
+    
+    Args:
+        limit: 最多读取的最近记录数
+    
+    Returns:
+        [(用户输入, 过渡语, 决策结果)]
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(
+            "SELECT prompt, transition, agent_decision FROM messages "
+            "WHERE transition != '' AND agent_decision != '' ORDER BY id DESC LIMIT ?",
+            (limit,),
+        ).fetchall()
+    finally:
+        conn.close()
 
 # 执行数据库初始化
 logger.info("准备执行数据库初始化")
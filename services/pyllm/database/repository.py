@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+存储仓库接口模块
+
+业务代码只依赖MessageRepository接口，具体存储后端通过环境变量SOULBIT_DB_BACKEND选择：
+- sqlite（默认）：本地SQLite文件，见sqlite_repository.py
+- postgres：asyncpg连接池，见postgres_repository.py
+"""
+import os
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+from ..utils.logger import logger
+
+class MessageRepository(ABC):
+    """
+    对话记录与会话的存储仓库接口
+    """
+    @abstractmethod
+    async def init(self):
+        """
+        初始化存储（建表、建索引、建立连接池）
+        """
+
+    @abstractmethod
+    async def close(self):
+        """
+        释放存储资源
+        """
+
+    @abstractmethod
+    async def ping(self):
+        """
+        检查存储后端是否可用（执行一次最简单的查询），不可用时抛出异常
+        """
+
+    @abstractmethod
+    async def save_message(
+        self,
+        prompt: str,
+        reply: str,
+        transition: str = "",
+        agent_decision: str = "",
+        user_id: str = "",
+        session_id: str = "",
+        latency_ms: int = 0,
+        input_tokens: int = 0,
+        output_tokens: int = 0,
+        error: bool = False,
+    ) -> Optional[int]:
+        """
+        保存一条对话记录（会话ID非空时同时更新会话，用量汇总由写入时的触发器更新），保存后执行保存回调
+
+        Args:
+            prompt: 用户输入
+            reply: 回复
+            transition: 过渡语
+            agent_decision: 决策结果
+            user_id: 用户ID
+            session_id: 会话ID
+            latency_ms: 从收到请求到最终回复的耗时（毫秒）
+            input_tokens: 本轮输入token数
+            output_tokens: 本轮输出token数
+            error: 是否出错或走了降级路径
+
+        Returns:
+            记录ID，保存失败时返回None
+        """
+
+    @abstractmethod
+    async def save_messages_bulk(self, rows: List[Tuple[str, ...]]) -> int:
+        """
+        批量写入对话记录（字段顺序与MESSAGE_FIELDS一致，不执行保存回调）
+
+        Args:
+            rows: 记录元组列表
+
+        Returns:
+            写入的记录数
+        """
+
+    @abstractmethod
+    async def import_messages(self, rows: Iterable[Dict[str, Any]], batch_size: int = 1000) -> int:
+        """
+        在一个事务中分批导入对话记录（使用新的ID，保留created_at，不执行保存回调）
+
+        Args:
+            rows: 记录字典的可迭代对象
+            batch_size: 每批条数
+
+        Returns:
+            导入的记录数
+        """
+
+    @abstractmethod
+    def iter_messages(
+        self,
+        batch_size: int = 1000,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        user_id: Optional[str] = None,
+        session_id: Optional[str] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        按ID升序流式读取对话记录（导出用，内存占用与总量无关）
+
+        Args:
+            batch_size: 每批读取条数
+            since: 起始时间（包含）
+            until: 截止时间（不包含）
+            user_id: 按用户过滤
+            session_id: 按会话过滤
+
+        Yields:
+            记录字典
+        """
+
+    @abstractmethod
+    async def query_messages(
+        self,
+        limit: int = 20,
+        before_id: Optional[int] = None,
+        user_id: Optional[str] = None,
+        agent_decision: Optional[str] = None,
+        q: Optional[str] = None,
+        session_id: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        按ID倒序游标分页查询对话记录
+
+        Returns:
+            (记录列表, 下一页游标)
+        """
+
+    @abstractmethod
+    async def get_message(self, message_id: int) -> Optional[Dict[str, Any]]:
+        """
+        按ID查询单条对话记录
+        """
+
+    @abstractmethod
+    async def get_messages_by_ids(self, message_ids: List[int]) -> Dict[int, Dict[str, str]]:
+        """
+        按ID批量查询对话记录
+
+        Returns:
+            记录ID到{"prompt","reply","created_at"}的映射
+        """
+
+    @abstractmethod
+    async def list_sessions(self, user_id: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        查询最近活跃的会话
+        """
+
+    @abstractmethod
+    async def usage_daily(self, days: int = 30) -> List[Dict[str, Any]]:
+        """
+        读取最近若干天按天、按决策结果的用量汇总（只读汇总表）
+
+        Args:
+            days: 天数（含今天）
+
+        Returns:
+            汇总行列表（day、agent_decision、turns、errors、reply_chars、timed_turns、latency_ms、input_tokens、output_tokens）
+        """
+
+    @abstractmethod
+    async def recent_transitions(self, limit: int = 5000) -> List[Tuple[str, str, str]]:
+        """
+        查询最近使用过过渡语的对话记录
+
+        Returns:
+            [(用户输入, 过渡语, 决策结果)]
+        """
+
+# 全局存储仓库实例（首次使用时按配置创建）
+_repository: Optional[MessageRepository] = None
+
+def get_repository() -> MessageRepository:
+    """
+    获取全局存储仓库
+
+    Returns:
+        按SOULBIT_DB_BACKEND创建的存储仓库实例
+    """
+    global _repository
+    if _repository is None:
+        backend = os.getenv("SOULBIT_DB_BACKEND", "sqlite").lower()
+        if backend == "postgres":
+            from .postgres_repository import PostgresRepository
+            _repository = PostgresRepository(
+                os.getenv("SOULBIT_DATABASE_URL", "postgresql://localhost/soulbit"),
+                min_size=int(os.getenv("SOULBIT_PG_POOL_MIN", "2")),
+                max_size=int(os.getenv("SOULBIT_PG_POOL_MAX", "10")),
+            )
+        else:
+            if backend != "sqlite":
+                logger.warning(f"未知的存储后端: {backend}，使用SQLite")
+            from .sqlite_repository import SQLiteRepository
+            _repository = SQLiteRepository()
+        logger.info(f"存储后端: {type(_repository).__name__}")
+    return _repository
@@ -0,0 +1,429 @@
+# -*- coding: utf-8 -*-
+"""
+对话记录保留与冷归档模块
+
+超过保留天数的对话记录按月份写入压缩归档分段（zstd压缩的NDJSON，未安装zstandard时使用gzip），
+随后从SQLite的messages表中分批删除。归档分段写入后不再修改，由清单文件manifest.json登记，
+历史接口在热数据不足一页时继续从归档中按同样的游标规则读取。
+
+每次归档先写分段、再原子替换清单、最后分批删除热数据，任一步中断后重新运行都不会丢失或重复记录。
+"""
+import asyncio
+import gzip
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from ..utils.logger import logger
+from . import db
+from .db import MESSAGE_RECORD_FIELDS
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 归档记录的字段
+ARCHIVE_FIELDS = MESSAGE_RECORD_FIELDS
+
+def _compress(data: bytes) -> Tuple[bytes, str]:
+    """
+    压缩归档数据
+
+    Args:
+        data: 原始数据
+
+    Returns:
+        (压缩后的数据, 压缩格式)
+    """
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=10).compress(data), "zstd"
+    return gzip.compress(data, compresslevel=9), "gzip"
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    """
+    解压归档数据
+
+    Args:
+        data: 压缩数据
+        codec: 压缩格式
+
+    Returns:
+        原始数据
+    """
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("归档分段使用zstd压缩，但未安装zstandard库")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+class MessageArchive:
+    """
+    按月分段的压缩归档（只追加分段，清单文件原子替换）
+    """
+    def __init__(self, root: str, cache_segments: int = 8):
+        """
+        初始化归档
+
+        Args:
+            root: 归档目录
+            cache_segments: 缓存的已解压分段数
+        """
+        self.root = root
+        self.manifest_path = os.path.join(root, "manifest.json")
+        self.cache_segments = cache_segments
+        self._cache: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self) -> Dict[str, Any]:
+        """
+        读取清单文件
+
+        Returns:
+            清单，包含segments（分段列表）和max_id（已归档的最大记录ID）
+        """
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"segments": [], "max_id": 0}
+
+    def _save_manifest(self):
+        """
+        原子替换清单文件
+        """
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+
+    @property
+    def max_id(self) -> int:
+        """
+        已归档的最大记录ID
+        """
+        return self.manifest["max_id"]
+
+    def has_segments(self) -> bool:
+        """
+        是否存在归档分段
+        """
+        return bool(self.manifest["segments"])
+
+    def write_segments(self, rows: List[Dict[str, Any]]):
+        """
+        将一批记录按月份写入新的归档分段并登记到清单
+
+        Args:
+            rows: 按ID升序排列的记录（ID均大于max_id）
+        """
+        by_month: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            by_month.setdefault(str(row["created_at"])[:7], []).append(row)
+
+        os.makedirs(self.root, exist_ok=True)
+        for month, month_rows in by_month.items():
+            payload = "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in month_rows).encode("utf-8")
+            compressed, codec = _compress(payload)
+            name = f"messages-{month}-{month_rows[0]['id']}-{month_rows[-1]['id']}.ndjson.{'zst' if codec == 'zstd' else 'gz'}"
+            tmp_path = os.path.join(self.root, name + ".tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(compressed)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, os.path.join(self.root, name))
+            self.manifest["segments"].append({
+                "file": name,
+                "month": month,
+                "codec": codec,
+                "min_id": month_rows[0]["id"],
+                "max_id": month_rows[-1]["id"],
+                "count": len(month_rows),
+                "bytes": len(compressed),
+                "raw_bytes": len(payload),
+            })
+            logger.info(f"写入归档分段 {name}: {len(month_rows)} 条，压缩后 {len(compressed)} 字节（原始 {len(payload)} 字节）")
+
+        self.manifest["max_id"] = max(self.manifest["max_id"], rows[-1]["id"])
+        self._save_manifest()
+
+    def segments(self) -> List[Dict[str, Any]]:
+        """
+        获取按ID升序排列的分段列表
+        """
+        return sorted(self.manifest["segments"], key=lambda s: s["min_id"])
+
+    def read_segment(self, segment: Dict[str, Any], cache: bool = True) -> List[Dict[str, Any]]:
+        """
+        读取分段中的全部记录（带LRU缓存，分段不可变）
+
+        Args:
+            segment: 清单中的分段信息
+            cache: 是否放入缓存（一次性的全量导出不需要缓存）
+
+        Returns:
+            按ID升序的记录列表
+        """
+        name = segment["file"]
+        rows = self._cache.get(name)
+        if rows is not None:
+            self._cache.move_to_end(name)
+            return rows
+        with open(os.path.join(self.root, name), "rb") as f:
+            data = _decompress(f.read(), segment["codec"])
+        rows = [json.loads(line) for line in data.decode("utf-8").splitlines() if line]
+        if not cache:
+            return rows
+        self._cache[name] = rows
+        if len(self._cache) > self.cache_segments:
+            self._cache.popitem(last=False)
+        return rows
+
+    def query(
+        self,
+        limit: int = 20,
+        before_id: Optional[int] = None,
+        user_id: Optional[str] = None,
+        agent_decision: Optional[str] = None,
+        q: Optional[str] = None,
+        session_id: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        按ID倒序查询归档记录，参数与游标规则与db.query_messages一致
+
+        按分段的ID范围跳过不相关的分段，只解压可能包含结果的分段。
+
+        Returns:
+            (记录列表, 下一页游标)
+        """
+        needle = q.casefold() if q else None
+        items: List[Dict[str, Any]] = []
+        for segment in sorted(self.manifest["segments"], key=lambda s: s["max_id"], reverse=True):
+            if before_id is not None and segment["min_id"] >= before_id:
+                continue
+            for row in reversed(self.read_segment(segment)):
+                if before_id is not None and row["id"] >= before_id:
+                    continue
+                if user_id is not None and row["user_id"] != user_id:
+                    continue
+                if agent_decision is not None and row["agent_decision"] != agent_decision:
+                    continue
+                if session_id is not None and row["session_id"] != session_id:
+                    continue
+                if needle and needle not in row["prompt"].casefold() and needle not in row["reply"].casefold():
+                    continue
+                items.append(row)
+                if len(items) > limit:
+                    return items[:limit], (items[limit - 1]["id"] if limit else before_id)
+        return items, None
+
+    def get(self, message_id: int) -> Optional[Dict[str, Any]]:
+        """
+        按ID查询单条归档记录
+
+        Args:
+            message_id: 记录ID
+
+        Returns:
+            记录，不存在时返回None
+        """
+        for segment in self.manifest["segments"]:
+            if segment["min_id"] <= message_id <= segment["max_id"]:
+                for row in self.read_segment(segment):
+                    if row["id"] == message_id:
+                        return row
+        return None
+
+    def get_many(self, message_ids: List[int]) -> Dict[int, Dict[str, str]]:
+        """
+        按ID批量查询归档记录（每个相关分段只读取一次），返回格式与db.get_messages_by_ids一致
+
+        Args:
+            message_ids: 记录ID列表
+
+        Returns:
+            记录ID到{"prompt","reply","created_at"}的映射，不存在的ID不包含在结果中
+        """
+        wanted = {message_id for message_id in message_ids if message_id <= self.max_id}
+        found: Dict[int, Dict[str, str]] = {}
+        for segment in self.manifest["segments"]:
+            if not any(segment["min_id"] <= message_id <= segment["max_id"] for message_id in wanted):
+                continue
+            for row in self.read_segment(segment):
+                if row["id"] in wanted:
+                    found[row["id"]] = {"prompt": row["prompt"], "reply": row["reply"], "created_at": row["created_at"]}
+        return found
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取归档统计
+
+        Returns:
+            包含分段数、记录数、压缩前后字节数和已归档最大ID的字典
+        """
+        segments = self.manifest["segments"]
+        return {
+            "segments": len(segments),
+            "rows": sum(s["count"] for s in segments),
+            "bytes": sum(s["bytes"] for s in segments),
+            "raw_bytes": sum(s["raw_bytes"] for s in segments),
+            "max_id": self.max_id,
+        }
+
+class RetentionManager:
+    """
+    后台保留任务：分批把过期记录从SQLite移入归档
+
+    读取和删除都按批进行，每批是一个短事务，批之间让出写锁，不会长时间阻塞对话记录的写入。
+    """
+    def __init__(self, archive: MessageArchive, retention_days: int, batch_size: int = 500, max_rows_per_run: int = 20000, interval: float = 3600.0, pause: float = 0.05):
+        """
+        初始化保留任务
+
+        Args:
+            archive: 归档
+            retention_days: 保留天数，超过的记录会被归档；为0时不启用
+            batch_size: 每批读取和删除的记录数
+            max_rows_per_run: 每轮最多归档的记录数
+            interval: 两轮之间的间隔（秒）
+            pause: 批之间的停顿（秒）
+        """
+        self.archive = archive
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self.max_rows_per_run = max_rows_per_run
+        self.interval = interval
+        self.pause = pause
+        self.last_run: Dict[str, Any] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        """
+        是否启用保留任务
+        """
+        return self.retention_days > 0
+
+    def _delete_archived(self, conn: sqlite3.Connection) -> int:
+        """
+        分批删除已归档（ID不超过清单max_id）但仍在热表中的记录，FTS索引由删除触发器同步
+
+        Args:
+            conn: 数据库连接
+
+        Returns:
+            删除的记录数
+        """
+        deleted = 0
+        while True:
+            with conn:
+                cursor = conn.execute(
+                    "DELETE FROM messages WHERE id IN (SELECT id FROM messages WHERE id <= ? ORDER BY id LIMIT ?)",
+                    (self.archive.max_id, self.batch_size),
+                )
+            deleted += cursor.rowcount
+            if cursor.rowcount < self.batch_size:
+                return deleted
+            time.sleep(self.pause)
+
+    def run_once(self) -> Dict[str, Any]:
+        """
+        执行一轮归档（同步，在线程中运行）
+
+        Returns:
+            本轮的归档统计
+        """
+        start = time.perf_counter()
+        conn = sqlite3.connect(db.db_path, timeout=30)
+        try:
+            # 先补删上一轮已归档但尚未删除的记录
+            deleted = self._delete_archived(conn)
+
+            # 按ID顺序分批读取，遇到第一条未过期的记录即停止，
+            # 保证已归档的记录恰好是ID不超过max_id的全部记录（created_at按UTC保存，与datetime('now')一致）
+            rows: List[Dict[str, Any]] = []
+            cutoff = f"-{self.retention_days} days"
+            last_id = self.archive.max_id
+            expired_only = True
+            while expired_only and len(rows) < self.max_rows_per_run:
+                batch = conn.execute(
+                    f"SELECT {', '.join(ARCHIVE_FIELDS)}, created_at < datetime('now', ?) FROM messages "
+                    "WHERE id > ? ORDER BY id LIMIT ?",
+                    (cutoff, last_id, min(self.batch_size, self.max_rows_per_run - len(rows))),
+                ).fetchall()
+                if not batch:
+                    break
+                for row in batch:
+                    if not row[-1]:
+                        expired_only = False
+                        break
+                    rows.append(dict(zip(ARCHIVE_FIELDS, row[:-1])))
+                if rows:
+                    last_id = rows[-1]["id"]
+                time.sleep(self.pause)
+
+            if rows:
+                self.archive.write_segments(rows)
+                deleted += self._delete_archived(conn)
+        finally:
+            conn.close()
+
+        self.last_run = {
+            "archived": len(rows),
+            "deleted": deleted,
+            "seconds": round(time.perf_counter() - start, 3),
+            "finished_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        logger.info(f"对话记录归档完成: 归档 {len(rows)} 条，删除 {deleted} 条，耗时 {self.last_run['seconds']}s")
+        return self.last_run
+
+    async def start(self):
+        """
+        启动后台归档任务
+        """
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._loop())
+            logger.info(f"对话记录保留任务已启动，保留 {self.retention_days} 天，间隔 {self.interval}s")
+
+    async def stop(self):
+        """
+        停止后台归档任务（正在执行的一轮会在线程中继续完成）
+        """
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _loop(self):
+        """
+        定期执行归档
+        """
+        while True:
+            try:
+                await asyncio.to_thread(self.run_once)
+            except Exception as e:
+                logger.error(f"对话记录归档失败: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取保留任务与归档统计
+        """
+        return {
+            "retention_days": self.retention_days,
+            "archive": self.archive.stats(),
+            "last_run": self.last_run,
+        }
+
+# 全局归档与保留任务，归档目录与数据库放在同一数据目录
+message_archive = MessageArchive(os.path.join(os.path.dirname(db.db_path), "archive"))
+retention_manager = RetentionManager(
+    message_archive,
+    retention_days=int(os.getenv("SOULBIT_RETENTION_DAYS", "0")),
+    batch_size=int(os.getenv("SOULBIT_RETENTION_BATCH", "500")),
+    max_rows_per_run=int(os.getenv("SOULBIT_RETENTION_MAX_ROWS", "20000")),
+    interval=float(os.getenv("SOULBIT_RETENTION_INTERVAL", "3600")),
+)
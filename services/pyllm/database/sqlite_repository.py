@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+SQLite存储仓库
+
+复用db.py中的同步实现，通过线程池执行，避免阻塞事件循环。
+"""
+import asyncio
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+from . import db
+from .repository import MessageRepository
+
+class SQLiteRepository(MessageRepository):
+    """
+    基于本地SQLite文件的存储仓库
+    """
+    async def init(self):
+        """
+        初始化数据库（建表、迁移、建索引）
+        """
+        await asyncio.to_thread(db.init_db)
+
+    async def close(self):
+        """
+        SQLite按次连接，无需释放资源
+        """
+
+    async def ping(self):
+        await asyncio.to_thread(db.ping)
+
+    async def save_message(
+        self,
+        prompt: str,
+        reply: str,
+        transition: str = "",
+        agent_decision: str = "",
+        user_id: str = "",
+        session_id: str = "",
+        latency_ms: int = 0,
+        input_tokens: int = 0,
+        output_tokens: int = 0,
+        error: bool = False,
+    ) -> Optional[int]:
+        return await asyncio.to_thread(
+            db.save_message, prompt, reply, transition, agent_decision, user_id, session_id,
+            latency_ms, input_tokens, output_tokens, error,
+        )
+
+    async def save_messages_bulk(self, rows: List[Tuple[str, ...]]) -> int:
+        return await asyncio.to_thread(db.save_messages_bulk, rows)
+
+    async def import_messages(self, rows: Iterable[Dict[str, Any]], batch_size: int = 1000) -> int:
+        return await asyncio.to_thread(db.import_messages, rows, batch_size)
+
+    async def iter_messages(
+        self,
+        batch_size: int = 1000,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        user_id: Optional[str] = None,
+        session_id: Optional[str] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        # 按ID游标分批读取，每批是独立的短查询，不会在导出期间阻塞写入
+        after_id = 0
+        while True:
+            batch = await asyncio.to_thread(db.fetch_messages_after, after_id, batch_size, since, until, user_id, session_id)
+            for row in batch:
+                yield row
+            if len(batch) < batch_size:
+                return
+            after_id = batch[-1]["id"]
+
+    async def query_messages(
+        self,
+        limit: int = 20,
+        before_id: Optional[int] = None,
+        user_id: Optional[str] = None,
+        agent_decision: Optional[str] = None,
+        q: Optional[str] = None,
+        session_id: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        return await asyncio.to_thread(db.query_messages, limit, before_id, user_id, agent_decision, q, session_id)
+
+    async def get_message(self, message_id: int) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(db.get_message, message_id)
+
+    async def get_messages_by_ids(self, message_ids: List[int]) -> Dict[int, Dict[str, str]]:
+        return await asyncio.to_thread(db.get_messages_by_ids, message_ids)
+
+    async def list_sessions(self, user_id: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(db.list_sessions, user_id, limit)
+
+    async def usage_daily(self, days: int = 30) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(db.usage_daily, days)
+
+    async def recent_transitions(self, limit: int = 5000) -> List[Tuple[str, str, str]]:
+        return await asyncio.to_thread(db.recent_transitions, limit)
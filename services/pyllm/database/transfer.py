@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""
+对话记录导出与导入模块
+
+导出：按ID升序流式读取（先冷归档、后热数据），逐批写出NDJSON或Parquet，内存占用与总量无关。
+导入：逐行读取NDJSON或按行组读取Parquet，在一个事务中分批写入。
+
+用法（从项目根目录运行）：
+    python -m services.pyllm.database.transfer export -o messages.ndjson --since 2025-01-01 --until 2025-02-01
+    python -m services.pyllm.database.transfer export -o messages.parquet --format parquet --session-id abc
+    python -m services.pyllm.database.transfer import -i messages.ndjson
+"""
+import argparse
+import asyncio
+import json
+import sys
+from typing import Any, AsyncIterator, BinaryIO, Dict, Iterator, Optional
+from ..utils.logger import logger
+from ..utils.serialization import dumps
+from .db import MESSAGE_METRIC_FIELDS, MESSAGE_RECORD_FIELDS
+from .repository import MessageRepository, get_repository
+from .retention import message_archive
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# 导出字段
+EXPORT_FIELDS = MESSAGE_RECORD_FIELDS
+
+def _matches(row: Dict[str, Any], since: Optional[str], until: Optional[str], user_id: Optional[str], session_id: Optional[str]) -> bool:
+    """
+    判断归档记录是否满足导出过滤条件
+    """
+    created_at = row.get("created_at") or ""
+    if since and created_at < since:
+        return False
+    if until and created_at >= until:
+        return False
+    if user_id is not None and row.get("user_id") != user_id:
+        return False
+    if session_id is not None and row.get("session_id") != session_id:
+        return False
+    return True
+
+async def iter_export_rows(
+    repository: MessageRepository,
+    batch_size: int = 1000,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    user_id: Optional[str] = None,
+    session_id: Optional[str] = None,
+    include_archive: bool = True,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    按ID升序流式产出待导出的记录（冷归档中的记录ID都小于热数据，先产出归档）
+
+    Args:
+        repository: 存储仓库
+        batch_size: 每批读取条数
+        since: 起始时间（包含）
+        until: 截止时间（不包含）
+        user_id: 按用户过滤
+        session_id: 按会话过滤
+        include_archive: 是否包含冷归档中的记录
+
+    Yields:
+        记录字典
+    """
+    if include_archive:
+        for segment in message_archive.segments():
+            # 按分段月份跳过不在时间范围内的分段
+            if (since and segment["month"] < since[:7]) or (until and segment["month"] > until[:7]):
+                continue
+            rows = await asyncio.to_thread(message_archive.read_segment, segment, False)
+            for row in rows:
+                if _matches(row, since, until, user_id, session_id):
+                    yield {field: row.get(field, 0 if field in MESSAGE_METRIC_FIELDS else "") for field in EXPORT_FIELDS}
+
+    async for row in repository.iter_messages(batch_size, since, until, user_id, session_id):
+        yield row
+
+async def iter_ndjson_chunks(rows: AsyncIterator[Dict[str, Any]], batch_size: int = 1000) -> AsyncIterator[bytes]:
+    """
+    将记录编码为NDJSON，每batch_size行合并为一个数据块
+
+    Args:
+        rows: 记录异步迭代器
+        batch_size: 每块行数
+
+    Yields:
+        NDJSON数据块
+    """
+    lines = []
+    async for row in rows:
+        lines.append(dumps(row))
+        if len(lines) >= batch_size:
+            yield b"\n".join(lines) + b"\n"
+            lines = []
+    if lines:
+        yield b"\n".join(lines) + b"\n"
+
+async def export_messages(out: BinaryIO, fmt: str = "ndjson", batch_size: int = 1000, **filters: Any) -> int:
+    """
+    导出对话记录到文件
+
+    Args:
+        out: 二进制输出流
+        fmt: 格式（ndjson/parquet）
+        batch_size: 每批条数（Parquet为每个行组的行数）
+        **filters: since、until、user_id、session_id、include_archive
+
+    Returns:
+        导出的记录数
+    """
+    rows = iter_export_rows(get_repository(), batch_size, **filters)
+    total = 0
+    if fmt == "ndjson":
+        async for chunk in iter_ndjson_chunks(rows, batch_size):
+            out.write(chunk)
+            total += chunk.count(b"\n")
+        return total
+
+    if pq is None:
+        raise RuntimeError("导出Parquet需要安装pyarrow库")
+    schema = pa.schema([
+        (field, pa.int64() if field == "id" or field in MESSAGE_METRIC_FIELDS else pa.string())
+        for field in EXPORT_FIELDS
+    ])
+    writer = pq.ParquetWriter(out, schema, compression="zstd")
+    try:
+        batch = []
+        async for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                total += len(batch)
+                batch = []
+        if batch:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            total += len(batch)
+    finally:
+        writer.close()
+    return total
+
+def read_import_rows(path: str, fmt: str, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+    """
+    逐行读取待导入的记录
+
+    Args:
+        path: 文件路径
+        fmt: 格式（ndjson/parquet）
+        batch_size: Parquet每次读取的行数
+
+    Yields:
+        记录字典
+    """
+    if fmt == "ndjson":
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        return
+
+    if pq is None:
+        raise RuntimeError("导入Parquet需要安装pyarrow库")
+    for record_batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+        yield from record_batch.to_pylist()
+
+async def import_messages(path: str, fmt: str = "ndjson", batch_size: int = 1000) -> int:
+    """
+    从文件导入对话记录（一个事务，分批写入）
+
+    Args:
+        path: 文件路径
+        fmt: 格式（ndjson/parquet）
+        batch_size: 每批条数
+
+    Returns:
+        导入的记录数
+    """
+    return await get_repository().import_messages(read_import_rows(path, fmt, batch_size), batch_size)
+
+async def _run(args: argparse.Namespace):
+    """
+    执行命令行子命令
+    """
+    repository = get_repository()
+    await repository.init()
+    try:
+        fmt = args.format or ("parquet" if (args.output or args.input or "").endswith(".parquet") else "ndjson")
+        if args.command == "export":
+            filters = {
+                "since": args.since,
+                "until": args.until,
+                "user_id": args.user_id,
+                "session_id": args.session_id,
+                "include_archive": not args.no_archive,
+            }
+            if args.output == "-":
+                total = await export_messages(sys.stdout.buffer, fmt, args.batch_size, **filters)
+            else:
+                with open(args.output, "wb") as out:
+                    total = await export_messages(out, fmt, args.batch_size, **filters)
+            logger.info(f"导出对话记录 {total} 条（{fmt}）")
+        else:
+            total = await import_messages(args.input, fmt, args.batch_size)
+            logger.info(f"从 {args.input} 导入对话记录 {total} 条")
+    finally:
+        await repository.close()
+
+def main():
+    """
+    命令行入口
+    """
+    parser = argparse.ArgumentParser(description="对话记录导出与导入")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="导出对话记录")
+    export_parser.add_argument("-o", "--output", default="-", help="输出文件，默认输出到标准输出")
+    export_parser.add_argument("--since", help="起始时间（包含），如2025-01-01")
+    export_parser.add_argument("--until", help="截止时间（不包含），如2025-02-01")
+    export_parser.add_argument("--user-id", help="按用户过滤")
+    export_parser.add_argument("--session-id", help="按会话过滤")
+    export_parser.add_argument("--no-archive", action="store_true", help="不包含冷归档中的记录")
+
+    import_parser = subparsers.add_parser("import", help="导入对话记录")
+    import_parser.add_argument("-i", "--input", required=True, help="输入文件")
+
+    for sub in (export_parser, import_parser):
+        sub.add_argument("--format", choices=["ndjson", "parquet"], help="文件格式，默认按扩展名判断")
+        sub.add_argument("--batch-size", type=int, default=1000, help="每批条数")
+    parser.set_defaults(output=None, input=None)
+
+    asyncio.run(_run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
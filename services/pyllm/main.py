@@ -2,11 +2,15 @@
 """
 Soulbit LLM服务主入口
 """
+import os
 from fastapi.middleware.cors import CORSMiddleware
 from .utils.logger import logger
 from .utils.env import load_env
 from .database.db import init_db
 from .api.routes import app
+from .api.compression import CompressionMiddleware
+from .api.profiling import ProfilingMiddleware
+from .api.connection_manager import connection_manager
 
 # 配置CORS中间件，允许前端跨域访问
 app.add_middleware(
@@ -17,6 +21,20 @@ app.add_middleware(
     allow_headers=["*"],  # 允许所有HTTP头
 )
 
+# 配置HTTP响应压缩（流式接口不压缩）
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.getenv("SOULBIT_COMPRESS_MIN_BYTES", "1024")),
+    exclude_paths=["/llm/stream"],
+)
+
+# 配置按请求剖析（按比例抽样，或请求头X-Soulbit-Profile携带管理令牌时强制剖析）
+app.add_middleware(
+    ProfilingMiddleware,
+    sample_rate=float(os.getenv("SOULBIT_PROFILE_SAMPLE_RATE", "0")),
+    max_active=int(os.getenv("SOULBIT_PROFILE_MAX_ACTIVE", "2")),
+)
+
 # 健康检查接口
 @app.get("/health")
 def health():
@@ -30,5 +48,16 @@ def health():
 if __name__ == "__main__":
     import uvicorn
     logger.info("Soulbit LLM服务启动")
-    # 启动服务
-    uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    # 启动服务（协议层ping与连接管理器的心跳配置保持一致）
+    # 协议层单帧上限为连接管理器单条消息上限的2倍：超出上限不多的消息能收到"消息过长"的提示，
+    # 而不是被uvicorn直接以1009关闭连接
+    uvicorn.run(
+        app,
+        host="0.0.0.0",
+        port=8000,
+        reload=True,
+        ws_max_size=connection_manager.max_message_bytes * 2,
+        ws_ping_interval=float(os.getenv("SOULBIT_WS_HEARTBEAT_INTERVAL", "20")),
+        ws_ping_timeout=float(os.getenv("SOULBIT_WS_HEARTBEAT_INTERVAL", "20")),
+        ws_per_message_deflate=os.getenv("SOULBIT_WS_DEFLATE", "1") != "0",  # 协商permessage-deflate压缩
+    )
\ No newline at end of file
@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+"""
+长期记忆模块
+"""
+from .store import LongTermMemory, long_term_memory
+
+__all__ = [
+    "LongTermMemory",
+    "long_term_memory"
+]
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+文本向量化模块
+
+默认使用本地的字符n-gram哈希向量化（无需模型、无网络调用），
+也可以注入任意可调用对象（如调用嵌入模型的客户端）替换。
+"""
+import zlib
+from typing import Callable, List, Sequence
+import numpy as np
+
+# 嵌入函数类型：文本列表 → float32矩阵（行数等于文本数）
+Embedder = Callable[[Sequence[str]], np.ndarray]
+
+class HashingEmbedder:
+    """
+    字符n-gram哈希向量化
+
+    对中文按单字和相邻双字切分，英文和数字按小写后的字符处理，
+    n-gram通过crc32哈希到固定维度并带符号累加，最后做L2归一化。
+    """
+    def __init__(self, dim: int = 256, ngrams: Sequence[int] = (1, 2)):
+        """
+        初始化向量化器
+
+        Args:
+            dim: 向量维度
+            ngrams: 使用的n-gram长度
+        """
+        self.dim = dim
+        self.ngrams = tuple(ngrams)
+
+    def _features(self, text: str) -> List[int]:
+        """
+        提取文本的n-gram哈希特征
+
+        Args:
+            text: 文本
+
+        Returns:
+            哈希值列表
+        """
+        chars = [ch for ch in text.lower() if not ch.isspace()]
+        features = []
+        for n in self.ngrams:
+            for i in range(len(chars) - n + 1):
+                features.append(zlib.crc32("".join(chars[i:i + n]).encode("utf-8")))
+        return features
+
+    def __call__(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        将文本列表向量化
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            形状为(len(texts), dim)的float32矩阵，每行已L2归一化
+        """
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                vectors[row, feature % self.dim] += 1.0 if feature & 0x80000000 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
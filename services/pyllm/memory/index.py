@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+按用户划分的向量索引
+
+每个用户一个追加写入的记录文件，每条记录为(记录ID, 向量)，
+检索时通过NumPy内存映射读取，不需要把索引整体加载进内存。
+"""
+import hashlib
+import os
+from typing import List, Tuple
+import numpy as np
+
+class VectorIndex:
+    """
+    单个用户的内存映射向量索引
+    """
+    def __init__(self, path: str, dim: int):
+        """
+        初始化索引
+
+        Args:
+            path: 索引文件路径
+            dim: 向量维度
+        """
+        self.path = path
+        self.dim = dim
+        self.dtype = np.dtype([("id", "<i8"), ("vec", "<f4", (dim,))])
+        self._mmap = None
+        self._mapped_count = 0
+
+    def __len__(self) -> int:
+        """
+        索引中的记录数（按文件大小计算，包含其他进程追加的记录）
+        """
+        try:
+            return os.path.getsize(self.path) // self.dtype.itemsize
+        except OSError:
+            return 0
+
+    def add(self, message_ids: List[int], vectors: np.ndarray):
+        """
+        追加记录（单次写入整条记录，多个进程同时追加时记录不会交错）
+
+        Args:
+            message_ids: 记录ID列表
+            vectors: 对应的向量矩阵
+        """
+        records = np.empty(len(message_ids), dtype=self.dtype)
+        records["id"] = message_ids
+        records["vec"] = vectors
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, records.tobytes())
+        finally:
+            os.close(fd)
+
+    def _records(self) -> np.ndarray:
+        """
+        获取当前全部记录的内存映射（文件增长后重新映射）
+
+        Returns:
+            结构化数组（内存映射）
+        """
+        count = len(self)
+        if count == 0:
+            return np.empty(0, dtype=self.dtype)
+        if self._mmap is None or count != self._mapped_count:
+            self._mmap = np.memmap(self.path, dtype=self.dtype, mode="r", shape=(count,))
+            self._mapped_count = count
+        return self._mmap
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        """
+        检索与查询向量最相似的k条记录（余弦相似度，向量已归一化）
+
+        Args:
+            query: 查询向量
+            k: 返回条数
+
+        Returns:
+            [(记录ID, 相似度)]，按相似度降序
+        """
+        records = self._records()
+        if len(records) == 0 or k <= 0:
+            return []
+        scores = records["vec"] @ query.astype(np.float32)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(records["id"][i]), float(scores[i])) for i in top]
+
+def user_index_path(root: str, user_id: str) -> str:
+    """
+    计算用户索引文件路径（用户ID哈希后作为目录名，避免路径注入）
+
+    Args:
+        root: 索引根目录
+        user_id: 用户ID
+
+    Returns:
+        索引文件路径
+    """
+    digest = hashlib.sha1(user_id.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(root, digest, "vectors.bin")
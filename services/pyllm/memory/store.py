@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+长期记忆模块
+
+保存对话记录时增量写入用户的向量索引；专业Agent回复前检索少量相关的历史片段，
+作为单独的消息注入提示词，而不是把全部历史拼进上下文。
+
+长期记忆只对经过验证的身份（见api/identity.py）开放：接口层只把验证过的用户ID交给工作流检索，
+写入索引时也只接受与本轮验证身份一致的用户，自报的user_id既不能读取也不能写入其他用户的记忆。
+"""
+import asyncio
+import os
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+from ..utils.logger import logger
+from ..database.db import db_path, register_save_hook
+from ..database.repository import get_repository
+from ..database.retention import message_archive
+
+try:
+    import numpy as np
+    from .embedder import Embedder, HashingEmbedder
+    from .index import VectorIndex, user_index_path
+    _numpy_available = True
+except ImportError:
+    _numpy_available = False
+    logger.warning("未安装numpy库，长期记忆功能不可用")
+    logger.info("请使用`pip install numpy`安装numpy库")
+
+# 当前对话轮次经过验证的用户ID（由接口层设置，保存对话记录的回调在工作线程中读取）
+memory_user_id: ContextVar[str] = ContextVar("memory_user_id", default="")
+
+class LongTermMemory:
+    """
+    长期记忆：按用户的向量索引 + top-k检索
+    """
+    def __init__(self, root: str, embedder: Optional["Embedder"] = None, dim: int = 256):
+        """
+        初始化长期记忆
+
+        Args:
+            root: 索引根目录
+            embedder: 向量化函数，默认使用本地哈希向量化
+            dim: 默认向量化器的维度（注入embedder时以其输出维度为准）
+        """
+        self.root = root
+        self.enabled = _numpy_available and os.getenv("SOULBIT_LONG_TERM_MEMORY", "1") != "0"
+        self.embedder = embedder or (HashingEmbedder(dim) if _numpy_available else None)
+        self.dim = getattr(self.embedder, "dim", dim)
+        self._indexes: Dict[str, "VectorIndex"] = {}
+
+    def set_embedder(self, embedder: "Embedder", dim: int):
+        """
+        替换向量化函数（已有索引维度不同时需要重建）
+
+        Args:
+            embedder: 向量化函数
+            dim: 输出向量维度
+        """
+        self.embedder = embedder
+        self.dim = dim
+        self._indexes.clear()
+
+    def _index(self, user_id: str) -> "VectorIndex":
+        """
+        获取用户的向量索引
+
+        Args:
+            user_id: 用户ID
+
+        Returns:
+            向量索引
+        """
+        index = self._indexes.get(user_id)
+        if index is None:
+            index = VectorIndex(user_index_path(self.root, user_id), self.dim)
+            self._indexes[user_id] = index
+        return index
+
+    def index_message(self, message_id: int, user_id: str, prompt: str, reply: str):
+        """
+        增量索引一条对话记录（作为保存对话记录后的回调）
+
+        Args:
+            message_id: 记录ID
+            user_id: 用户ID，为空或不是本轮经过验证的用户时不索引
+            prompt: 用户输入
+            reply: 回复
+        """
+        if not self.enabled or not user_id or user_id != memory_user_id.get():
+            return
+        vector = self.embedder([prompt])
+        self._index(user_id).add([message_id], vector)
+
+    def search(self, user_id: str, query: str, k: int = 3, min_score: float = 0.3) -> List[int]:
+        """
+        在用户的向量索引中检索相关记录ID
+
+        Args:
+            user_id: 用户ID
+            query: 当前用户输入
+            k: 最多返回条数
+            min_score: 最低相似度
+
+        Returns:
+            记录ID列表，按相关度降序
+        """
+        hits = self._index(user_id).search(self.embedder([query])[0], k)
+        return [message_id for message_id, score in hits if score >= min_score]
+
+    async def retrieve(self, user_id: str, query: str, k: int = 3, min_score: float = 0.3) -> List[Dict[str, str]]:
+        """
+        检索与当前输入相关的历史对话片段
+
+        Args:
+            user_id: 经过验证的用户ID（不能使用请求中自报的用户ID）
+            query: 当前用户输入
+            k: 最多返回条数
+            min_score: 最低相似度
+
+        Returns:
+            [{"prompt","reply","created_at"}]，按相关度降序
+        """
+        if not self.enabled or not user_id:
+            return []
+        start = time.perf_counter()
+        message_ids = await asyncio.to_thread(self.search, user_id, query, k, min_score)
+        rows = await get_repository().get_messages_by_ids(message_ids)
+        # 已被保留策略移入冷归档的记录从归档中读取
+        archived_ids = [message_id for message_id in message_ids if message_id not in rows and message_id <= message_archive.max_id]
+        if archived_ids:
+            rows.update(await asyncio.to_thread(message_archive.get_many, archived_ids))
+        snippets = [rows[message_id] for message_id in message_ids if message_id in rows]
+        logger.info(f"长期记忆检索: 用户 {user_id[:8]}，命中 {len(snippets)} 条，耗时 {(time.perf_counter() - start) * 1000:.2f}ms")
+        return snippets
+
+# 全局长期记忆实例，索引与数据库放在同一数据目录
+long_term_memory = LongTermMemory(os.path.join(os.path.dirname(db_path), "memory"))
+register_save_hook(long_term_memory.index_message)
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+管理接口鉴权：未配置令牌时隐藏接口，支持X-Admin-Token和Bearer两种请求头
+"""
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("openai")
+pytest.importorskip("langchain_core")
+
+from fastapi import HTTPException
+from starlette.requests import Request
+from services.pyllm.api import profiling
+from services.pyllm.api.profiling import check_admin_token, require_admin
+
+def _request(*headers) -> Request:
+    """
+    构造带指定请求头的请求
+    """
+    return Request({"type": "http", "headers": [(name.encode(), value.encode()) for name, value in headers]})
+
+@pytest.fixture
+def token(monkeypatch):
+    monkeypatch.setattr(profiling, "ADMIN_TOKEN", "s3cret")
+
+def test_check_admin_token(token):
+    assert check_admin_token("s3cret")
+    assert not check_admin_token("s3cre")
+    assert not check_admin_token("")
+    assert not check_admin_token(None)
+
+def test_unconfigured_token_rejects_everything(monkeypatch):
+    monkeypatch.setattr(profiling, "ADMIN_TOKEN", "")
+    assert not check_admin_token("")
+    with pytest.raises(HTTPException) as excinfo:
+        require_admin(_request(("x-admin-token", "")))
+    assert excinfo.value.status_code == 404
+
+@pytest.mark.parametrize("headers", [
+    [("x-admin-token", "s3cret")],
+    [("authorization", "Bearer s3cret")],
+    [("authorization", "bearer  s3cret ")],
+])
+def test_require_admin_accepts_valid_token(token, headers):
+    require_admin(_request(*headers))
+
+@pytest.mark.parametrize("headers", [
+    [],
+    [("x-admin-token", "wrong")],
+    [("authorization", "Basic s3cret")],
+    # X-Admin-Token优先于Authorization
+    [("x-admin-token", "wrong"), ("authorization", "Bearer s3cret")],
+])
+def test_require_admin_rejects_invalid_token(token, headers):
+    with pytest.raises(HTTPException) as excinfo:
+        require_admin(_request(*headers))
+    assert excinfo.value.status_code == 403
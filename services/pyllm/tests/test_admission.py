@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+准入控制：令牌桶补充与淘汰、只信任受信任代理转发的客户端地址
+"""
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("openai")
+pytest.importorskip("langchain_core")
+
+from services.pyllm.api.admission import AdmissionController, RateLimiter, retry_after_header
+
+def test_bucket_allows_burst_then_refills_at_rate():
+    limiter = RateLimiter("test", rate=2.0, burst=3)
+    for _ in range(3):
+        assert limiter.retry_after("a", 0.0) == 0.0
+        limiter.consume("a")
+    # 令牌用完，每秒补充2个，需要等0.5秒
+    assert limiter.retry_after("a", 0.0) == pytest.approx(0.5)
+    assert limiter.retry_after("a", 0.25) == pytest.approx(0.25)
+    assert limiter.retry_after("a", 0.5) == 0.0
+    # 补充不超过桶容量
+    assert limiter.retry_after("a", 100.0) == 0.0
+    assert limiter.buckets["a"].tokens == 3
+
+def test_disabled_limiter_and_empty_key_always_admit():
+    limiter = RateLimiter("test", rate=0.0, burst=1)
+    limiter.consume("a")
+    assert limiter.retry_after("a", 0.0) == 0.0 and not limiter.buckets
+    limiter = RateLimiter("test", rate=1.0, burst=1)
+    assert limiter.retry_after("", 0.0) == 0.0 and not limiter.buckets
+
+def test_idle_clients_are_evicted():
+    limiter = RateLimiter("test", rate=1.0, burst=1, idle_ttl=10.0)
+    limiter.retry_after("a", 0.0)
+    limiter.retry_after("b", 5.0)
+    # 新客户端到来时，从最久未使用的一端淘汰空闲超过idle_ttl的客户端
+    limiter.retry_after("c", 12.0)
+    assert list(limiter.buckets) == ["b", "c"]
+    assert limiter.stats()["evicted"] == 1
+
+def test_least_recently_used_client_is_evicted_at_capacity():
+    limiter = RateLimiter("test", rate=1.0, burst=1, max_clients=2)
+    limiter.retry_after("a", 0.0)
+    limiter.retry_after("b", 1.0)
+    # 再次访问a后，b成为最久未使用的客户端
+    limiter.retry_after("a", 2.0)
+    limiter.retry_after("c", 3.0)
+    assert list(limiter.buckets) == ["a", "c"]
+
+def test_admit_consumes_both_limiters_only_when_both_allow():
+    controller = AdmissionController(RateLimiter("IP", rate=1.0, burst=5), RateLimiter("会话", rate=1.0, burst=1))
+    assert controller.admit("1.2.3.4", "s1") == 0.0
+    assert controller.admit("1.2.3.4", "s1") > 0
+    # 会话限流拒绝时不消耗IP的令牌
+    stats = controller.stats()
+    assert (stats["ip"]["admitted"], stats["session"]["throttled"]) == (1, 1)
+    assert controller.ip_limiter.buckets["1.2.3.4"].tokens == pytest.approx(4, abs=0.01)
+    assert retry_after_header(0.2) == "1" and retry_after_header(1.5) == "2"
+
+@pytest.fixture
+def controller():
+    limiter = RateLimiter("test", rate=0.0, burst=1)
+    return AdmissionController(limiter, limiter, trusted_proxies=["10.0.0.0/24", " ::1 ", "", "not-an-ip"])
+
+@pytest.mark.parametrize("peer, forwarded_for, expected", [
+    # 不受信任的直连地址：忽略X-Forwarded-For
+    ("203.0.113.9", "1.1.1.1", "203.0.113.9"),
+    # 受信任代理：取最右边的不受信任地址，左边由客户端伪造的地址不被采用
+    ("10.0.0.2", "6.6.6.6, 198.51.100.7", "198.51.100.7"),
+    ("10.0.0.2", "6.6.6.6, 198.51.100.7, 10.0.0.5", "198.51.100.7"),
+    ("::1", "198.51.100.7", "198.51.100.7"),
+    # 整条链都是受信任代理时取最左边的地址
+    ("10.0.0.2", "10.0.0.3, 10.0.0.4", "10.0.0.3"),
+    # 请求头为空或只有分隔符时使用直连地址
+    ("10.0.0.2", "", "10.0.0.2"),
+    ("10.0.0.2", " , ", "10.0.0.2"),
+    (None, "1.1.1.1", ""),
+])
+def test_client_ip(controller, peer, forwarded_for, expected):
+    assert controller.client_ip(peer, forwarded_for) == expected
+
+def test_invalid_trusted_proxies_are_ignored(controller):
+    assert [str(network) for network in controller.trusted_proxies] == ["10.0.0.0/24", "::1/128"]
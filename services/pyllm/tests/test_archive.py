@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""
+冷归档按ID批量读取
+"""
+from services.pyllm.database.retention import MessageArchive
+
+def _row(message_id, created_at):
+    """
+    构造一条归档记录
+    """
+    return {
+        "id": message_id, "prompt": f"问题{message_id}", "reply": f"回复{message_id}", "transition": "", "agent_decision": "",
+        "user_id": "u1", "session_id": "", "latency_ms": 0, "input_tokens": 0, "output_tokens": 0, "error": 0,
+        "created_at": created_at,
+    }
+
+def test_get_many_reads_across_segments(tmp_path):
+    archive = MessageArchive(str(tmp_path))
+    archive.write_segments([_row(1, "2025-01-05 08:00:00"), _row(2, "2025-01-20 08:00:00"), _row(4, "2025-02-01 08:00:00")])
+
+    found = archive.get_many([4, 1, 3, 99])
+    assert set(found) == {1, 4}
+    assert found[4] == {"prompt": "问题4", "reply": "回复4", "created_at": "2025-02-01 08:00:00"}
+    assert archive.get_many([]) == {}
+
+    # 清单重新加载后结果一致
+    assert MessageArchive(str(tmp_path)).get_many([2]) == {2: {"prompt": "问题2", "reply": "回复2", "created_at": "2025-01-20 08:00:00"}}
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+决策微批处理：批量调用只做路由分类，直接回复由每个用户单独的决策调用生成
+"""
+import asyncio
+import pytest
+
+pytest.importorskip("langchain_core")
+pytest.importorskip("langchain_openai")
+pytest.importorskip("langgraph")
+
+from services.pyllm.agents.batch_router import BatchRouter
+from services.pyllm.agents.langchain_agent import DecisionAgent
+from services.pyllm.agents.mock_model import MockChatModel
+from services.pyllm.agents.registry import load_registry
+from services.pyllm.utils.resilience import CircuitBreaker
+
+@pytest.fixture
+def agent():
+    """
+    使用离线模拟模型和内置注册表的决策Agent
+    """
+    decision = DecisionAgent(MockChatModel(latency=0.0, token_delay=0.0), load_registry())
+    decision.breaker = CircuitBreaker("test")
+    return decision
+
+def test_batch_prompt_has_no_generated_fields():
+    prompt = load_registry().decision.prompt("llm", batch=True)
+    assert '"agent_type"' in prompt
+    assert '"reply"' not in prompt and '"transition"' not in prompt
+
+def test_classify_batch_returns_routes_only(agent):
+    results, _ = asyncio.run(agent.classify_batch(["最近压力好大", "今天吃什么好", "讲个笑话"]))
+    assert results[0]["agent_decision"] == "心理专家Agent" and results[0]["reply"] == ""
+    # 过渡语来自本地过渡语库
+    assert results[0]["transition"]
+    # 直接回复的条目留给单条决策
+    assert results[1] is None
+    assert results[2]["agent_decision"] == "脱口秀演员Agent"
+
+def test_direct_reply_comes_from_per_user_call(agent):
+    router = BatchRouter(agent._classify_single, agent.classify_batch, agent._degraded_result, window=0.01)
+
+    async def scenario():
+        return await asyncio.gather(router.submit("最近压力好大"), router.submit("今天吃什么好"))
+
+    specialist, direct = asyncio.run(scenario())
+    assert specialist["agent_decision"] == "心理专家Agent"
+    assert direct["agent_decision"] == "闲聊Agent"
+    # 回复只包含该用户自己的输入
+    assert "今天吃什么好" in direct["reply"] and "压力" not in direct["reply"]
+    assert router.batches == 1 and router.single_calls == 1 and router.fallbacks == 1
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+SQLite历史消息搜索：全文检索按rowid翻页，短关键词的LIKE回退按扫描范围分段
+"""
+import pytest
+
+from services.pyllm.database import db
+
+@pytest.fixture
+def messages_db(tmp_path, monkeypatch):
+    """
+    使用临时数据库，写入50条记录，ID为7的倍数的记录包含"压力"
+    """
+    monkeypatch.setattr(db, "db_path", str(tmp_path / "app.db"))
+    db.init_db()
+    rows = [(f"第{i}条" + ("压力" if i % 7 == 0 else "天气"), "回复", "", "", "u", "s") for i in range(1, 51)]
+    db.save_messages_bulk(rows)
+    return db
+
+def _all_pages(limit, q, **filters):
+    """
+    从最新记录开始翻完所有页，返回(全部ID, 页数)
+    """
+    ids, cursor, pages = [], None, 0
+    while True:
+        items, cursor = db.query_messages(limit=limit, before_id=cursor, q=q, **filters)
+        ids += [item["id"] for item in items]
+        pages += 1
+        if cursor is None:
+            return ids, pages
+
+def test_fts_pages_over_rowid(messages_db):
+    if not db.fts_available:
+        pytest.skip("SQLite不支持FTS5 trigram分词器")
+    ids, _ = _all_pages(2, "条压力")
+    assert ids == [49, 42, 35, 28, 21, 14, 7]
+
+def test_short_query_scan_is_bounded(messages_db, monkeypatch):
+    monkeypatch.setattr(db, "LIKE_SCAN_ROWS", 10)
+    items, cursor = db.query_messages(limit=20, q="压力")
+    # 第一页只扫描ID在[41, 51)范围内的记录
+    assert [item["id"] for item in items] == [49, 42]
+    assert cursor == 41
+    ids, pages = _all_pages(3, "压力")
+    assert ids == [49, 42, 35, 28, 21, 14, 7]
+    assert pages == 5
+
+def test_short_query_escapes_like_wildcards(messages_db):
+    db.save_message("完成100%_了", "好")
+    items, _ = db.query_messages(limit=10, q="%_")
+    assert [item["prompt"] for item in items] == ["完成100%_了"]
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+身份令牌：签名校验、过期，以及长期记忆只对验证过的身份开放
+"""
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("openai")
+pytest.importorskip("langchain_core")
+
+from services.pyllm.api import identity
+from services.pyllm.memory.store import LongTermMemory, memory_user_id
+
+@pytest.fixture
+def secret(monkeypatch):
+    monkeypatch.setattr(identity, "IDENTITY_SECRET", "test-secret")
+
+def test_issue_and_verify_round_trip(secret):
+    token = identity.issue_identity("用户-42")
+    assert identity.verify_identity(token) == "用户-42"
+
+def test_tampered_token_is_rejected(secret):
+    token = identity.issue_identity("alice")
+    forged = identity.issue_identity("mallory")
+    # 把别人的签名拼到自己的载荷上
+    payload = token.rpartition(".")[0]
+    assert identity.verify_identity(f"{payload}.{forged.rpartition('.')[2]}") == ""
+    assert identity.verify_identity(token[:-1] + ("0" if token[-1] != "0" else "1")) == ""
+    assert identity.verify_identity("not-a-token") == ""
+
+def test_expired_token_is_rejected(secret):
+    assert identity.verify_identity(identity.issue_identity("alice", ttl=-1)) == ""
+
+def test_without_secret_nothing_verifies(secret, monkeypatch):
+    token = identity.issue_identity("alice")
+    monkeypatch.setattr(identity, "IDENTITY_SECRET", "")
+    assert identity.verify_identity(token) == ""
+    with pytest.raises(ValueError):
+        identity.issue_identity("alice")
+
+def test_bind_identity_prefers_token_over_claimed_user(secret):
+    reset = memory_user_id.set("")
+    try:
+        assert identity.bind_identity("bob", identity.issue_identity("alice")) == "alice"
+        assert memory_user_id.get() == "alice"
+        assert identity.bind_identity("bob", None) == ""
+        assert memory_user_id.get() == ""
+    finally:
+        memory_user_id.reset(reset)
+
+def test_index_message_only_for_verified_user(tmp_path):
+    pytest.importorskip("numpy")
+    memory = LongTermMemory(str(tmp_path))
+    memory.enabled = True
+    reset = memory_user_id.set("alice")
+    try:
+        memory.index_message(1, "bob", "我最近睡不好", "回复")
+        assert "bob" not in memory._indexes
+        memory.index_message(2, "alice", "我最近睡不好", "回复")
+        assert memory.search("alice", "我最近睡不好", min_score=0.0) == [2]
+    finally:
+        memory_user_id.reset(reset)
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+WebSocket多路复用：通道内排队的消息数有上限
+"""
+import asyncio
+import json
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("openai")
+pytest.importorskip("langchain_core")
+
+from services.pyllm.api.connection_manager import WSSession
+from services.pyllm.api.multiplex import MuxConnection
+
+class _FakeWebSocket:
+    """
+    记录发出帧的WebSocket替身
+    """
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, text: str):
+        self.sent.append(json.loads(text))
+
+def test_pending_queue_is_bounded():
+    websocket = _FakeWebSocket()
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def run_turn(session, prompt, user_id, send, identity=""):
+            await release.wait()
+
+        mux = MuxConnection(WSSession("mux", websocket, rate_limit=100), run_turn, "127.0.0.1", max_pending=2)
+        await mux.handle(json.dumps({"type": "open", "channel": "a", "credits": 4}))
+        for index in range(4):
+            await mux.handle(json.dumps({"type": "message", "channel": "a", "data": {"prompt": f"第{index}条"}}))
+        channel = mux.channels["a"]
+        queued = len(channel.pending)
+        release.set()
+        await mux.close()
+        return queued
+
+    assert asyncio.run(scenario()) == 2
+    assert websocket.sent == [{"channel": "a", "error": "排队的消息太多，请稍后再试"}]
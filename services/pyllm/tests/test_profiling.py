@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+调用栈采样器：折叠栈输出格式、只采样指定线程
+"""
+import threading
+import time
+
+from services.pyllm.utils.profiling import StackSampler
+
+def _busy_wait(stop: threading.Event):
+    """
+    被采样的工作线程：忙等直到收到停止信号
+    """
+    while not stop.is_set():
+        sum(range(100))
+
+def _sample_worker() -> str:
+    """
+    只采样一个忙等的工作线程，返回折叠栈文本
+    """
+    stop = threading.Event()
+    worker = threading.Thread(target=_busy_wait, args=(stop,), name="busy-worker")
+    worker.start()
+    try:
+        sampler = StackSampler(interval=0.001, thread_ids=[worker.ident]).start()
+        while sampler.samples < 20:
+            time.sleep(0.005)
+        return sampler.stop()
+    finally:
+        stop.set()
+        worker.join()
+
+def test_folded_stacks_for_selected_thread():
+    folded = _sample_worker()
+    lines = folded.splitlines()
+    assert lines
+    stacks = [line.rsplit(" ", 1) for line in lines]
+    counts = [int(count) for _, count in stacks]
+    assert counts == sorted(counts, reverse=True)
+    # 根帧是线程名，叶子方向是被采样的函数
+    assert all(stack.split(";")[0] == "thread:busy-worker" for stack, _ in stacks)
+    top = stacks[0][0].split(";")
+    assert any(frame.startswith("_busy_wait (") and "test_profiling.py:" in frame for frame in top)
+
+def test_sampler_skips_its_own_thread():
+    sampler = StackSampler(interval=0.001).start()
+    while sampler.samples < 5:
+        time.sleep(0.005)
+    folded = sampler.stop()
+    assert "thread:soulbit-profiler" not in folded
+    assert "thread:MainThread" in folded
+
+def test_label_escapes_semicolons():
+    code = _busy_wait.__code__.replace(co_name="a;b")
+    assert StackSampler()._label(code).startswith("a,b (")
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+就绪检查：预热完成前未就绪，存储故障或关闭时未就绪，上游熔断只作为信息返回
+"""
+import asyncio
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("openai")
+pytest.importorskip("langchain_core")
+pytest.importorskip("langchain_openai")
+pytest.importorskip("langgraph")
+
+from services.pyllm.api import readiness
+from services.pyllm.api.readiness import ReadinessProbe
+
+class _FakeWorkflow:
+    """
+    记录预热调用的工作流替身
+    """
+    def __init__(self, warm_up_error=None):
+        self.graph = object()
+        self.model = object()
+        self.warm_up_error = warm_up_error
+        self.warm_up_args = None
+
+    async def warm_up(self, connections, model_call, timeout):
+        self.warm_up_args = (connections, model_call, timeout)
+        if self.warm_up_error:
+            raise self.warm_up_error
+        return {"connections": connections}
+
+class _FakeRepository:
+    """
+    可以切换为故障状态的存储仓库替身
+    """
+    def __init__(self):
+        self.broken = False
+
+    async def ping(self):
+        if self.broken:
+            raise RuntimeError("数据库不可用")
+
+class _FakeBreaker:
+    """
+    返回固定状态的熔断器替身
+    """
+    def __init__(self, state):
+        self.state = state
+
+    def snapshot(self):
+        return {"state": self.state}
+
+@pytest.fixture
+def env(monkeypatch):
+    """
+    替换工作流、存储仓库和熔断器，返回(工作流, 存储仓库, 熔断器)
+    """
+    workflow, repository, breaker = _FakeWorkflow(), _FakeRepository(), _FakeBreaker("closed")
+    monkeypatch.setattr(readiness, "get_workflow", lambda: workflow)
+    monkeypatch.setattr(readiness, "get_repository", lambda: repository)
+    monkeypatch.setattr(readiness, "breaker_for_model", lambda model: breaker)
+    monkeypatch.setattr(readiness.connection_manager, "draining", False)
+    return workflow, repository, breaker
+
+def _start_and_snapshot(probe: ReadinessProbe):
+    """
+    启动后台任务，等到第一次刷新完成后停止并返回快照
+    """
+    async def scenario():
+        await probe.start()
+        while not probe.checks:
+            await asyncio.sleep(0.01)
+        await probe.stop()
+        return probe.snapshot()
+
+    return asyncio.run(scenario())
+
+def test_not_ready_until_warmed_up(env):
+    workflow, _, _ = env
+    probe = ReadinessProbe(interval=60, warmup_connections=3, warmup_model_call=True, warmup_timeout=1.0)
+    before = probe.snapshot()
+    assert before["ready"] is False and before["warming_up"] is True and before["age_s"] is None
+
+    status = _start_and_snapshot(probe)
+    assert workflow.warm_up_args == (3, True, 1.0)
+    assert status["ready"] is True and status["warming_up"] is False
+    assert status["warmup"] == {"connections": 3}
+    assert status["checks"]["workflow"]["ok"] and status["checks"]["db"]["ok"]
+
+def test_warm_up_failure_does_not_block_readiness(env):
+    workflow, _, _ = env
+    workflow.warm_up_error = RuntimeError("连接失败")
+    status = _start_and_snapshot(ReadinessProbe(interval=60))
+    assert status["ready"] is True
+    assert status["warmup"] == {"error": "连接失败"}
+
+def test_open_breaker_is_reported_but_does_not_gate(env):
+    _, _, breaker = env
+    breaker.state = "open"
+    probe = ReadinessProbe()
+    probe.warmed_up = True
+    asyncio.run(probe.refresh())
+    status = probe.snapshot()
+    assert status["ready"] is True
+    assert status["upstream"] == {"breaker": "open"}
+    assert "upstream" not in status["checks"]
+
+def test_db_failure_and_draining_are_not_ready(env, monkeypatch):
+    _, repository, _ = env
+    probe = ReadinessProbe()
+    probe.warmed_up = True
+    repository.broken = True
+    asyncio.run(probe.refresh())
+    status = probe.snapshot()
+    assert status["ready"] is False
+    assert status["checks"]["db"] == {"ok": False, "error": "数据库不可用"}
+
+    repository.broken = False
+    asyncio.run(probe.refresh())
+    assert probe.snapshot()["ready"] is True
+    monkeypatch.setattr(readiness.connection_manager, "draining", True)
+    status = probe.snapshot()
+    assert status["ready"] is False and status["draining"] is True
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+注册表驱动的参数：专业Agent温度、调度优先级与延迟目标、模拟模型关键词、热加载时的过渡语替换
+"""
+import json
+import pytest
+
+pytest.importorskip("langchain_core")
+pytest.importorskip("langchain_openai")
+pytest.importorskip("langgraph")
+
+from services.pyllm.agents import langchain_agent
+from services.pyllm.agents.langchain_agent import MultiAgentWorkflow, ProfessionalAgent
+from services.pyllm.agents.mock_model import MockChatModel
+from services.pyllm.agents.registry import DEFAULT_REGISTRY_PATH, load_registry
+from services.pyllm.agents.scheduler import TurnScheduler
+from services.pyllm.agents.transitions import transition_library
+
+def _write_registry(tmp_path, edit):
+    """
+    复制内置注册表配置，按edit(config)修改后写入临时文件，返回文件路径
+    """
+    with open(DEFAULT_REGISTRY_PATH, encoding="utf-8") as f:
+        config = json.load(f)
+    edit(config)
+    path = tmp_path / "agents.json"
+    path.write_text(json.dumps(config, ensure_ascii=False), encoding="utf-8")
+    return str(path)
+
+def _agent(config, agent_id):
+    return next(agent for agent in config["agents"] if agent["id"] == agent_id)
+
+def test_specialist_temperature_is_bound():
+    registry = load_registry()
+    agent = ProfessionalAgent.from_spec(MockChatModel(latency=0.0, token_delay=0.0), registry.by_route["脱口秀演员Agent"])
+    assert agent.response_chain.last.kwargs["temperature"] == 1.0
+
+def test_direct_agent_rejects_temperature(tmp_path):
+    path = _write_registry(tmp_path, lambda config: _agent(config, "chitchat").update(temperature=0.8))
+    with pytest.raises(ValueError):
+        load_registry(path)
+
+def test_scheduler_uses_registry_priorities_and_slo():
+    registry = load_registry()
+    scheduler = TurnScheduler(slo_ms={"闲聊Agent": 5000.0})
+    scheduler.use_registry(registry)
+    assert scheduler.priorities == {spec.route: spec.priority for spec in registry.agents}
+    assert scheduler.default_priority == registry.by_route[registry.direct_route].priority
+    # 构造时传入的延迟目标覆盖注册表
+    assert scheduler.slo_ms["闲聊Agent"] == 5000.0
+    assert scheduler.slo_ms["心理专家Agent"] == registry.by_route["心理专家Agent"].slo_ms
+
+def test_mock_model_uses_registry_keywords(tmp_path):
+    path = _write_registry(tmp_path, lambda config: _agent(config, "standup_comedian").update(keywords=["周末"]))
+    model = MockChatModel(latency=0.0, token_delay=0.0, registry=load_registry(path))
+    assert model._decide("周末干点啥")["agent_type"] == "脱口秀演员Agent"
+    assert model._decide("讲个笑话")["agent_type"] == "闲聊Agent"
+
+def test_reload_replaces_registry_transitions(tmp_path, monkeypatch):
+    monkeypatch.setattr(langchain_agent, "turn_scheduler", TurnScheduler())
+    model = MockChatModel(latency=0.0, token_delay=0.0)
+    first = load_registry(_write_registry(tmp_path, lambda config: _agent(config, "psychology").update(transitions=[["neutral", "我喊Long过来～"]])))
+    (tmp_path / "v2").mkdir()
+    second = load_registry(_write_registry(tmp_path / "v2", lambda config: _agent(config, "psychology").update(transitions=[["neutral", "Long马上到～"]])))
+
+    def neutral():
+        return list(transition_library._index["心理专家Agent"]["neutral"])
+
+    before = neutral()
+    try:
+        for _ in range(3):
+            MultiAgentWorkflow(first, model).activate()
+        assert neutral() == before + ["我喊Long过来～"]
+        MultiAgentWorkflow(second, model).activate()
+        assert neutral() == before + ["Long马上到～"]
+        assert model.registry is second
+        assert langchain_agent.turn_scheduler.priorities == second.priorities
+    finally:
+        transition_library.replace_source("registry", [])
+    assert neutral() == before
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+熔断器半开试探名额的归还
+"""
+import asyncio
+import pytest
+
+from services.pyllm.utils.resilience import CircuitBreaker
+
+def _half_open_breaker() -> CircuitBreaker:
+    """
+    创建冷却已结束、下一次调用为试探调用的熔断器
+    """
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0.0)
+    breaker.record_failure()
+    return breaker
+
+def test_half_open_allows_single_probe():
+    breaker = _half_open_breaker()
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()
+
+def test_release_probe_allows_next_probe():
+    breaker = _half_open_breaker()
+    assert breaker.allow()
+    breaker.release_probe()
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+
+def test_cancelled_call_releases_probe():
+    breaker = _half_open_breaker()
+
+    async def scenario():
+        task = asyncio.create_task(breaker.call(asyncio.sleep(60), timeout=60))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+    assert breaker.allow()
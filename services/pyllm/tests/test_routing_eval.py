@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+路由评估：降级条目不计为兜底路由的预测，也不计入延迟分位数；评估使用独立的熔断器
+"""
+import asyncio
+import pytest
+
+pytest.importorskip("langchain_core")
+pytest.importorskip("langchain_openai")
+pytest.importorskip("langgraph")
+
+from services.pyllm.benchmarks.routing_eval import OTHER_LABEL, ReplayChatModel, build_decision_router, evaluate, summarize
+from services.pyllm.agents.registry import load_registry
+from services.pyllm.utils.resilience import breaker_for_model
+
+ROUTES = ["闲聊Agent", "心理专家Agent"]
+
+def _result(label, predicted, degraded, latency):
+    return {"input": "", "label": label, "predicted": predicted, "degraded": degraded, "latency": latency, "input_tokens": 0, "output_tokens": 0}
+
+def test_degraded_items_count_as_other():
+    summary = summarize([
+        _result("闲聊Agent", "闲聊Agent", False, 1.0),
+        _result("闲聊Agent", "闲聊Agent", True, 0.001),
+        _result("心理专家Agent", "闲聊Agent", True, 0.001),
+    ], ROUTES)
+    assert summary["accuracy"] == round(1 / 3, 4)
+    assert summary["degraded"] == 2
+    assert summary["confusion"]["闲聊Agent"] == {"闲聊Agent": 1, "心理专家Agent": 0, OTHER_LABEL: 1}
+    assert summary["confusion"]["心理专家Agent"][OTHER_LABEL] == 1
+    assert summary["per_route"]["闲聊Agent"]["precision"] == 1.0
+    # 降级条目的耗时不计入延迟分位数
+    assert summary["p50_ms"] == summary["p95_ms"] == 1000.0
+
+def test_replay_misses_do_not_open_shared_breaker():
+    registry = load_registry()
+    model = ReplayChatModel(records={}, speed=1.0, latency=0.0, token_delay=0.0)
+    router = build_decision_router(model, registry, record=False)
+    shared = breaker_for_model(model)
+    assert router.breaker is not shared
+    dataset = [{"input": f"问题{i}", "label": "闲聊Agent"} for i in range(20)]
+    summary = summarize(asyncio.run(evaluate(router, dataset, 4)), list(registry.routes))
+    assert summary["degraded"] == 20 and summary["accuracy"] == 0.0
+    assert shared.state == "closed" and router.breaker.state == "closed"
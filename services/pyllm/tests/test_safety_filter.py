@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+人设安全过滤：Aho-Corasick自动机跨分片边界匹配、重叠规则取最长、前瞻缓冲有上限
+"""
+import asyncio
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("openai")
+pytest.importorskip("langchain_core")
+
+from services.pyllm.agents.safety_filter import AhoCorasick, PersonaFilter, filter_steps
+
+TEXT = "你好，我是一个人工智能，很高兴认识你"
+EXPECTED = "你好，我是你的朋友，很高兴认识你"
+
+def _feed_all(persona_filter, chunks):
+    """
+    逐个分片输入流式过滤器，检查每次输入后暂存的文本不超过前瞻上限，返回全部输出
+    """
+    stream = persona_filter.stream()
+    parts = []
+    for chunk in chunks:
+        parts.append(stream.feed(chunk))
+        assert len(stream._buffer) <= persona_filter.lookahead
+    parts.append(stream.flush())
+    assert stream._buffer == ""
+    return "".join(parts)
+
+def test_automaton_finds_overlapping_patterns():
+    automaton = AhoCorasick(["he", "she", "his", "hers"])
+    state, found = 0, []
+    for pos, ch in enumerate("ushers", 1):
+        state = automaton.step(state, ch)
+        found.extend((pos, automaton.patterns[index]) for index in automaton.output[state])
+    assert sorted(found) == [(4, "he"), (4, "she"), (6, "hers")]
+
+def test_pattern_split_at_every_boundary():
+    persona_filter = PersonaFilter()
+    assert persona_filter.filter_text(TEXT) == EXPECTED
+    for i in range(len(TEXT) + 1):
+        assert _feed_all(persona_filter, [TEXT[:i], TEXT[i:]]) == EXPECTED
+        for j in range(i, len(TEXT) + 1):
+            assert _feed_all(persona_filter, [TEXT[:i], TEXT[i:j], TEXT[j:]]) == EXPECTED
+    assert _feed_all(persona_filter, list(TEXT)) == EXPECTED
+
+def test_overlapping_rules_prefer_longest_match():
+    persona_filter = PersonaFilter()
+    # "我是一个ai助手"同时包含"我是一个ai"和"ai助手"，整体按最长的规则改写
+    assert persona_filter.filter_text("其实我是一个ai助手呀") == "其实我是你的朋友呀"
+    assert persona_filter.filter_text("我是一个ai，不是ai助手") == "我是你的朋友，不是朋友"
+    custom = PersonaFilter([("abc", "1"), ("abcde", "2"), ("cd", "3")])
+    for text, expected in (("xabcdey", "x2y"), ("xabcdy", "x1dy"), ("xcdy", "x3y")):
+        assert custom.filter_text(text) == expected
+        assert _feed_all(custom, list(text)) == expected
+
+def test_ascii_case_folding():
+    persona_filter = PersonaFilter()
+    assert persona_filter.filter_text("我是AI助手") == "我是你的朋友"
+    assert _feed_all(persona_filter, ["Well, As An ", "Ai I think"]) == "Well, as a friend I think"
+    # 只折叠ASCII字母，全角字母不受影响
+    assert persona_filter.filter_text("我是ＡＩ") == "我是ＡＩ"
+
+def test_held_back_text_bounded_by_lookahead():
+    persona_filter = PersonaFilter()
+    text = "今天天气不错，我们出去走走吧，顺便买点水果回来。" * 3
+    stream = persona_filter.stream()
+    fed = emitted = 0
+    for ch in text:
+        emitted += len(stream.feed(ch))
+        fed += 1
+        assert fed - emitted <= persona_filter.lookahead
+    assert fed - emitted == persona_filter.lookahead
+    assert emitted + len(stream.flush()) == len(text)
+
+def test_flush_emits_tail():
+    persona_filter = PersonaFilter()
+    stream = persona_filter.stream()
+    # 可能是违规表述的前缀，先暂存
+    assert stream.feed("好的，我是一个") == ""
+    assert stream.flush() == "好的，我是一个"
+    stream = persona_filter.stream()
+    assert stream.feed("嗯，我是") + stream.feed("ai") + stream.flush() == "嗯，我是你的朋友"
+
+def test_filter_steps_releases_held_delta_before_final():
+    async def steps():
+        for piece in ("我是", "一个A", "I，", "你呢"):
+            yield {"content": piece, "is_final": False, "type": "delta"}
+        yield {"content": "我是一个AI，你呢", "is_final": True, "type": "final"}
+
+    async def collect():
+        return [step async for step in filter_steps(steps())]
+
+    result = asyncio.run(collect())
+    assert "".join(step["content"] for step in result if step["type"] == "delta") == "我是你的朋友，你呢"
+    assert result[-1] == {"content": "我是你的朋友，你呢", "is_final": True, "type": "final"}
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+JSON序列化与HTTP响应压缩：助手消息帧与通用编码一致，按Accept-Encoding协商压缩方式
+"""
+import asyncio
+import gzip
+import json
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("openai")
+pytest.importorskip("langchain_core")
+
+from services.pyllm.api import compression
+from services.pyllm.api.compression import CompressionMiddleware
+from services.pyllm.utils.serialization import FastJSONResponse, dumps, dumps_text, encode_assistant_frame, new_message_id
+
+# 需要JSON转义的内容：引号、反斜杠、换行、控制字符、中文和emoji
+TRICKY = '他说："你好"\\n\n\t\x01 😀'
+
+def test_dumps_is_compact_utf8():
+    payload = {"content": TRICKY, "loading": True, "count": 3}
+    encoded = dumps(payload)
+    assert isinstance(encoded, bytes)
+    assert json.loads(encoded) == payload
+    # 不转义非ASCII字符，不带多余空白
+    assert "你好".encode("utf-8") in encoded
+    assert b", " not in encoded and b": " not in encoded
+    assert dumps_text(payload) == encoded.decode("utf-8")
+
+@pytest.mark.parametrize("loading", [True, False])
+def test_assistant_frame_matches_generic_encoding(loading):
+    message_id = new_message_id()
+    frame = encode_assistant_frame(message_id, TRICKY, loading=loading)
+    assert json.loads(frame) == {"id": message_id, "role": "assistant", "content": TRICKY, "loading": loading}
+
+def test_message_ids_are_unique_hex():
+    ids = [new_message_id() for _ in range(1000)]
+    assert len(set(ids)) == len(ids)
+    assert all(len(message_id) == 16 and int(message_id, 16) >= 0 for message_id in ids)
+
+def test_fast_json_response_renders_with_backend():
+    response = FastJSONResponse({"reply": "你好"})
+    assert response.body == dumps({"reply": "你好"})
+    assert response.headers["content-type"] == "application/json"
+
+def _serve(middleware_factory, path, accept_encoding, size):
+    """
+    经过压缩中间件请求一个返回size字节响应体的应用，返回(响应头, 响应体)
+    """
+    body = b"a" * size
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+        ]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": path, "headers": [(b"accept-encoding", accept_encoding.encode())]}
+    asyncio.run(middleware_factory(app)(scope, receive, send))
+    headers = {key.decode(): value.decode() for key, value in messages[0]["headers"]}
+    return headers, b"".join(message.get("body", b"") for message in messages[1:])
+
+def test_gzip_for_large_responses():
+    headers, body = _serve(lambda app: CompressionMiddleware(app, minimum_size=100), "/history", "gzip, deflate", 4096)
+    assert headers["content-encoding"] == "gzip"
+    assert gzip.decompress(body) == b"a" * 4096
+
+def test_small_excluded_and_unaccepted_responses_are_not_compressed():
+    factory = lambda app: CompressionMiddleware(app, minimum_size=100, exclude_paths=["/llm/stream"])
+    for path, accept_encoding, size in (("/history", "gzip", 50), ("/llm/stream", "gzip", 4096), ("/history", "identity", 4096)):
+        headers, body = _serve(factory, path, accept_encoding, size)
+        assert "content-encoding" not in headers
+        assert body == b"a" * size
+
+def test_brotli_preferred_when_available():
+    headers, _ = _serve(lambda app: CompressionMiddleware(app, minimum_size=100), "/history", "br, gzip", 4096)
+    # 未安装brotli-asgi时即使客户端接受br也回退到gzip
+    assert headers["content-encoding"] == ("br" if compression.BrotliMiddleware else "gzip")
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+请求合并：相同的并发请求只执行一次，订阅者全部离开后新的相同请求重新执行
+"""
+import asyncio
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("fastapi")
+
+from services.pyllm.agents.single_flight import SingleFlight
+
+def _source(calls, gate=None, steps=3):
+    """
+    创建步骤生成器工厂：每次调用计数，gate不为None时在第一步之后等待gate
+    """
+    def factory():
+        calls.append(1)
+
+        async def generate():
+            for i in range(steps):
+                yield {"content": f"步骤{i}", "is_final": i == steps - 1}
+                if gate is not None:
+                    await gate.wait()
+        return generate()
+    return factory
+
+async def _collect(flights, key, factory):
+    return [step async for step in flights.run(key, factory)]
+
+def test_concurrent_requests_share_one_flight():
+    flights = SingleFlight()
+    calls = []
+
+    async def scenario():
+        gate = asyncio.Event()
+        factory = _source(calls, gate)
+        leader = asyncio.create_task(_collect(flights, "k", factory))
+        follower = asyncio.create_task(_collect(flights, "k", factory))
+        await asyncio.sleep(0.01)
+        gate.set()
+        return await leader, await follower
+
+    leader, follower = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert leader == follower and [step["content"] for step in leader] == ["步骤0", "步骤1", "步骤2"]
+    assert flights.stats() == {"leaders": 1, "followers": 1, "in_flight": 0}
+
+def test_request_after_last_subscriber_leaves_starts_new_flight():
+    flights = SingleFlight()
+    calls = []
+
+    async def scenario():
+        gate = asyncio.Event()
+        first = flights.run("k", _source(calls, gate))
+        assert (await first.__anext__())["content"] == "步骤0"
+        # 唯一的订阅者离开：驱动任务被取消，但取消还未生效
+        await first.aclose()
+        # 同一时刻到达的相同请求不能挂载到正在取消的轮次上
+        return await _collect(flights, "k", _source(calls))
+
+    steps = asyncio.run(scenario())
+    assert len(calls) == 2
+    assert [step["content"] for step in steps] == ["步骤0", "步骤1", "步骤2"]
+    assert flights.stats()["leaders"] == 2 and flights.stats()["followers"] == 0
+
+def test_error_reaches_every_subscriber():
+    flights = SingleFlight()
+
+    def factory():
+        async def generate():
+            yield {"content": "步骤0", "is_final": False}
+            await asyncio.sleep(0.01)
+            raise ValueError("上游失败")
+        return generate()
+
+    async def scenario():
+        return await asyncio.gather(*(_collect(flights, "k", factory) for _ in range(2)), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert flights.stats()["in_flight"] == 0
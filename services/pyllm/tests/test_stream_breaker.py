@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+流式专业Agent与熔断器半开试探：客户端断开、任务取消、排队超时、准备输入失败后熔断器仍能恢复；
+上游失败时（流式和非流式）都标记为降级
+"""
+import asyncio
+import time
+import pytest
+
+pytest.importorskip("langchain_core")
+pytest.importorskip("langchain_openai")
+pytest.importorskip("langgraph")
+
+from langchain_core.messages import AIMessageChunk
+from services.pyllm.agents import langchain_agent
+from services.pyllm.agents.langchain_agent import ProfessionalAgent
+from services.pyllm.agents.mock_model import MockChatModel
+from services.pyllm.agents.scheduler import TurnScheduler
+from services.pyllm.utils.resilience import CircuitBreaker
+
+class _SlowChain:
+    """
+    先产出一个token，然后长时间不返回的响应链替身
+    """
+    async def astream(self, invoke_data):
+        yield AIMessageChunk(content="你好")
+        await asyncio.sleep(60)
+        yield AIMessageChunk(content="再见")
+
+def _half_open_agent() -> ProfessionalAgent:
+    """
+    创建熔断器处于半开状态（下一次调用为试探调用）的专业Agent
+    """
+    agent = ProfessionalAgent(MockChatModel(latency=0.0, token_delay=0.0), "测试", "你是测试人设", route="心理专家Agent")
+    agent.breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0.0)
+    agent.breaker.record_failure()
+    agent.response_chain = _SlowChain()
+    return agent
+
+def test_client_disconnect_releases_half_open_probe():
+    agent = _half_open_agent()
+
+    async def scenario():
+        stream = agent.respond_stream("最近压力好大")
+        assert await stream.__anext__() == "你好"
+        assert agent.breaker.state == "half_open"
+        # 客户端断开：调用方关闭生成器
+        await stream.aclose()
+
+    asyncio.run(scenario())
+    assert agent.breaker.state == "half_open"
+    assert agent.breaker.allow()
+
+def test_cancelled_stream_releases_half_open_probe():
+    agent = _half_open_agent()
+
+    async def scenario():
+        async def consume():
+            async for _ in agent.respond_stream("最近压力好大"):
+                pass
+        task = asyncio.create_task(consume())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+    assert agent.breaker.allow()
+
+def test_queue_timeout_does_not_take_probe(monkeypatch):
+    agent = _half_open_agent()
+    scheduler = TurnScheduler(concurrency=1)
+    monkeypatch.setattr(langchain_agent, "turn_scheduler", scheduler)
+
+    async def scenario():
+        async with scheduler.slot("心理专家Agent"):
+            # 名额被占满，排队超时后走降级路径
+            replies = [delta async for delta in agent.respond_stream("最近压力好大", deadline=time.monotonic() + 0.05)]
+        return replies
+
+    assert asyncio.run(scenario()) == [agent.degraded_reply]
+    assert agent.breaker.allow()
+
+def test_build_invoke_data_failure_does_not_take_probe(monkeypatch):
+    agent = _half_open_agent()
+
+    async def broken(*args, **kwargs):
+        raise RuntimeError("记忆检索失败")
+    monkeypatch.setattr(agent, "_build_invoke_data", broken)
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            async for _ in agent.respond_stream("最近压力好大"):
+                pass
+
+    asyncio.run(scenario())
+    assert agent.breaker.allow()
+
+class _BrokenChain:
+    """
+    产出一个token后失败的响应链替身
+    """
+    async def astream(self, invoke_data):
+        yield AIMessageChunk(content="你好")
+        raise RuntimeError("上游断开")
+
+    async def ainvoke(self, invoke_data):
+        raise RuntimeError("上游断开")
+
+def test_stream_failure_reports_degraded_after_partial_reply():
+    agent = _half_open_agent()
+    agent.response_chain = _BrokenChain()
+    outcome = {"degraded": False}
+
+    async def scenario():
+        return [delta async for delta in agent.respond_stream("最近压力好大", outcome=outcome)]
+
+    assert asyncio.run(scenario()) == ["你好"]
+    assert outcome["degraded"] is True
+
+def test_generate_failure_reports_degraded():
+    agent = _half_open_agent()
+    agent.response_chain = _BrokenChain()
+    reply, degraded = asyncio.run(agent.generate("最近压力好大"))
+    assert reply == "测试处理失败，请稍后重试"
+    assert degraded is True
@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+"""
+性能剖析模块：低开销的采样剖析器、剖析结果存储与热点路径计时钩子
+
+采样剖析器在独立线程中定期读取目标线程的调用栈（sys._current_frames），
+不在被剖析的代码中插桩，输出火焰图通用的折叠栈格式（每行"帧;帧;帧 次数"），
+可直接交给flamegraph.pl、speedscope或inferno渲染。
+"""
+import functools
+import inspect
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional
+from .logger import logger
+
+# 采样间隔（秒）
+PROFILE_INTERVAL = float(os.getenv("SOULBIT_PROFILE_INTERVAL_MS", "5")) / 1000
+# 保留的剖析结果数
+PROFILE_KEEP = int(os.getenv("SOULBIT_PROFILE_KEEP", "20"))
+
+class StackSampler:
+    """
+    调用栈采样器：后台线程按固定间隔采样，累计每条折叠栈出现的次数
+    """
+    def __init__(self, interval: float = PROFILE_INTERVAL, thread_ids: Optional[Iterable[int]] = None, max_depth: int = 128):
+        """
+        初始化采样器
+
+        Args:
+            interval: 采样间隔（秒）
+            thread_ids: 只采样这些线程，为None时采样除采样线程外的所有线程
+            max_depth: 每条调用栈最多保留的帧数
+        """
+        self.interval = interval
+        self.thread_ids = frozenset(thread_ids) if thread_ids is not None else None
+        self.max_depth = max_depth
+        self.counts: Counter = Counter()
+        self.samples = 0
+        self.started_at = 0.0
+        self.duration = 0.0
+        self._labels: Dict[Any, str] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _label(self, code: Any) -> str:
+        """
+        生成帧标签（按代码对象缓存，折叠栈格式中不能出现分号和空白以外的分隔符）
+        """
+        label = self._labels.get(code)
+        if label is None:
+            filename = code.co_filename
+            # 只保留包内的相对路径，缩短火焰图上的标签
+            marker = filename.rfind("site-packages" + os.sep)
+            if marker >= 0:
+                filename = filename[marker + len("site-packages") + 1:]
+            label = f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ",")
+            self._labels[code] = label
+        return label
+
+    def _run(self):
+        """
+        采样循环
+        """
+        own_id = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or (self.thread_ids is not None and thread_id not in self.thread_ids):
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    stack.append(self._label(frame.f_code))
+                    frame = frame.f_back
+                if thread_id not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                stack.append(f"thread:{names.get(thread_id, thread_id)}")
+                stack.reverse()
+                self.counts[";".join(stack)] += 1
+            self.samples += 1
+
+    def start(self) -> "StackSampler":
+        """
+        启动采样线程
+        """
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name="soulbit-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> str:
+        """
+        停止采样并返回折叠栈文本
+
+        Returns:
+            折叠栈格式的剖析结果
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.time() - self.started_at
+        return self.folded()
+
+    def folded(self) -> str:
+        """
+        输出折叠栈格式（按次数降序）
+        """
+        return "\n".join(f"{stack} {count}" for stack, count in self.counts.most_common())
+
+def new_profile_id() -> str:
+    """
+    生成剖析ID
+    """
+    return uuid.uuid4().hex[:12]
+
+class ProfileStore:
+    """
+    最近剖析结果的内存存储（环形缓冲区）
+    """
+    def __init__(self, keep: int = PROFILE_KEEP):
+        """
+        初始化存储
+
+        Args:
+            keep: 最多保留的剖析结果数
+        """
+        self.profiles: Deque[Dict[str, Any]] = deque(maxlen=keep)
+
+    def add(self, kind: str, sampler: StackSampler, folded: str, profile_id: Optional[str] = None, **meta: Any) -> Dict[str, Any]:
+        """
+        保存一次剖析结果
+
+        Args:
+            kind: 类型（request为按请求剖析，capture为全进程定时剖析）
+            sampler: 已停止的采样器
+            folded: 折叠栈文本
+            profile_id: 剖析ID，为None时自动生成
+            **meta: 附加信息（如请求方法和路径）
+
+        Returns:
+            剖析记录
+        """
+        profile = {
+            "id": profile_id or new_profile_id(),
+            "kind": kind,
+            "started_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(sampler.started_at)),
+            "duration_ms": round(sampler.duration * 1000, 1),
+            "samples": sampler.samples,
+            **meta,
+            "folded": folded,
+        }
+        self.profiles.append(profile)
+        return profile
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        """
+        按ID获取剖析记录
+        """
+        for profile in self.profiles:
+            if profile["id"] == profile_id:
+                return profile
+        return None
+
+    def list(self) -> List[Dict[str, Any]]:
+        """
+        列出剖析记录（不含折叠栈文本，按时间倒序）
+        """
+        return [{key: value for key, value in profile.items() if key != "folded"} for profile in reversed(self.profiles)]
+
+# 全局剖析结果存储
+profile_store = ProfileStore()
+
+# 计时钩子：hook(名称, 耗时秒数, 是否抛出异常)
+TimingHook = Callable[[str, float, bool], None]
+_timing_hooks: List[TimingHook] = []
+
+def register_timing_hook(hook: TimingHook):
+    """
+    注册计时钩子（如上报到Prometheus/StatsD）
+
+    Args:
+        hook: 钩子函数，在同一事件循环中同步调用，应当足够轻量
+    """
+    _timing_hooks.append(hook)
+
+def unregister_timing_hook(hook: TimingHook):
+    """
+    注销计时钩子
+    """
+    if hook in _timing_hooks:
+        _timing_hooks.remove(hook)
+
+def _emit_timing(name: str, seconds: float, failed: bool):
+    """
+    调用所有计时钩子，单个钩子出错不影响业务调用
+    """
+    for hook in _timing_hooks:
+        try:
+            hook(name, seconds, failed)
+        except Exception as e:
+            logger.error(f"计时钩子执行失败: {str(e)}")
+
+def timed(name: str) -> Callable:
+    """
+    计时装饰器：包装协程函数或异步生成器函数，结束时把耗时交给计时钩子
+
+    异步生成器从第一次迭代开始计时，到迭代结束或被关闭为止。
+
+    Args:
+        name: 计时名称（如"DecisionAgent.decide"）
+
+    Returns:
+        装饰器
+    """
+    def decorator(func: Callable) -> Callable:
+        if inspect.isasyncgenfunction(func):
+            @functools.wraps(func)
+            async def gen_wrapper(*args: Any, **kwargs: Any):
+                agen = func(*args, **kwargs)
+                start = time.perf_counter()
+                failed = False
+                try:
+                    async for item in agen:
+                        yield item
+                except Exception:
+                    failed = True
+                    raise
+                finally:
+                    await agen.aclose()
+                    _emit_timing(name, time.perf_counter() - start, failed)
+            return gen_wrapper
+
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any):
+            start = time.perf_counter()
+            failed = False
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                failed = True
+                raise
+            finally:
+                _emit_timing(name, time.perf_counter() - start, failed)
+        return wrapper
+    return decorator
+
+class TimingStats:
+    """
+    默认计时钩子：按名称累计调用次数、失败次数、总耗时和最大耗时
+    """
+    def __init__(self):
+        """
+        初始化统计
+        """
+        self.stats: Dict[str, Dict[str, float]] = {}
+
+    def record(self, name: str, seconds: float, failed: bool):
+        """
+        记录一次调用
+        """
+        entry = self.stats.get(name)
+        if entry is None:
+            entry = self.stats[name] = {"calls": 0, "errors": 0, "total": 0.0, "max": 0.0}
+        entry["calls"] += 1
+        entry["errors"] += failed
+        entry["total"] += seconds
+        entry["max"] = max(entry["max"], seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        获取统计快照
+
+        Returns:
+            按名称的调用次数、失败次数、平均与最大耗时（毫秒）
+        """
+        return {
+            name: {
+                "calls": int(entry["calls"]),
+                "errors": int(entry["errors"]),
+                "avg_ms": round(entry["total"] / entry["calls"] * 1000, 2) if entry["calls"] else 0.0,
+                "max_ms": round(entry["max"] * 1000, 2),
+            }
+            for name, entry in self.stats.items()
+        }
+
+# 全局计时统计（默认注册为计时钩子）
+timing_stats = TimingStats()
+register_timing_hook(timing_stats.record)
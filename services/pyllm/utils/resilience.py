@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+容错模块：分阶段超时与按模型端点的熔断器
+"""
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Dict, Optional
+from .logger import logger
+
+# 各阶段超时时间（秒）
+DECISION_TIMEOUT = float(os.getenv("SOULBIT_DECISION_TIMEOUT", "15"))
+SPECIALIST_TIMEOUT = float(os.getenv("SOULBIT_SPECIALIST_TIMEOUT", "30"))
+TURN_TIMEOUT = float(os.getenv("SOULBIT_TURN_TIMEOUT", "45"))
+
+class CircuitOpenError(Exception):
+    """
+    熔断器处于打开状态时抛出的异常
+    """
+
+def turn_deadline() -> float:
+    """
+    计算整个对话轮次的截止时间
+
+    Returns:
+        基于time.monotonic()的截止时间
+    """
+    return time.monotonic() + TURN_TIMEOUT
+
+def stage_timeout(stage_limit: float, deadline: Optional[float] = None) -> float:
+    """
+    计算某个阶段可用的超时时间，取阶段上限与轮次剩余时间的较小值
+
+    Args:
+        stage_limit: 阶段超时上限（秒）
+        deadline: 轮次截止时间，为None时只使用阶段上限
+
+    Returns:
+        可用的超时时间（秒），不小于0
+    """
+    if deadline is None:
+        return stage_limit
+    return max(0.0, min(stage_limit, deadline - time.monotonic()))
+
+def queue_timeout(deadline: Optional[float] = None) -> Optional[float]:
+    """
+    计算排队等待可用的超时时间（轮次剩余时间）
+
+    Args:
+        deadline: 轮次截止时间，为None时不限制
+
+    Returns:
+        可用的超时时间（秒），不限制时为None
+    """
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+class CircuitBreaker:
+    """
+    熔断器：连续失败或连续慢调用达到阈值后打开，冷却后放行一次试探调用
+
+    状态：
+    - closed：正常放行
+    - open：直接拒绝，调用方立即走降级路径
+    - half_open：冷却结束，放行一次试探调用，成功则关闭，失败则重新打开
+    """
+    def __init__(self, name: str, failure_threshold: int = 5, slow_call_seconds: float = 20.0, reset_timeout: float = 30.0):
+        """
+        初始化熔断器
+
+        Args:
+            name: 熔断器名称（通常为模型端点）
+            failure_threshold: 连续失败（含慢调用）多少次后打开
+            slow_call_seconds: 超过该耗时的成功调用也计为失败
+            reset_timeout: 打开后多久进入半开状态（秒）
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        """
+        判断是否放行一次调用
+
+        Returns:
+            True表示可以调用上游，False表示应立即降级
+        """
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+            self._probe_in_flight = False
+            logger.info(f"熔断器[{self.name}]进入半开状态")
+        if self.state == "half_open" and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self, latency: float):
+        """
+        记录一次成功调用
+
+        Args:
+            latency: 调用耗时（秒）
+        """
+        if latency > self.slow_call_seconds:
+            logger.warning(f"熔断器[{self.name}]记录慢调用: {latency:.2f}s")
+            self.record_failure()
+            return
+        if self.state != "closed":
+            logger.info(f"熔断器[{self.name}]恢复关闭状态")
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        """
+        记录一次失败调用，达到阈值或半开试探失败时打开熔断器
+        """
+        self.consecutive_failures += 1
+        self._probe_in_flight = False
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                logger.error(f"熔断器[{self.name}]打开，连续失败次数: {self.consecutive_failures}")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def release_probe(self):
+        """
+        调用被取消、没有得到结果时归还半开状态的试探名额，下一次调用可以重新试探
+        """
+        self._probe_in_flight = False
+
+    async def call(self, awaitable: Awaitable[Any], timeout: float) -> Any:
+        """
+        在熔断器保护和超时限制下执行一次上游调用
+
+        Args:
+            awaitable: 上游调用协程
+            timeout: 超时时间（秒）
+
+        Returns:
+            上游调用结果
+
+        Raises:
+            CircuitOpenError: 熔断器打开时立即抛出（协程不会被执行）
+            asyncio.TimeoutError: 调用超时
+        """
+        if not self.allow():
+            # 关闭未执行的协程，避免"never awaited"警告
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            raise CircuitOpenError(f"熔断器[{self.name}]已打开")
+
+        start = time.monotonic()
+        try:
+            result = await asyncio.wait_for(awaitable, timeout=timeout)
+        except asyncio.CancelledError:
+            self.release_probe()
+            raise
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success(time.monotonic() - start)
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        获取熔断器状态快照
+
+        Returns:
+            状态字典
+        """
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+        }
+
+# 按模型端点划分的熔断器
+_breakers: Dict[str, CircuitBreaker] = {}
+
+def get_breaker(endpoint: str) -> CircuitBreaker:
+    """
+    获取（或创建）指定模型端点的熔断器
+
+    Args:
+        endpoint: 模型端点标识（base_url + 模型ID）
+
+    Returns:
+        熔断器实例
+    """
+    breaker = _breakers.get(endpoint)
+    if breaker is None:
+        breaker = CircuitBreaker(
+            endpoint,
+            failure_threshold=int(os.getenv("SOULBIT_BREAKER_FAILURES", "5")),
+            slow_call_seconds=float(os.getenv("SOULBIT_BREAKER_SLOW_CALL", "20")),
+            reset_timeout=float(os.getenv("SOULBIT_BREAKER_RESET", "30")),
+        )
+        _breakers[endpoint] = breaker
+    return breaker
+
+def breaker_for_model(model: Any) -> CircuitBreaker:
+    """
+    根据模型实例的base_url和模型ID获取熔断器
+
+    Args:
+        model: 大语言模型实例
+
+    Returns:
+        该模型端点的熔断器
+    """
+    base_url = getattr(model, "openai_api_base", None) or ""
+    model_id = getattr(model, "model_name", None) or type(model).__name__
+    return get_breaker(f"{base_url}|{model_id}")
+
+def breaker_snapshot() -> Dict[str, Dict[str, Any]]:
+    """
+    获取所有熔断器的状态
+
+    Returns:
+        按端点分组的状态字典
+    """
+    return {name: breaker.snapshot() for name, breaker in _breakers.items()}
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+序列化模块
+
+优先使用orjson或msgspec进行JSON编码（未安装时回退到标准库json），
+并提供流式输出时复用的助手消息帧编码和HTTP响应类。
+"""
+import itertools
+import json
+import os
+from typing import Any
+from fastapi.responses import JSONResponse
+from .logger import logger
+
+try:
+    import orjson
+
+    def dumps(obj: Any) -> bytes:
+        """
+        将对象编码为JSON字节串
+
+        Args:
+            obj: 待编码对象
+
+        Returns:
+            UTF-8编码的JSON字节串
+        """
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+    backend = "orjson"
+except ImportError:
+    try:
+        import msgspec
+
+        _encoder = msgspec.json.Encoder()
+
+        def dumps(obj: Any) -> bytes:
+            """
+            将对象编码为JSON字节串
+
+            Args:
+                obj: 待编码对象
+
+            Returns:
+                UTF-8编码的JSON字节串
+            """
+            return _encoder.encode(obj)
+
+        backend = "msgspec"
+    except ImportError:
+        def dumps(obj: Any) -> bytes:
+            """
+            将对象编码为JSON字节串
+
+            Args:
+                obj: 待编码对象
+
+            Returns:
+                UTF-8编码的JSON字节串
+            """
+            return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+        backend = "json"
+
+logger.info(f"JSON序列化后端: {backend}")
+
+def dumps_text(obj: Any) -> str:
+    """
+    将对象编码为JSON字符串（用于WebSocket文本帧和SSE）
+
+    Args:
+        obj: 待编码对象
+
+    Returns:
+        JSON字符串
+    """
+    return dumps(obj).decode("utf-8")
+
+# 消息ID：进程级随机前缀 + 自增计数，避免每帧一次系统调用
+_id_prefix = os.urandom(4).hex()
+_id_counter = itertools.count()
+
+def new_message_id() -> str:
+    """
+    生成消息ID（16位十六进制字符串，进程内唯一，跨进程由随机前缀区分）
+
+    Returns:
+        消息ID
+    """
+    return f"{_id_prefix}{next(_id_counter) & 0xFFFFFFFF:08x}"
+
+# 助手消息帧的固定部分，预先编码后只需拼接ID和内容
+_FRAME_HEAD = '{"id":"'
+_FRAME_ROLE = '","role":"assistant","content":'
+_FRAME_LOADING = ',"loading":true}'
+_FRAME_DONE = ',"loading":false}'
+
+def encode_assistant_frame(message_id: str, content: str, loading: bool = False) -> str:
+    """
+    编码一条助手消息帧，等价于dumps_text({"id","role","content","loading"})
+
+    只对content做一次JSON转义，其余部分为预先编码好的常量，
+    适合流式输出token增量时的高频调用。
+
+    Args:
+        message_id: 消息ID（由new_message_id生成，只包含十六进制字符）
+        content: 消息内容
+        loading: 是否仍在加载（非最终回复）
+
+    Returns:
+        JSON文本帧
+    """
+    return _FRAME_HEAD + message_id + _FRAME_ROLE + dumps_text(content) + (_FRAME_LOADING if loading else _FRAME_DONE)
+
+class FastJSONResponse(JSONResponse):
+    """
+    使用可插拔序列化后端渲染的JSON响应
+    """
+    def render(self, content: Any) -> bytes:
+        """
+        渲染响应体
+
+        Args:
+            content: 响应数据
+
+        Returns:
+            JSON字节串
+        """
+        return dumps(content)